@@ -6,13 +6,18 @@ API Provider: Groq (Qwen / Llama-vision)
 import json
 import sys
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from utils.prompts import get_prompt
+from utils.prompt_budget import assemble_prompt, record_token_usage
+from utils.deadline import check_deadline
+from utils.call_budget import record_attempt
 from utils.json_schemas import validate_director_output
+from utils.stream_parsers import IncrementalJSONParser, StreamAborted, generate_with_early_abort
+from llm.batching import generate_validated_many
+from llm.response_cache import cache_policy
 
 
 class DirectorAgent:
@@ -20,10 +25,19 @@ class DirectorAgent:
     
     MAX_RETRY = 2
     
-    def __init__(self, llm_client):
+    def __init__(self, llm_client, stream: bool = False):
         self.llm = llm_client
+        self.stream = stream  # Stream tokens and abort early on malformed JSON
         print("✓ Director Agent initialized")
     
+    def _assemble(self, reasoning_output: Dict[str, Any]):
+        """Build the prompt within the Director token budget -> (prompt, budget report)"""
+        return assemble_prompt('director', reasoning_json=reasoning_output)
+    
+    def build_prompt(self, reasoning_output: Dict[str, Any]) -> str:
+        """Build the LLM prompt for a Logician output"""
+        return self._assemble(reasoning_output)[0]
+    
     def process(self, reasoning_output: Dict[str, Any]) -> Dict[str, Any]:
         """
         Takes structured reasoning and plans visual scenes.
@@ -48,19 +62,30 @@ class DirectorAgent:
         print(f"📥 Input: {reasoning_output['concept']} with {len(reasoning_output['steps'])} steps")
         
         # Build prompt with reasoning context
-        prompt = get_prompt('director', reasoning_json=json.dumps(reasoning_output, indent=2))
+        prompt, budget = self._assemble(reasoning_output)
         
         # Try to get valid response
         for attempt in range(1, self.MAX_RETRY + 1):
             print(f"\n🔄 Attempt {attempt}/{self.MAX_RETRY}")
+            check_deadline("director attempt")
+            record_attempt("director", attempt)
             
             try:
-                # Call LLM
-                raw_response = self.llm.generate(
-                    prompt=prompt,
-                    max_tokens=2048,
-                    temperature=0.6
-                )
+                # Call LLM (only valid responses are cached; retries skip the cache)
+                with cache_policy(accept=lambda response: validate_director_output(response)[0],
+                                  read=attempt == 1):
+                    if self.stream:
+                        raw_response = generate_with_early_abort(
+                            self.llm, prompt, max_tokens=2048, temperature=0.6,
+                            parser=IncrementalJSONParser()
+                        )
+                    else:
+                        raw_response = self.llm.generate(
+                            prompt=prompt,
+                            max_tokens=2048,
+                            temperature=0.6
+                        )
+                record_token_usage(budget, prompt, raw_response)
                 
                 print(f"\n📄 Raw response preview: {raw_response[:200]}...")
                 
@@ -83,6 +108,14 @@ class DirectorAgent:
                     else:
                         raise ValueError(f"Failed to get valid scene manifest: {result}")
             
+            except StreamAborted as e:
+                print(f"\n✂️  Stream aborted early: {e.reason}")
+                if attempt < self.MAX_RETRY:
+                    print("   Retrying with clarification...")
+                    prompt += "\n\nIMPORTANT: Return ONLY valid JSON with scenes array containing title, objects, and animations."
+                else:
+                    raise ValueError(f"Failed to get valid scene manifest: {e.reason}")
+            
             except json.JSONDecodeError as e:
                 print(f"\n❌ JSON decode error: {str(e)}")
                 if attempt >= self.MAX_RETRY:
@@ -93,3 +126,40 @@ class DirectorAgent:
                 raise
         
         raise ValueError("Failed to generate valid scene manifest")
+    
+    def process_many(self, reasoning_outputs: List[Dict[str, Any]], concurrency: int = 4,
+                     use_batch_api: bool = False, batch_endpoint=None) -> List[Dict[str, Any]]:
+        """
+        Batch variant of process() for many Logician outputs.
+        
+        Args:
+            reasoning_outputs: Outputs from Logician Agent
+            concurrency: Max simultaneous LLM requests
+            use_batch_api: Submit through the provider's offline batch endpoint
+            batch_endpoint: Batch endpoint to submit to instead (e.g. LocalBatchEndpoint)
+        
+        Returns:
+            One {"success", "result", "error", "attempts"} per input, in input order
+        """
+        print(f"\n{'='*60}")
+        print(f"🎬 AGENT B — DIRECTOR (Batch Scene Planning: {len(reasoning_outputs)} inputs)")
+        print(f"{'='*60}")
+        
+        assembled = [self._assemble(reasoning_output) for reasoning_output in reasoning_outputs]
+        outcomes = generate_validated_many(
+            self.llm,
+            [prompt for prompt, _ in assembled],
+            validate_director_output,
+            retry_suffix="\n\nIMPORTANT: Return ONLY valid JSON with scenes array containing title, objects, and animations.",
+            concurrency=concurrency,
+            max_tokens=2048,
+            temperature=0.6,
+            max_rounds=self.MAX_RETRY,
+            on_response=lambda index, prompt, response: record_token_usage(assembled[index][1], prompt, response),
+            use_batch_api=use_batch_api,
+            batch_endpoint=batch_endpoint
+        )
+        
+        succeeded = sum(1 for outcome in outcomes if outcome["success"])
+        print(f"\n📤 Output: {succeeded}/{len(outcomes)} valid scene manifests")
+        return outcomes
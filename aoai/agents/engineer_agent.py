@@ -3,17 +3,23 @@ Agent C — Engineer
 Responsible for: Manim code generation
 API Provider: Gemini (Gemini 3.0 Flash)
 """
-import json
+import contextvars
 import sys
 import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from utils.prompts import get_prompt
+from utils.prompt_budget import assemble_prompt, record_token_usage
+from utils.deadline import check_deadline
+from utils.call_budget import record_attempt
 from utils.json_schemas import validate_engineer_output
+from utils.stream_parsers import CodeFenceParser, StreamAborted, generate_with_early_abort
+from llm.batching import generate_validated_many
+from llm.response_cache import cache_policy
 
 
 class EngineerAgent:
@@ -21,8 +27,9 @@ class EngineerAgent:
     
     MAX_RETRY = 2
     
-    def __init__(self, llm_client):
+    def __init__(self, llm_client, stream: bool = False):
         self.llm = llm_client
+        self.stream = stream  # Stream tokens and abort early on malformed code
         print("✓ Engineer Agent initialized")
     
     def _extract_code_from_markdown(self, text: str) -> str:
@@ -44,6 +51,14 @@ class EngineerAgent:
         # No code blocks, return as is
         return text.strip()
     
+    def _assemble(self, scene_manifest: Dict[str, Any]):
+        """Build the prompt with a compact manifest -> (prompt, token report); the manifest is never truncated"""
+        return assemble_prompt('engineer', scene_manifest=scene_manifest)
+    
+    def build_prompt(self, scene_manifest: Dict[str, Any]) -> str:
+        """Build the LLM prompt for a Director scene manifest"""
+        return self._assemble(scene_manifest)[0]
+    
     def process(self, scene_manifest: Dict[str, Any]) -> str:
         """
         Takes scene manifest and generates Manim Python code.
@@ -60,19 +75,30 @@ class EngineerAgent:
         print(f"📥 Input: {len(scene_manifest['scenes'])} scenes to implement")
         
         # Build prompt with scene manifest
-        prompt = get_prompt('engineer', scene_manifest=json.dumps(scene_manifest, indent=2))
+        prompt, budget = self._assemble(scene_manifest)
         
         # Try to get valid code
         for attempt in range(1, self.MAX_RETRY + 1):
             print(f"\n🔄 Attempt {attempt}/{self.MAX_RETRY}")
+            check_deadline("engineer attempt")
+            record_attempt("engineer", attempt)
             
             try:
-                # Call LLM (Gemini for code generation)
-                raw_response = self.llm.generate(
-                    prompt=prompt,
-                    max_tokens=4096,
-                    temperature=0.3  # Lower temperature for code
-                )
+                # Call LLM (Gemini for code generation; only valid code is cached, retries skip the cache)
+                with cache_policy(accept=lambda response: self._validate_response(response)[0],
+                                  read=attempt == 1):
+                    if self.stream:
+                        raw_response = generate_with_early_abort(
+                            self.llm, prompt, max_tokens=4096, temperature=0.3,
+                            parser=CodeFenceParser()
+                        )
+                    else:
+                        raw_response = self.llm.generate(
+                            prompt=prompt,
+                            max_tokens=4096,
+                            temperature=0.3  # Lower temperature for code
+                        )
+                record_token_usage(budget, prompt, raw_response)
                 
                 print(f"\n📄 Generated code length: {len(raw_response)} chars")
                 print(f"   First 100 chars: {raw_response[:100]}...")
@@ -98,9 +124,116 @@ class EngineerAgent:
                     else:
                         raise ValueError(f"Generated code is invalid: {error_msg}")
             
+            except StreamAborted as e:
+                print(f"\n✂️  Stream aborted early: {e.reason}")
+                if attempt < self.MAX_RETRY:
+                    print("   Retrying with stricter instructions...")
+                    prompt += "\n\nCRITICAL: Code MUST include 'from manim import *' and 'class GeneratedScene(Scene)'. Return ONLY the Python code."
+                else:
+                    raise ValueError(f"Generated code is invalid: {e.reason}")
+            
             except Exception as e:
                 print(f"\n❌ Error in Engineer Agent: {str(e)}")
                 if attempt >= self.MAX_RETRY:
                     raise
         
         raise ValueError("Failed to generate valid Manim code")
+    
+    def _validate_response(self, raw_response: str) -> Tuple[bool, str]:
+        """Extract and validate code -> (True, code) or (False, error message)"""
+        code = self._extract_code_from_markdown(raw_response)
+        is_valid, error_msg = validate_engineer_output(code)
+        return (True, code) if is_valid else (False, error_msg)
+    
+    def generate_candidates(self, scene_manifest: Dict[str, Any], k: int = 3,
+                            temperatures: Optional[List[float]] = None) -> List[str]:
+        """
+        Speculative variant of process(): request k scripts in parallel.
+        
+        Each request uses a different temperature; responses that fail
+        validate_engineer_output or duplicate another candidate are dropped.
+        Falls back to process() when no candidate is valid.
+        
+        Args:
+            scene_manifest: Output from Director Agent
+            k: Number of parallel requests
+            temperatures: One temperature per request (default: spread from 0.3 upwards)
+        
+        Returns:
+            Valid, distinct scripts ordered by temperature (lowest first)
+        """
+        print(f"\n{'='*60}")
+        print(f"⚙️  AGENT C — ENGINEER (Speculative Code Generation: {k} candidates)")
+        print(f"{'='*60}")
+        
+        temperatures = temperatures or [min(1.0, 0.3 + 0.25 * i) for i in range(k)]
+        prompt, budget = self._assemble(scene_manifest)
+        
+        def request(temperature: float) -> str:
+            with cache_policy(accept=lambda response: self._validate_response(response)[0]):
+                raw_response = self.llm.generate(prompt=prompt, max_tokens=4096, temperature=temperature)
+            record_token_usage(budget, prompt, raw_response)
+            return raw_response
+        
+        with ThreadPoolExecutor(max_workers=len(temperatures), thread_name_prefix="engineer-candidate") as executor:
+            # Each request sees the caller's context variables (routing/token logs)
+            futures = [executor.submit(contextvars.copy_context().run, request, t) for t in temperatures]
+        
+        candidates = []
+        for index, (temperature, future) in enumerate(zip(temperatures, futures), 1):
+            try:
+                is_valid, value = self._validate_response(future.result())
+            except Exception as e:
+                is_valid, value = False, str(e)
+            
+            if not is_valid:
+                print(f"   ❌ Candidate {index} (temperature {temperature:.2f}) rejected: {value}")
+            elif value in candidates:
+                print(f"   ⚠️  Candidate {index} (temperature {temperature:.2f}) duplicates an earlier one")
+            else:
+                print(f"   ✅ Candidate {index} (temperature {temperature:.2f}): {len(value.splitlines())} lines")
+                candidates.append(value)
+        
+        if not candidates:
+            print("   No valid candidates, falling back to sequential generation")
+            return [self.process(scene_manifest)]
+        
+        print(f"\n📤 Output: {len(candidates)}/{len(temperatures)} valid candidate scripts")
+        return candidates
+    
+    def process_many(self, scene_manifests: List[Dict[str, Any]], concurrency: int = 4,
+                     use_batch_api: bool = False, batch_endpoint=None) -> List[Dict[str, Any]]:
+        """
+        Batch variant of process() for many scene manifests.
+        
+        Args:
+            scene_manifests: Outputs from Director Agent
+            concurrency: Max simultaneous LLM requests
+            use_batch_api: Submit through the provider's offline batch endpoint
+            batch_endpoint: Batch endpoint to submit to instead (e.g. LocalBatchEndpoint)
+        
+        Returns:
+            One {"success", "result", "error", "attempts"} per manifest, in input order
+        """
+        print(f"\n{'='*60}")
+        print(f"⚙️  AGENT C — ENGINEER (Batch Code Generation: {len(scene_manifests)} manifests)")
+        print(f"{'='*60}")
+        
+        assembled = [self._assemble(scene_manifest) for scene_manifest in scene_manifests]
+        outcomes = generate_validated_many(
+            self.llm,
+            [prompt for prompt, _ in assembled],
+            self._validate_response,
+            retry_suffix="\n\nCRITICAL: Code MUST include 'from manim import *' and 'class GeneratedScene(Scene)'. Return ONLY the Python code.",
+            concurrency=concurrency,
+            max_tokens=4096,
+            temperature=0.3,
+            max_rounds=self.MAX_RETRY,
+            on_response=lambda index, prompt, response: record_token_usage(assembled[index][1], prompt, response),
+            use_batch_api=use_batch_api,
+            batch_endpoint=batch_endpoint
+        )
+        
+        succeeded = sum(1 for outcome in outcomes if outcome["success"])
+        print(f"\n📤 Output: {succeeded}/{len(outcomes)} valid Manim scripts")
+        return outcomes
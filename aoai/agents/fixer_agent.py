@@ -12,8 +12,11 @@ from typing import Dict, Any
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from utils.prompts import get_prompt
+from utils.prompt_budget import assemble_prompt, record_token_usage
+from utils.deadline import check_deadline
+from utils.call_budget import record_attempt
 from utils.json_schemas import validate_fixer_output
+from llm.response_cache import cache_policy
 
 
 class FixerAgent:
@@ -59,20 +62,27 @@ class FixerAgent:
         print(f"   Code length: {len(broken_code)} chars")
         print(f"   Error preview: {error_log[:200]}...")
         
-        # Build prompt with code and error context
-        prompt = get_prompt('fixer', code=broken_code, error=error_log)
+        # Build prompt with code and error context (oversized stderr is condensed)
+        prompt, budget = assemble_prompt('fixer', truncatable=('error',), code=broken_code, error=error_log)
+        if budget["truncated"]:
+            print(f"   Error log condensed to fit {budget['budget']} token budget")
         
         # Try to get fixed code
         for attempt in range(1, self.MAX_RETRY + 1):
             print(f"\n🔄 Attempt {attempt}/{self.MAX_RETRY}")
+            check_deadline("fixer attempt")
+            record_attempt("fixer", attempt)
             
             try:
-                # Call LLM
-                raw_response = self.llm.generate(
-                    prompt=prompt,
-                    max_tokens=4096,
-                    temperature=0.2  # Very low temp for fixes
-                )
+                # Call LLM (only valid patches are cached; retries skip the cache)
+                accept = lambda response: validate_fixer_output(self._extract_code_from_markdown(response))[0]
+                with cache_policy(accept=accept, read=attempt == 1):
+                    raw_response = self.llm.generate(
+                        prompt=prompt,
+                        max_tokens=4096,
+                        temperature=0.2  # Very low temp for fixes
+                    )
+                record_token_usage(budget, prompt, raw_response)
                 
                 # Extract code from markdown if needed
                 fixed_code = self._extract_code_from_markdown(raw_response)
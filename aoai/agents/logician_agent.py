@@ -6,13 +6,18 @@ API Provider: Groq (Llama-3 / Mixtral)
 import json
 import sys
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from utils.prompts import get_prompt
+from utils.prompt_budget import assemble_prompt, record_token_usage
+from utils.deadline import check_deadline
+from utils.call_budget import record_attempt
 from utils.json_schemas import validate_logician_output
+from utils.stream_parsers import IncrementalJSONParser, StreamAborted, generate_with_early_abort
+from llm.batching import generate_validated_many
+from llm.response_cache import cache_policy
 
 
 class LogicianAgent:
@@ -20,10 +25,19 @@ class LogicianAgent:
     
     MAX_RETRY = 2  # Retry if JSON validation fails
     
-    def __init__(self, llm_client):
+    def __init__(self, llm_client, stream: bool = False):
         self.llm = llm_client
+        self.stream = stream  # Stream tokens and abort early on malformed JSON
         print("✓ Logician Agent initialized")
     
+    def _assemble(self, user_prompt: str):
+        """Build the prompt within the Logician token budget -> (prompt, budget report)"""
+        return assemble_prompt('logician', truncatable=('user_input',), user_input=user_prompt)
+    
+    def build_prompt(self, user_prompt: str) -> str:
+        """Build the LLM prompt for a user request"""
+        return self._assemble(user_prompt)[0]
+    
     def process(self, user_prompt: str) -> Dict[str, Any]:
         """
         Takes user input and generates structured mathematical reasoning.
@@ -43,19 +57,30 @@ class LogicianAgent:
         print(f"📥 Input: {user_prompt}")
         
         # Build prompt
-        prompt = get_prompt('logician', user_input=user_prompt)
+        prompt, budget = self._assemble(user_prompt)
         
         # Try to get valid response (with retries)
         for attempt in range(1, self.MAX_RETRY + 1):
             print(f"\n🔄 Attempt {attempt}/{self.MAX_RETRY}")
+            check_deadline("logician attempt")
+            record_attempt("logician", attempt)
             
             try:
-                # Call LLM
-                raw_response = self.llm.generate(
-                    prompt=prompt,
-                    max_tokens=2048,
-                    temperature=0.7
-                )
+                # Call LLM (only valid responses are cached; retries skip the cache)
+                with cache_policy(accept=lambda response: validate_logician_output(response)[0],
+                                  read=attempt == 1):
+                    if self.stream:
+                        raw_response = generate_with_early_abort(
+                            self.llm, prompt, max_tokens=2048, temperature=0.7,
+                            parser=IncrementalJSONParser()
+                        )
+                    else:
+                        raw_response = self.llm.generate(
+                            prompt=prompt,
+                            max_tokens=2048,
+                            temperature=0.7
+                        )
+                record_token_usage(budget, prompt, raw_response)
                 
                 print(f"\n📄 Raw response preview: {raw_response[:200]}...")
                 
@@ -72,10 +97,18 @@ class LogicianAgent:
                     print(f"\n❌ Validation failed: {result}")
                     if attempt < self.MAX_RETRY:
                         print("   Retrying with clarification...")
-                        prompt = get_prompt('logician', user_input=user_prompt) + "\n\nIMPORTANT: Return ONLY valid JSON, no additional text."
+                        prompt = self.build_prompt(user_prompt) + "\n\nIMPORTANT: Return ONLY valid JSON, no additional text."
                     else:
                         raise ValueError(f"Failed to get valid JSON after {self.MAX_RETRY} attempts: {result}")
             
+            except StreamAborted as e:
+                print(f"\n✂️  Stream aborted early: {e.reason}")
+                if attempt < self.MAX_RETRY:
+                    print("   Retrying with clarification...")
+                    prompt = self.build_prompt(user_prompt) + "\n\nIMPORTANT: Return ONLY valid JSON, no additional text."
+                else:
+                    raise ValueError(f"Failed to get valid JSON after {self.MAX_RETRY} attempts: {e.reason}")
+            
             except json.JSONDecodeError as e:
                 print(f"\n❌ JSON decode error: {str(e)}")
                 if attempt >= self.MAX_RETRY:
@@ -86,3 +119,40 @@ class LogicianAgent:
                 raise
         
         raise ValueError("Failed to generate valid reasoning output")
+    
+    def process_many(self, user_prompts: List[str], concurrency: int = 4,
+                     use_batch_api: bool = False, batch_endpoint=None) -> List[Dict[str, Any]]:
+        """
+        Batch variant of process() for many user prompts.
+        
+        Args:
+            user_prompts: Natural language math questions
+            concurrency: Max simultaneous LLM requests
+            use_batch_api: Submit through the provider's offline batch endpoint
+            batch_endpoint: Batch endpoint to submit to instead (e.g. LocalBatchEndpoint)
+        
+        Returns:
+            One {"success", "result", "error", "attempts"} per prompt, in input order
+        """
+        print(f"\n{'='*60}")
+        print(f"🧠 AGENT A — LOGICIAN (Batch Reasoning: {len(user_prompts)} prompts)")
+        print(f"{'='*60}")
+        
+        assembled = [self._assemble(user_prompt) for user_prompt in user_prompts]
+        outcomes = generate_validated_many(
+            self.llm,
+            [prompt for prompt, _ in assembled],
+            validate_logician_output,
+            retry_suffix="\n\nIMPORTANT: Return ONLY valid JSON, no additional text.",
+            concurrency=concurrency,
+            max_tokens=2048,
+            temperature=0.7,
+            max_rounds=self.MAX_RETRY,
+            on_response=lambda index, prompt, response: record_token_usage(assembled[index][1], prompt, response),
+            use_batch_api=use_batch_api,
+            batch_endpoint=batch_endpoint
+        )
+        
+        succeeded = sum(1 for outcome in outcomes if outcome["success"])
+        print(f"\n📤 Output: {succeeded}/{len(outcomes)} valid reasoning outputs")
+        return outcomes
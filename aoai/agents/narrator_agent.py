@@ -11,7 +11,10 @@ from typing import Dict, Any
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from utils.prompts import get_prompt
+from utils.prompt_budget import assemble_prompt, record_token_usage
+from utils.deadline import check_deadline
+from utils.call_budget import record_attempt
+from llm.response_cache import cache_policy
 
 
 class NarratorAgent:
@@ -23,6 +26,17 @@ class NarratorAgent:
         self.llm = llm_client
         print("✓ Narrator Agent initialized")
     
+    @staticmethod
+    def _is_valid(raw_response: str) -> bool:
+        """Whether a response holds a narrations list (plain JSON or in a ```json block)"""
+        try:
+            narration_data = json.loads(raw_response)
+        except json.JSONDecodeError:
+            if "```json" not in raw_response:
+                return False
+            narration_data = json.loads(raw_response.split("```json")[1].split("```")[0].strip())
+        return isinstance(narration_data, dict) and isinstance(narration_data.get("narrations"), list)
+    
     def process(self, scene_manifest: Dict[str, Any], reasoning: Dict[str, Any]) -> Dict[str, Any]:
         """
         Takes scene manifest and reasoning to generate narration.
@@ -48,23 +62,29 @@ class NarratorAgent:
         print(f"📥 Input: {len(scene_manifest['scenes'])} scenes")
         
         # Build prompt with scene and reasoning context
-        prompt = get_prompt(
+        # The reasoning is background only; the scenes must survive intact
+        prompt, budget = assemble_prompt(
             'narrator',
-            scene_manifest=json.dumps(scene_manifest, indent=2),
-            reasoning=json.dumps(reasoning, indent=2)
+            truncatable=('reasoning',),
+            scene_manifest=scene_manifest,
+            reasoning=reasoning
         )
         
         # Try to get valid narration
         for attempt in range(1, self.MAX_RETRY + 1):
             print(f"\n🔄 Attempt {attempt}/{self.MAX_RETRY}")
+            check_deadline("narrator attempt")
+            record_attempt("narrator", attempt)
             
             try:
-                # Call LLM
-                raw_response = self.llm.generate(
-                    prompt=prompt,
-                    max_tokens=2048,
-                    temperature=0.7
-                )
+                # Call LLM (only valid narrations are cached; retries skip the cache)
+                with cache_policy(accept=self._is_valid, read=attempt == 1):
+                    raw_response = self.llm.generate(
+                        prompt=prompt,
+                        max_tokens=2048,
+                        temperature=0.7
+                    )
+                record_token_usage(budget, prompt, raw_response)
                 
                 print(f"\n📄 Generated narration length: {len(raw_response)} chars")
                 
@@ -0,0 +1,337 @@
+"""
+Batched Generation
+Bounded-concurrency generate_many() and offline batch endpoints shared by the LLM clients
+"""
+import abc
+import asyncio
+import functools
+import io
+import json
+import time
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+from llm.response_cache import cache_policy
+
+
+def _ok(index: int, response: str) -> Dict[str, Any]:
+    return {"index": index, "success": True, "response": response, "error": None}
+
+
+def _failed(index: int, error) -> Dict[str, Any]:
+    return {"index": index, "success": False, "response": None, "error": str(error)}
+
+
+async def agenerate_many(llm, prompts: List[str], concurrency: int = 4,
+                         max_tokens: int = 2048, temperature: float = 0.7) -> List[Dict[str, Any]]:
+    """
+    Run many prompts through a client with at most `concurrency` in flight.
+    
+    Requests still pass through the client's shared rate limiter, so the
+    semaphore only bounds local concurrency. Clients without agenerate() run
+    generate() on the default executor.
+    
+    Args:
+        llm: LLM client
+        prompts: Input texts
+        concurrency: Max simultaneous requests
+        max_tokens: Max response length
+        temperature: Sampling temperature
+    
+    Returns:
+        One {"index", "success", "response", "error"} per prompt, in input order
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    loop = asyncio.get_running_loop()
+    
+    async def run_one(index: int, prompt: str) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                if hasattr(llm, "agenerate"):
+                    response = await llm.agenerate(prompt, max_tokens, temperature)
+                else:
+                    response = await loop.run_in_executor(
+                        None,
+                        functools.partial(llm.generate, prompt=prompt, max_tokens=max_tokens, temperature=temperature)
+                    )
+                return _ok(index, response)
+            except Exception as e:
+                # One failing prompt must not take down the rest of the batch
+                return _failed(index, e)
+    
+    return list(await asyncio.gather(*(run_one(i, prompt) for i, prompt in enumerate(prompts))))
+
+
+def run_many(llm, prompts: List[str], concurrency: int = 4,
+             max_tokens: int = 2048, temperature: float = 0.7) -> List[Dict[str, Any]]:
+    """
+    Blocking wrapper around agenerate_many() for synchronous callers.
+    
+    Returns:
+        One {"index", "success", "response", "error"} per prompt, in input order
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        raise RuntimeError("generate_many() called from a running event loop; await agenerate_many() instead")
+    
+    start = time.perf_counter()
+    results = asyncio.run(agenerate_many(llm, prompts, concurrency, max_tokens, temperature))
+    failed = sum(1 for result in results if not result["success"])
+    print(f"📦 Batch of {len(prompts)} prompts finished in {time.perf_counter() - start:.1f}s "
+          f"({len(prompts) - failed} ok, {failed} failed, concurrency {concurrency})")
+    return results
+
+
+def generate_many(llm, prompts: List[str], concurrency: int = 4, max_tokens: int = 2048,
+                  temperature: float = 0.7, use_batch_api: bool = False,
+                  batch_endpoint: Optional["BatchEndpoint"] = None) -> List[Dict[str, Any]]:
+    """
+    Use the client's own generate_many() when it has one, else run_many().
+    
+    Wrapped clients (hedging, replay) have no generate_many(); an explicit
+    batch_endpoint is still honoured for them.
+    """
+    if hasattr(llm, "generate_many"):
+        return llm.generate_many(prompts, concurrency=concurrency, max_tokens=max_tokens, temperature=temperature,
+                                 use_batch_api=use_batch_api, batch_endpoint=batch_endpoint)
+    if batch_endpoint is not None:
+        return batch_endpoint.run(prompts, max_tokens, temperature, getattr(llm, "current_model", "default"))
+    if use_batch_api:
+        raise ValueError(f"{type(llm).__name__} has no provider batch endpoint")
+    return run_many(llm, prompts, concurrency, max_tokens, temperature)
+
+
+def generate_validated_many(llm, prompts: List[str], validate: Callable[[str], Tuple[bool, Any]],
+                            retry_suffix: str, concurrency: int = 4, max_tokens: int = 2048,
+                            temperature: float = 0.7, max_rounds: int = 2,
+                            on_response: Optional[Callable[[int, str, str], None]] = None,
+                            use_batch_api: bool = False,
+                            batch_endpoint: Optional["BatchEndpoint"] = None) -> List[Dict[str, Any]]:
+    """
+    Batch counterpart of the agents' validate-and-retry loop.
+    
+    Responses that fail validation are re-submitted together with the retry
+    instructions appended; request errors are reported as-is. Only valid
+    responses are cached, and retry rounds skip cache lookups.
+    
+    Args:
+        llm: LLM client
+        prompts: Input texts
+        validate: Returns (True, result) or (False, error message) for a response
+        retry_suffix: Text appended to the prompt for a retry round
+        concurrency: Max simultaneous requests
+        max_tokens: Max response length
+        temperature: Sampling temperature
+        max_rounds: Submission rounds (1 = no retries)
+        on_response: Called with (index, prompt, response) for every response
+        use_batch_api: Submit through the provider's offline batch endpoint
+        batch_endpoint: Batch endpoint to submit to instead (e.g. LocalBatchEndpoint)
+    
+    Returns:
+        One {"success", "result", "error", "attempts"} per prompt, in input order
+    """
+    outcomes: List[Optional[Dict[str, Any]]] = [None] * len(prompts)
+    current = list(prompts)
+    pending = list(range(len(prompts)))
+    
+    for round_number in range(1, max_rounds + 1):
+        with cache_policy(accept=lambda response: validate(response)[0], read=round_number == 1):
+            results = generate_many(llm, [current[i] for i in pending], concurrency, max_tokens, temperature,
+                                    use_batch_api=use_batch_api, batch_endpoint=batch_endpoint)
+        
+        retry = []
+        for index, result in zip(pending, results):
+            if not result["success"]:
+                outcomes[index] = {"success": False, "result": None, "error": result["error"], "attempts": round_number}
+                continue
+            
+            if on_response is not None:
+                on_response(index, current[index], result["response"])
+            
+            try:
+                is_valid, value = validate(result["response"])
+            except Exception as e:
+                is_valid, value = False, str(e)
+            
+            if is_valid:
+                outcomes[index] = {"success": True, "result": value, "error": None, "attempts": round_number}
+            else:
+                outcomes[index] = {"success": False, "result": None, "error": str(value), "attempts": round_number}
+                retry.append(index)
+                current[index] = prompts[index] + retry_suffix
+        
+        pending = retry
+        if not pending:
+            break
+        if round_number < max_rounds:
+            print(f"   🔁 Retrying {len(pending)} responses that failed validation")
+    
+    return outcomes
+
+
+class BatchEndpoint(abc.ABC):
+    """
+    Offline batch job interface (OpenAI-style JSONL of chat completion requests).
+    
+    Subclasses implement submit/status/results; run() drives a whole job.
+    """
+    
+    POLL_INTERVAL = 10.0  # seconds between status checks
+    DONE_STATES = ("completed", "failed", "expired", "cancelled")
+    
+    @abc.abstractmethod
+    def submit(self, requests: List[Dict[str, Any]]) -> str:
+        """Submit request lines and return a batch id"""
+    
+    @abc.abstractmethod
+    def status(self, batch_id: str) -> str:
+        """Return the batch state ('validating', 'in_progress', 'completed', 'failed', ...)"""
+    
+    @abc.abstractmethod
+    def results(self, batch_id: str) -> Dict[str, Dict[str, Any]]:
+        """Return {custom_id: {"response": str} or {"error": str}} for a finished batch"""
+    
+    def run(self, prompts: List[str], max_tokens: int, temperature: float, model: str,
+            timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Submit prompts as one batch job and wait for it.
+        
+        Args:
+            prompts: Input texts
+            max_tokens: Max response length
+            temperature: Sampling temperature
+            model: Model for every request in the batch
+            timeout: Give up waiting after this many seconds (None = wait for the window)
+        
+        Returns:
+            One {"index", "success", "response", "error"} per prompt, in input order
+        """
+        requests = [
+            {
+                "custom_id": f"request-{index}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": model,
+                    "messages": [{"role": "user", "content": prompt}],
+                    "max_tokens": max_tokens,
+                    "temperature": temperature
+                }
+            }
+            for index, prompt in enumerate(prompts)
+        ]
+        
+        batch_id = self.submit(requests)
+        print(f"📦 Submitted batch {batch_id} ({len(requests)} requests, model {model})")
+        
+        start = time.monotonic()
+        state = self.status(batch_id)
+        while state not in self.DONE_STATES:
+            if timeout is not None and time.monotonic() - start > timeout:
+                raise Exception(f"Batch {batch_id} still '{state}' after {timeout:.0f}s")
+            time.sleep(self.POLL_INTERVAL)
+            state = self.status(batch_id)
+        
+        print(f"📦 Batch {batch_id} {state} after {time.monotonic() - start:.1f}s")
+        collected = self.results(batch_id) if state == "completed" else {}
+        
+        results = []
+        for index in range(len(prompts)):
+            item = collected.get(f"request-{index}")
+            if item is None:
+                results.append(_failed(index, f"No result in batch {batch_id} (state: {state})"))
+            elif item.get("error"):
+                results.append(_failed(index, item["error"]))
+            else:
+                results.append(_ok(index, item["response"]))
+        return results
+
+
+class GroqBatchEndpoint(BatchEndpoint):
+    """Groq Batch API (upload JSONL file, create batch, download output file)"""
+    
+    def __init__(self, groq_client, completion_window: str = "24h"):
+        """
+        Args:
+            groq_client: GroqClient whose SDK client is used for files/batches
+            completion_window: Processing window requested from Groq
+        """
+        self.client = groq_client.client
+        self.completion_window = completion_window
+    
+    def submit(self, requests: List[Dict[str, Any]]) -> str:
+        payload = "\n".join(json.dumps(request, ensure_ascii=False) for request in requests).encode("utf-8")
+        batch_file = self.client.files.create(file=("batch.jsonl", io.BytesIO(payload)), purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window=self.completion_window
+        )
+        return batch.id
+    
+    def status(self, batch_id: str) -> str:
+        return self.client.batches.retrieve(batch_id).status
+    
+    def results(self, batch_id: str) -> Dict[str, Dict[str, Any]]:
+        batch = self.client.batches.retrieve(batch_id)
+        collected = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            content = self.client.files.content(file_id).read().decode("utf-8")
+            for line in content.splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                response = record.get("response") or {}
+                if record.get("error") or response.get("status_code", 200) != 200:
+                    collected[record["custom_id"]] = {"error": str(record.get("error") or response.get("body"))}
+                else:
+                    message = response["body"]["choices"][0]["message"]["content"]
+                    collected[record["custom_id"]] = {"response": message}
+        return collected
+
+
+class LocalBatchEndpoint(BatchEndpoint):
+    """
+    In-process stand-in for a provider batch endpoint.
+    
+    Jobs are answered by a regular client (e.g. a ReplayClient for offline
+    tests) when submitted, so status() is 'completed' straight away.
+    """
+    
+    POLL_INTERVAL = 0.0
+    
+    def __init__(self, llm, concurrency: int = 4):
+        """
+        Args:
+            llm: Client that answers the batch requests
+            concurrency: Max simultaneous requests while answering a batch
+        """
+        self.llm = llm
+        self.concurrency = concurrency
+        self._jobs: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    
+    def submit(self, requests: List[Dict[str, Any]]) -> str:
+        batch_id = f"local_batch_{len(self._jobs) + 1}"
+        first = requests[0]["body"] if requests else {}
+        results = run_many(
+            self.llm,
+            [request["body"]["messages"][-1]["content"] for request in requests],
+            self.concurrency,
+            first.get("max_tokens", 2048),
+            first.get("temperature", 0.7)
+        )
+        self._jobs[batch_id] = {
+            request["custom_id"]: {"response": result["response"]} if result["success"] else {"error": result["error"]}
+            for request, result in zip(requests, results)
+        }
+        return batch_id
+    
+    def status(self, batch_id: str) -> str:
+        return "completed" if batch_id in self._jobs else "failed"
+    
+    def results(self, batch_id: str) -> Dict[str, Dict[str, Any]]:
+        return self._jobs.get(batch_id, {})
@@ -3,11 +3,24 @@ Gemini API Client
 Handles connection and requests to Google's Gemini API
 """
 import os
+import sys
 import time
 import re
-from typing import Optional, Dict, Any
+import asyncio
+import functools
+from pathlib import Path
+from typing import Optional, Dict, Any, List
 import google.generativeai as genai
 
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from llm.response_cache import ResponseCache
+from llm.rate_limiter import get_rate_limiter, is_rate_limit_error
+from llm.batching import run_many, BatchEndpoint
+from utils.deadline import DeadlineExceeded, check_deadline, can_afford, deadline_exceeded
+from utils.call_budget import charge_llm_call, record_attempt
+
 
 class GeminiClient:
     """Wrapper for Gemini API (optimized for code generation)"""
@@ -19,17 +32,21 @@ class GeminiClient:
     ]
     
     MAX_RETRIES = 3
-    RETRY_DELAY = 2  # seconds
+    RETRY_DELAY = 2  # seconds (base for jittered exponential backoff)
     
-    def __init__(self, api_key: Optional[str] = None):
+    PROVIDER = "gemini"
+    
+    def __init__(self, api_key: Optional[str] = None, cache: Optional[ResponseCache] = None):
         self.api_key = api_key or os.getenv("GEMINI_API_KEY")
         if not self.api_key:
             raise ValueError("❌ GEMINI_API_KEY not found in environment")
         
-        # Configure Gemini
+        # Configure Gemini (the legacy SDK keeps one process-wide channel and
+        # does not accept an httpx client, so it is not on the shared transport)
         genai.configure(api_key=self.api_key)
         
         self.current_model = self.MODELS[0]
+        self.cache = cache
         
         print(f"✓ Gemini Client initialized (using legacy API)")
         print(f"   Note: Using google-generativeai 0.1.0rc1 (legacy API)")
@@ -50,20 +67,37 @@ class GeminiClient:
         print(f"   Model: {self.current_model}")
         print(f"   Prompt length: {len(prompt)} chars")
         
+        cache_key = None
+        if self.cache is not None:
+            cache_key = ResponseCache.make_key(self.PROVIDER, self.current_model, prompt, max_tokens, temperature)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                print(f"   ⚡ Cache hit ({len(cached)} chars)")
+                return cached
+        
         last_error = None
+        limiter = get_rate_limiter(self.PROVIDER, self.current_model)
         
         for attempt in range(1, self.MAX_RETRIES + 1):
+            check_deadline("gemini request")
+            record_attempt("gemini", attempt)
+            charge_llm_call("gemini")
             try:
                 print(f"   Attempt {attempt}/{self.MAX_RETRIES}...")
                 
                 # Use legacy text generation API
-                response = genai.generate_text(
-                    model=self.current_model,
-                    prompt=prompt,
-                    temperature=temperature,
-                    max_output_tokens=max_tokens,
-                    candidate_count=1
-                )
+                limiter.acquire()
+                try:
+                    response = genai.generate_text(
+                        model=self.current_model,
+                        prompt=prompt,
+                        temperature=temperature,
+                        max_output_tokens=max_tokens,
+                        candidate_count=1
+                    )
+                finally:
+                    limiter.release()
+                limiter.record_success()
                 
                 # Extract text from response
                 if response.result:
@@ -73,33 +107,175 @@ class GeminiClient:
                     content = self._extract_code_from_markdown(content)
                     
                     print(f"   ✓ Response received ({len(content)} chars)")
+                    
+                    if cache_key is not None:
+                        self.cache.put(cache_key, self.PROVIDER, self.current_model, content)
                     return content
                 else:
                     raise Exception("Empty response from Gemini API")
                 
+            except DeadlineExceeded:
+                # The rate limiter gave up waiting for the job deadline
+                raise
+            
             except Exception as e:
                 last_error = e
-                error_msg = str(e).lower()
                 
                 print(f"   ⚠️  Error: {str(e)[:100]}")
                 
                 # Check for rate limiting or quota issues
-                if "quota" in error_msg or "rate" in error_msg or "limit" in error_msg:
+                if is_rate_limit_error(e):
+                    retry_after = limiter.record_rate_limit(e)
                     if attempt < self.MAX_RETRIES:
-                        print(f"   Waiting {self.RETRY_DELAY}s before retry...")
-                        time.sleep(self.RETRY_DELAY)
+                        delay = limiter.backoff_delay(attempt, self.RETRY_DELAY, retry_after)
+                        if not can_afford(delay):
+                            raise deadline_exceeded("gemini retry backoff")
+                        print(f"   Waiting {delay:.1f}s before retry...")
+                        time.sleep(delay)
                     else:
                         raise Exception(f"Gemini API quota exhausted: {last_error}")
                 
                 else:
-                    # Other error, retry with delay
+                    # Other error, retry with backoff
                     if attempt < self.MAX_RETRIES:
-                        time.sleep(self.RETRY_DELAY)
+                        delay = limiter.backoff_delay(attempt, self.RETRY_DELAY)
+                        if not can_afford(delay):
+                            raise deadline_exceeded("gemini retry backoff")
+                        time.sleep(delay)
                     else:
                         raise Exception(f"Gemini API failed after {self.MAX_RETRIES} attempts: {last_error}")
         
         raise Exception(f"Gemini API failed: {last_error}")
     
+    async def agenerate(self, prompt: str, max_tokens: int = 4096, temperature: float = 0.3) -> str:
+        """
+        Async variant of generate() with the same retry semantics.
+        
+        The legacy text API has no asyncio client, so each request runs on the
+        default executor while retries wait with asyncio.sleep. The model is
+        read once per call and never mutated.
+        
+        Args:
+            prompt: Input text (code generation instructions)
+            max_tokens: Max response length
+            temperature: Lower temp for code generation
+            
+        Returns:
+            Generated code as string
+        """
+        model = self.current_model
+        print(f"\n🌐 Calling Gemini API (legacy, async)...")
+        print(f"   Model: {model}")
+        print(f"   Prompt length: {len(prompt)} chars")
+        
+        cache_key = None
+        if self.cache is not None:
+            cache_key = ResponseCache.make_key(self.PROVIDER, model, prompt, max_tokens, temperature)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                print(f"   ⚡ Cache hit ({len(cached)} chars)")
+                return cached
+        
+        loop = asyncio.get_running_loop()
+        last_error = None
+        limiter = get_rate_limiter(self.PROVIDER, model)
+        
+        for attempt in range(1, self.MAX_RETRIES + 1):
+            check_deadline("gemini request")
+            record_attempt("gemini", attempt)
+            charge_llm_call("gemini")
+            try:
+                print(f"   Attempt {attempt}/{self.MAX_RETRIES}...")
+                
+                await limiter.acquire_async()
+                try:
+                    response = await loop.run_in_executor(
+                        None,
+                        functools.partial(
+                            genai.generate_text,
+                            model=model,
+                            prompt=prompt,
+                            temperature=temperature,
+                            max_output_tokens=max_tokens,
+                            candidate_count=1
+                        )
+                    )
+                finally:
+                    limiter.release()
+                limiter.record_success()
+                
+                if response.result:
+                    content = self._extract_code_from_markdown(response.result)
+                    
+                    print(f"   ✓ Response received ({len(content)} chars)")
+                    
+                    if cache_key is not None:
+                        self.cache.put(cache_key, self.PROVIDER, model, content)
+                    return content
+                else:
+                    raise Exception("Empty response from Gemini API")
+            
+            except DeadlineExceeded:
+                # The rate limiter gave up waiting for the job deadline
+                raise
+            
+            except Exception as e:
+                last_error = e
+                
+                print(f"   ⚠️  Error: {str(e)[:100]}")
+                
+                is_rate_limit = is_rate_limit_error(e)
+                retry_after = limiter.record_rate_limit(e) if is_rate_limit else None
+                
+                if attempt < self.MAX_RETRIES:
+                    delay = limiter.backoff_delay(attempt, self.RETRY_DELAY, retry_after)
+                    if not can_afford(delay):
+                        raise deadline_exceeded("gemini retry backoff")
+                    if is_rate_limit:
+                        print(f"   Waiting {delay:.1f}s before retry...")
+                    await asyncio.sleep(delay)
+                elif is_rate_limit:
+                    raise Exception(f"Gemini API quota exhausted: {last_error}")
+                else:
+                    raise Exception(f"Gemini API failed after {self.MAX_RETRIES} attempts: {last_error}")
+        
+        raise Exception(f"Gemini API failed: {last_error}")
+    
+    def generate_many(self, prompts: List[str], concurrency: int = 4, max_tokens: int = 4096,
+                      temperature: float = 0.3, use_batch_api: bool = False,
+                      batch_endpoint: Optional[BatchEndpoint] = None) -> List[Dict[str, Any]]:
+        """
+        Generate responses for many prompts.
+        
+        Prompts run through agenerate() with bounded concurrency under the
+        shared rate limiter. The legacy text API has no batch endpoint, so
+        batch mode needs an explicit endpoint (e.g. LocalBatchEndpoint).
+        
+        Args:
+            prompts: Input texts
+            concurrency: Max simultaneous requests
+            max_tokens: Max response length
+            temperature: Sampling temperature
+            use_batch_api: Rejected (no provider batch endpoint in the legacy API)
+            batch_endpoint: Batch endpoint to submit to instead
+        
+        Returns:
+            One {"index", "success", "response", "error"} per prompt, in input order
+        """
+        if batch_endpoint is None:
+            if use_batch_api:
+                raise ValueError("The legacy Gemini API has no batch endpoint; pass batch_endpoint explicitly")
+            return run_many(self, prompts, concurrency, max_tokens, temperature)
+        
+        results = batch_endpoint.run(prompts, max_tokens, temperature, self.current_model)
+        for prompt, result in zip(prompts, results):
+            if result["success"]:
+                result["response"] = self._extract_code_from_markdown(result["response"])
+                if self.cache is not None:
+                    key = ResponseCache.make_key(self.PROVIDER, self.current_model, prompt, max_tokens, temperature)
+                    self.cache.put(key, self.PROVIDER, self.current_model, result["response"])
+        return results
+    
     def _extract_code_from_markdown(self, text: str) -> str:
         """
         Extract code from markdown code blocks if present.
@@ -1,15 +1,31 @@
 """
 Groq API Client
-Handles connection, retry logic, and model fallback for Groq inference
+Handles connection, retry logic, and health-aware model routing for Groq inference
 """
 import os
+import sys
 import time
-from typing import Optional, Dict, Any
-from groq import Groq
+import asyncio
+import weakref
+from pathlib import Path
+from typing import Optional, Dict, Any, Iterator, List, Tuple
+from groq import Groq, AsyncGroq
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from llm.response_cache import ResponseCache
+from llm.http_transport import get_http_client, get_async_http_client
+from llm.rate_limiter import get_rate_limiter, is_rate_limit_error
+from llm.model_router import get_model_router, record_routing_decision
+from llm.batching import run_many, GroqBatchEndpoint, BatchEndpoint
+from utils.tracing import start_span, open_span, get_current_span
+from utils.deadline import DeadlineExceeded, check_deadline, can_afford, deadline_exceeded, remaining_time
+from utils.call_budget import charge_llm_call, record_attempt
 
 
 class GroqClient:
-    """Wrapper for Groq API with automatic model fallback"""
+    """Wrapper for Groq API with latency- and health-aware model routing"""
     
     # Model presets for different tasks
     REASONING_MODELS = [
@@ -28,107 +44,547 @@ class GroqClient:
     MODELS = REASONING_MODELS
     
     MAX_RETRIES = 3
-    RETRY_DELAY = 2  # seconds
+    RETRY_DELAY = 2  # seconds (base for jittered exponential backoff)
     
-    def __init__(self, api_key: Optional[str] = None, model_type: str = "reasoning"):
+    PROVIDER = "groq"
+    
+    def __init__(self, api_key: Optional[str] = None, model_type: str = "reasoning",
+                 cache: Optional[ResponseCache] = None):
         self.api_key = api_key or os.getenv("GROQ_API_KEY")
         if not self.api_key:
             raise ValueError("❌ GROQ_API_KEY not found in environment")
         
-        # Initialize Groq client
-        self.client = Groq(api_key=self.api_key)
+        # Initialize Groq client on the process-wide pooled transport
+        self.client = Groq(api_key=self.api_key, http_client=get_http_client())
+        # Async clients are created per event loop (see _get_async_client)
+        self._async_clients = weakref.WeakKeyDictionary()
         
         # Select model list based on task type
         if model_type == "code":
             self.MODELS = self.CODE_MODELS
         else:
             self.MODELS = self.REASONING_MODELS
-            
-        self.current_model = self.MODELS[0]
-        print(f"✓ Groq Client initialized ({model_type} mode, model: {self.current_model})")
+        
+        # Router state is shared by all clients with the same model list
+        self.router = get_model_router(self.PROVIDER, self.MODELS)
+        
+        self.current_model = self.MODELS[0]  # Last routed model (informational only)
+        self.cache = cache
+        self.stream_stats: List[Dict[str, Any]] = []  # One record per generate_stream() call
+        print(f"✓ Groq Client initialized ({model_type} mode, preferred model: {self.current_model})")
+    
+    def _route(self, tried: List[str], pinned: Optional[Tuple[str, str]] = None) -> Tuple[Optional[str], str]:
+        """Ask the router for the next model (or use a caller-pinned one) and record the decision"""
+        if pinned is not None and not tried:
+            model, reason = pinned
+        else:
+            model, reason = self.router.choose(exclude=tried)
+        if model is not None:
+            self.current_model = model
+            record_routing_decision(self.PROVIDER, model, reason)
+            print(f"   Model: {model} ({reason})")
+        return model, reason
+    
+    def _cache_lookup(self, prompt: str, max_tokens: int, temperature: float) -> Optional[str]:
+        """Return a cached response produced by any of this client's models"""
+        if self.cache is None:
+            return None
+        for model in self.MODELS:
+            cached = self.cache.get(ResponseCache.make_key(self.PROVIDER, model, prompt, max_tokens, temperature))
+            if cached is not None:
+                print(f"   ⚡ Cache hit ({len(cached)} chars, {model})")
+                return cached
+        return None
+    
+    def _cache_store(self, model: str, prompt: str, max_tokens: int, temperature: float, response: str):
+        if self.cache is not None:
+            key = ResponseCache.make_key(self.PROVIDER, model, prompt, max_tokens, temperature)
+            self.cache.put(key, self.PROVIDER, model, response)
+    
+    @staticmethod
+    def _request_options() -> Dict[str, Any]:
+        """Per-request HTTP timeout bounded by the job deadline (if any)"""
+        remaining = remaining_time()
+        return {"timeout": max(1.0, remaining)} if remaining is not None else {}
+    
+    def _should_fall_back(self, error: Exception) -> bool:
+        """Rate limits and unavailable models move on to another model; other errors are fatal"""
+        return is_rate_limit_error(error) or "model" in str(error).lower()
+    
+    def _check_attempt(self, model: str, attempt: int):
+        """Raise if the job cannot afford another request; a refused attempt hands its model back to the router"""
+        try:
+            check_deadline("groq request")
+            record_attempt("groq", attempt)
+            charge_llm_call("groq")
+        except Exception:
+            self.router.release(model)
+            raise
+    
+    def _call_span(self, prompt: str, max_tokens: int, temperature: float, name: str):
+        return start_span(name, kind="CLIENT", gen_ai__system=self.PROVIDER, aoai__prompt_chars=len(prompt),
+                          gen_ai__request__max_tokens=max_tokens, gen_ai__request__temperature=temperature)
+    
+    def _attempt_span(self, model: str, attempt: int):
+        return open_span("groq.attempt", kind="CLIENT", gen_ai__system=self.PROVIDER,
+                         gen_ai__request__model=model, aoai__attempt=attempt)
+    
+    @staticmethod
+    def _end_attempt_span(span, chat_completion, response: str):
+        usage = getattr(chat_completion, "usage", None)
+        span.set_attributes(
+            gen_ai__usage__input_tokens=getattr(usage, "prompt_tokens", None),
+            gen_ai__usage__output_tokens=getattr(usage, "completion_tokens", None),
+            aoai__response_chars=len(response)
+        )
+        span.set_status("OK")
+        span.end()
     
     def generate(self, prompt: str, max_tokens: int = 2048, temperature: float = 0.7) -> str:
+        """Traced wrapper around _generate() (see there)"""
+        with self._call_span(prompt, max_tokens, temperature, "groq.generate"):
+            return self._generate(prompt, max_tokens, temperature)
+    
+    def _generate(self, prompt: str, max_tokens: int = 2048, temperature: float = 0.7) -> str:
         """
         Send prompt to Groq API and return response.
         
+        Each request is routed to the fastest healthy model; after MAX_RETRIES
+        rate-limit or model errors it is re-routed to another model.
+        
         Args:
             prompt: Input text
             max_tokens: Max response length
             temperature: Sampling temperature
-            
+        
         Returns:
             Model response as string
         """
         print(f"\n🌐 Calling Groq API...")
-        print(f"   Model: {self.current_model}")
         print(f"   Prompt length: {len(prompt)} chars")
         
+        cached = self._cache_lookup(prompt, max_tokens, temperature)
+        if cached is not None:
+            get_current_span().set_attribute("aoai.cache_hit", True)
+            return cached
+        
         last_error = None
+        tried: List[str] = []
         
-        for attempt in range(1, self.MAX_RETRIES + 1):
-            try:
-                print(f"   Attempt {attempt}/{self.MAX_RETRIES}...")
-                
-                # Call Groq API
-                chat_completion = self.client.chat.completions.create(
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    model=self.current_model,
-                    max_tokens=max_tokens,
-                    temperature=temperature
-                )
+        while True:
+            model, _ = self._route(tried)
+            if model is None:
+                raise Exception(f"All Groq models failed: {last_error}")
+            tried.append(model)
+            limiter = get_rate_limiter(self.PROVIDER, model)
+            
+            for attempt in range(1, self.MAX_RETRIES + 1):
+                self._check_attempt(model, (len(tried) - 1) * self.MAX_RETRIES + attempt)
+                start = time.perf_counter()
+                attempt_span = self._attempt_span(model, attempt)
+                try:
+                    print(f"   Attempt {attempt}/{self.MAX_RETRIES}...")
+                    
+                    # Call Groq API (raw response exposes rate-limit headers)
+                    limiter.acquire()
+                    try:
+                        raw = self.client.chat.completions.with_raw_response.create(
+                            messages=[
+                                {
+                                    "role": "user",
+                                    "content": prompt
+                                }
+                            ],
+                            model=model,
+                            max_tokens=max_tokens,
+                            temperature=temperature,
+                            **self._request_options()
+                        )
+                    finally:
+                        limiter.release()
+                    limiter.record_success(raw.headers)
+                    chat_completion = raw.parse()
+                    self.router.record_success(model, time.perf_counter() - start)
+                    
+                    # Extract response
+                    response = chat_completion.choices[0].message.content
+                    
+                    print(f"   ✓ Response received ({len(response)} chars)")
+                    self._end_attempt_span(attempt_span, chat_completion, response)
+                    
+                    self._cache_store(model, prompt, max_tokens, temperature, response)
+                    return response
                 
-                # Extract response
-                response = chat_completion.choices[0].message.content
+                except DeadlineExceeded as e:
+                    # The rate limiter gave up waiting for the job deadline: not a model failure
+                    self.router.release(model)
+                    attempt_span.record_exception(e)
+                    attempt_span.end()
+                    raise
                 
-                print(f"   ✓ Response received ({len(response)} chars)")
-                return response
+                except Exception as e:
+                    last_error = e
+                    self.router.record_failure(model, time.perf_counter() - start)
+                    attempt_span.record_exception(e)
+                    attempt_span.end()
+                    
+                    print(f"   ⚠️  Error: {str(e)[:100]}")
+                    
+                    is_rate_limit = is_rate_limit_error(e)
+                    retry_after = limiter.record_rate_limit(e) if is_rate_limit else None
+                    
+                    if attempt < self.MAX_RETRIES:
+                        delay = limiter.backoff_delay(attempt, self.RETRY_DELAY, retry_after)
+                        if not can_afford(delay):
+                            raise deadline_exceeded("groq retry backoff")
+                        if is_rate_limit:
+                            print(f"   Waiting {delay:.1f}s before retry...")
+                        time.sleep(delay)
+                    elif self._should_fall_back(e):
+                        print(f"⚠️  Re-routing away from: {model}")
+                        get_current_span().add_event("fallback", gen_ai__request__model=model,
+                                                     exception__message=str(e)[:200])
+                    else:
+                        raise Exception(f"Groq API failed after {self.MAX_RETRIES} attempts: {last_error}")
+    
+    async def agenerate(self, prompt: str, max_tokens: int = 2048, temperature: float = 0.7,
+                        model: Optional[str] = None, reason: str = "pinned by caller") -> str:
+        """Traced wrapper around _agenerate() (see there)"""
+        with self._call_span(prompt, max_tokens, temperature, "groq.agenerate"):
+            return await self._agenerate(prompt, max_tokens, temperature, model, reason)
+    
+    async def _agenerate(self, prompt: str, max_tokens: int = 2048, temperature: float = 0.7,
+                         model: Optional[str] = None, reason: str = "pinned by caller") -> str:
+        """
+        Async variant of generate() with the same retry and routing semantics.
+        
+        Routing state lives in the shared router and tried models are tracked
+        per call, so concurrent calls never interfere.
+        
+        Args:
+            prompt: Input text
+            max_tokens: Max response length
+            temperature: Sampling temperature
+            model: Use this model for the first attempt instead of asking the router
+            reason: Routing reason recorded for a pinned model
+        
+        Returns:
+            Model response as string
+        """
+        print(f"\n🌐 Calling Groq API (async)...")
+        print(f"   Prompt length: {len(prompt)} chars")
+        
+        cached = self._cache_lookup(prompt, max_tokens, temperature)
+        if cached is not None:
+            get_current_span().set_attribute("aoai.cache_hit", True)
+            return cached
+        
+        last_error = None
+        tried: List[str] = []
+        pinned = (model, reason) if model is not None else None
+        
+        while True:
+            model, _ = self._route(tried, pinned)
+            if model is None:
+                raise Exception(f"All Groq models failed: {last_error}")
+            tried.append(model)
+            limiter = get_rate_limiter(self.PROVIDER, model)
+            
+            for attempt in range(1, self.MAX_RETRIES + 1):
+                self._check_attempt(model, (len(tried) - 1) * self.MAX_RETRIES + attempt)
+                start = time.perf_counter()
+                attempt_span = self._attempt_span(model, attempt)
+                try:
+                    print(f"   Attempt {attempt}/{self.MAX_RETRIES}...")
+                    
+                    await limiter.acquire_async()
+                    try:
+                        raw = await self._get_async_client().chat.completions.with_raw_response.create(
+                            messages=[
+                                {
+                                    "role": "user",
+                                    "content": prompt
+                                }
+                            ],
+                            model=model,
+                            max_tokens=max_tokens,
+                            temperature=temperature,
+                            **self._request_options()
+                        )
+                    finally:
+                        limiter.release()
+                    limiter.record_success(raw.headers)
+                    chat_completion = await raw.parse()
+                    self.router.record_success(model, time.perf_counter() - start)
+                    
+                    response = chat_completion.choices[0].message.content
+                    
+                    print(f"   ✓ Response received ({len(response)} chars)")
+                    self._end_attempt_span(attempt_span, chat_completion, response)
+                    
+                    self._cache_store(model, prompt, max_tokens, temperature, response)
+                    return response
                 
-            except Exception as e:
-                last_error = e
-                error_msg = str(e).lower()
+                except asyncio.CancelledError:
+                    # Abandoned by the caller (e.g. the losing hedge request): not a model failure
+                    self.router.record_cancelled(model, time.perf_counter() - start)
+                    attempt_span.add_event("cancelled")
+                    attempt_span.set_status("ERROR", "cancelled")
+                    attempt_span.end()
+                    raise
                 
-                print(f"   ⚠️  Error: {str(e)[:100]}")
+                except DeadlineExceeded as e:
+                    # The rate limiter gave up waiting for the job deadline: not a model failure
+                    self.router.release(model)
+                    attempt_span.record_exception(e)
+                    attempt_span.end()
+                    raise
                 
-                # Check if rate limited or model unavailable
-                if "rate" in error_msg or "limit" in error_msg or "quota" in error_msg:
+                except Exception as e:
+                    last_error = e
+                    self.router.record_failure(model, time.perf_counter() - start)
+                    attempt_span.record_exception(e)
+                    attempt_span.end()
+                    
+                    print(f"   ⚠️  Error: {str(e)[:100]}")
+                    
+                    is_rate_limit = is_rate_limit_error(e)
+                    retry_after = limiter.record_rate_limit(e) if is_rate_limit else None
+                    
                     if attempt < self.MAX_RETRIES:
-                        print(f"   Waiting {self.RETRY_DELAY}s before retry...")
-                        time.sleep(self.RETRY_DELAY)
+                        delay = limiter.backoff_delay(attempt, self.RETRY_DELAY, retry_after)
+                        if not can_afford(delay):
+                            raise deadline_exceeded("groq retry backoff")
+                        if is_rate_limit:
+                            print(f"   Waiting {delay:.1f}s before retry...")
+                        await asyncio.sleep(delay)
+                    elif self._should_fall_back(e):
+                        print(f"⚠️  Re-routing away from: {model}")
+                        get_current_span().add_event("fallback", gen_ai__request__model=model,
+                                                     exception__message=str(e)[:200])
                     else:
-                        # Try fallback model
-                        try:
-                            self._fallback_model()
-                            return self.generate(prompt, max_tokens, temperature)
-                        except Exception as fallback_error:
-                            raise Exception(f"All Groq models failed: {fallback_error}")
+                        raise Exception(f"Groq API failed after {self.MAX_RETRIES} attempts: {last_error}")
+    
+    def generate_many(self, prompts: List[str], concurrency: int = 4, max_tokens: int = 2048,
+                      temperature: float = 0.7, use_batch_api: bool = False,
+                      batch_endpoint: Optional[BatchEndpoint] = None) -> List[Dict[str, Any]]:
+        """
+        Generate responses for many prompts.
+        
+        By default prompts run through agenerate() with bounded concurrency
+        under the shared rate limiter. With use_batch_api (or an explicit
+        endpoint) cache misses are submitted as one offline batch job instead.
+        
+        Args:
+            prompts: Input texts
+            concurrency: Max simultaneous requests
+            max_tokens: Max response length
+            temperature: Sampling temperature
+            use_batch_api: Submit through Groq's Batch API
+            batch_endpoint: Batch endpoint to use instead (e.g. LocalBatchEndpoint)
+        
+        Returns:
+            One {"index", "success", "response", "error"} per prompt, in input order
+        """
+        if use_batch_api and batch_endpoint is None:
+            batch_endpoint = GroqBatchEndpoint(self)
+        if batch_endpoint is None:
+            return run_many(self, prompts, concurrency, max_tokens, temperature)
+        
+        # Cache hits are answered locally; only misses go into the batch job
+        results: List[Optional[Dict[str, Any]]] = [None] * len(prompts)
+        pending = []
+        for index, prompt in enumerate(prompts):
+            cached = self._cache_lookup(prompt, max_tokens, temperature)
+            if cached is not None:
+                results[index] = {"index": index, "success": True, "response": cached, "error": None}
+            else:
+                pending.append(index)
+        
+        if pending:
+            model, _ = self._route([])
+            batch_results = batch_endpoint.run([prompts[i] for i in pending], max_tokens, temperature, model)
+            for index, result in zip(pending, batch_results):
+                result["index"] = index
+                results[index] = result
+                if result["success"]:
+                    self._cache_store(model, prompts[index], max_tokens, temperature, result["response"])
+        
+        return results
+    
+    def _get_async_client(self) -> AsyncGroq:
+        """Return an AsyncGroq bound to the running loop's shared async transport"""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = AsyncGroq(api_key=self.api_key, http_client=get_async_http_client())
+            self._async_clients[loop] = client
+        return client
+    
+    def generate_stream(self, prompt: str, max_tokens: int = 2048, temperature: float = 0.7) -> Iterator[str]:
+        """
+        Stream the response as text chunks.
+        
+        Closing the generator early (e.g. when a caller's incremental parser
+        detects a bad response) closes the HTTP stream so the remaining tokens
+        are never generated. Time-to-first-token and aborted-token counts are
+        appended to self.stream_stats.
+        
+        Args:
+            prompt: Input text
+            max_tokens: Max response length
+            temperature: Sampling temperature
+        
+        Yields:
+            Response text chunks
+        """
+        print(f"\n🌐 Calling Groq API (streaming)...")
+        print(f"   Prompt length: {len(prompt)} chars")
+        
+        cached = self._cache_lookup(prompt, max_tokens, temperature)
+        if cached is not None:
+            yield cached
+            return
+        
+        stream, model, start = self._open_stream(prompt, max_tokens, temperature)
+        
+        stats = {
+            "model": model,
+            "ttft_seconds": None,
+            "duration_seconds": None,
+            "tokens_received": 0,
+            "max_tokens": max_tokens,
+            "aborted": False,
+            "aborted_tokens": 0
+        }
+        self.stream_stats.append(stats)
+        
+        parts = []
+        
+        try:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                
+                if stats["ttft_seconds"] is None:
+                    stats["ttft_seconds"] = time.perf_counter() - start
+                    print(f"   ⏱️  First token after {stats['ttft_seconds']:.2f}s")
                 
-                elif "model" in error_msg and attempt == self.MAX_RETRIES:
-                    # Model not available, try fallback
+                # Groq streams roughly one token per chunk
+                stats["tokens_received"] += 1
+                parts.append(delta)
+                yield delta
+        
+        except GeneratorExit:
+            # Caller aborted: stop generation server-side
+            stats["aborted"] = True
+            # What would have followed is unknown, so report what was received and discarded
+            stats["aborted_tokens"] = stats["tokens_received"]
+            stream.close()
+            # Not the model's fault; releases a half-open probe
+            self.router.record_cancelled(model, time.perf_counter() - start)
+            print(f"   ✂️  Stream aborted after {stats['tokens_received']} tokens")
+            raise
+        
+        except Exception:
+            # Connection dropped or the server errored mid-stream
+            self.router.record_failure(model, time.perf_counter() - start)
+            raise
+        
+        finally:
+            stats["duration_seconds"] = time.perf_counter() - start
+        
+        # Only complete streams feed the router's latency window
+        self.router.record_success(model, stats["duration_seconds"])
+        
+        response = "".join(parts)
+        print(f"   ✓ Stream complete ({len(response)} chars)")
+        
+        self._cache_store(model, prompt, max_tokens, temperature, response)
+    
+    def _open_stream(self, prompt: str, max_tokens: int, temperature: float):
+        """
+        Open a streaming completion with the same retry/routing rules as generate().
+        
+        Returns:
+            (stream, model, start_time)
+        """
+        last_error = None
+        tried: List[str] = []
+        
+        while True:
+            model, _ = self._route(tried)
+            if model is None:
+                raise Exception(f"All Groq models failed: {last_error}")
+            tried.append(model)
+            limiter = get_rate_limiter(self.PROVIDER, model)
+            
+            for attempt in range(1, self.MAX_RETRIES + 1):
+                self._check_attempt(model, (len(tried) - 1) * self.MAX_RETRIES + attempt)
+                start = time.perf_counter()
+                try:
+                    print(f"   Attempt {attempt}/{self.MAX_RETRIES}...")
+                    limiter.acquire()
                     try:
-                        self._fallback_model()
-                        return self.generate(prompt, max_tokens, temperature)
-                    except Exception as fallback_error:
-                        raise Exception(f"Model fallback failed: {fallback_error}")
+                        stream = self.client.chat.completions.create(
+                            messages=[
+                                {
+                                    "role": "user",
+                                    "content": prompt
+                                }
+                            ],
+                            model=model,
+                            max_tokens=max_tokens,
+                            temperature=temperature,
+                            stream=True,
+                            **self._request_options()
+                        )
+                    finally:
+                        limiter.release()
+                    limiter.record_success(getattr(getattr(stream, "response", None), "headers", None))
+                    return stream, model, start
+                
+                except DeadlineExceeded:
+                    # The rate limiter gave up waiting for the job deadline
+                    self.router.release(model)
+                    raise
                 
-                else:
-                    # Other error, retry with delay
+                except Exception as e:
+                    last_error = e
+                    self.router.record_failure(model, time.perf_counter() - start)
+                    
+                    print(f"   ⚠️  Error: {str(e)[:100]}")
+                    
+                    is_rate_limit = is_rate_limit_error(e)
+                    retry_after = limiter.record_rate_limit(e) if is_rate_limit else None
+                    
                     if attempt < self.MAX_RETRIES:
-                        time.sleep(self.RETRY_DELAY)
+                        delay = limiter.backoff_delay(attempt, self.RETRY_DELAY, retry_after)
+                        if not can_afford(delay):
+                            raise deadline_exceeded("groq retry backoff")
+                        if is_rate_limit:
+                            print(f"   Waiting {delay:.1f}s before retry...")
+                        time.sleep(delay)
+                    elif self._should_fall_back(e):
+                        print(f"⚠️  Re-routing away from: {model}")
                     else:
                         raise Exception(f"Groq API failed after {self.MAX_RETRIES} attempts: {last_error}")
-        
-        raise Exception(f"Groq API failed: {last_error}")
     
-    def _fallback_model(self):
-        """Switch to next available model"""
-        current_idx = self.MODELS.index(self.current_model)
-        if current_idx < len(self.MODELS) - 1:
-            self.current_model = self.MODELS[current_idx + 1]
-            print(f"⚠️  Falling back to: {self.current_model}")
-        else:
-            raise Exception("All Groq models exhausted")
+    def stream_summary(self) -> Dict[str, Any]:
+        """
+        Aggregate streaming statistics.
+        
+        Returns:
+            {"streams", "aborted", "aborted_tokens", "mean_ttft_seconds"}
+            where aborted_tokens counts the tokens received by aborted streams
+        """
+        ttfts = [s["ttft_seconds"] for s in self.stream_stats if s["ttft_seconds"] is not None]
+        return {
+            "streams": len(self.stream_stats),
+            "aborted": sum(1 for s in self.stream_stats if s["aborted"]),
+            "aborted_tokens": sum(s["aborted_tokens"] for s in self.stream_stats),
+            "mean_ttft_seconds": sum(ttfts) / len(ttfts) if ttfts else None
+        }
@@ -0,0 +1,230 @@
+"""
+Hedged LLM Requests
+Send a duplicate request when the first one is slower than recent latency suggests;
+the first valid answer wins and the other request is cancelled
+"""
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+from typing import Optional, Dict, Any, Callable
+
+
+class HedgedClient:
+    """Wraps an LLM client with opt-in request hedging"""
+    
+    WINDOW = 100        # recent latencies used for the hedge threshold
+    MIN_SAMPLES = 5     # below this, initial_delay is used as the threshold
+    
+    def __init__(self, client, alternate=None, percentile: float = 95.0,
+                 initial_delay: float = 10.0, min_delay: float = 0.5,
+                 validator: Optional[Callable[[str], bool]] = None):
+        """
+        Args:
+            client: Primary client (GroqClient, GeminiClient, ...) with agenerate()
+            alternate: Client for the hedge request (e.g. the other provider);
+                       defaults to the primary client's next-best model
+            percentile: Hedge once a request outlives this percentile of recent latency
+            initial_delay: Threshold (seconds) until enough latencies are observed
+            min_delay: Lower bound on the threshold (seconds)
+            validator: Returns False for responses that must not win the race
+        """
+        self.client = client
+        self.alternate = alternate
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.validator = validator or (lambda response: bool(response and response.strip()))
+        
+        self.latencies = deque(maxlen=self.WINDOW)
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.latency_saved = 0.0
+        self._lock = threading.Lock()
+        
+        # Dedicated loop so blocking generate() calls can share one async transport
+        self._loop = None
+        self._loop_lock = threading.Lock()
+        
+        target = "alternate provider" if alternate is not None else "next model"
+        print(f"✓ Hedging enabled (p{percentile:.0f} threshold, hedge to {target})")
+    
+    # ------------------------------------------------------------------
+    # Threshold
+    # ------------------------------------------------------------------
+    
+    def _sorted_latencies(self):
+        with self._lock:
+            return sorted(self.latencies)
+    
+    def hedge_delay(self) -> float:
+        """Seconds to wait before sending the hedge request"""
+        ordered = self._sorted_latencies()
+        if len(ordered) < self.MIN_SAMPLES:
+            return self.initial_delay
+        index = min(len(ordered) - 1, max(0, math.ceil(self.percentile / 100.0 * len(ordered)) - 1))
+        return max(self.min_delay, ordered[index])
+    
+    def _estimate_saved(self, threshold: float, elapsed: float) -> float:
+        """
+        Estimate latency saved by a winning hedge.
+        
+        The cancelled request's real latency is unknown, so use the mean of
+        past requests that were slower than the threshold (the tail it was in).
+        """
+        tail = [latency for latency in self._sorted_latencies() if latency > threshold]
+        if not tail:
+            return 0.0
+        return max(0.0, sum(tail) / len(tail) - elapsed)
+    
+    # ------------------------------------------------------------------
+    # Requests
+    # ------------------------------------------------------------------
+    
+    def _primary_call(self, prompt: str, max_tokens: int, temperature: float):
+        """Coroutine for the primary request (pinned to the router's choice when possible)"""
+        router = getattr(self.client, "router", None)
+        if router is None:
+            return self.client.agenerate(prompt, max_tokens, temperature), None
+        
+        model, reason = router.choose()
+        return self.client.agenerate(prompt, max_tokens, temperature, model=model, reason=reason), model
+    
+    def _hedge_call(self, prompt: str, max_tokens: int, temperature: float, primary_model: Optional[str]):
+        """Coroutine for the hedge request, or None if there is nowhere to hedge to"""
+        if self.alternate is not None:
+            return self.alternate.agenerate(prompt, max_tokens, temperature)
+        
+        router = getattr(self.client, "router", None)
+        if router is None:
+            return None
+        
+        model, reason = router.choose(exclude=[primary_model] if primary_model else ())
+        if model is None:
+            return None
+        return self.client.agenerate(prompt, max_tokens, temperature, model=model, reason=f"hedge: {reason}")
+    
+    async def agenerate(self, prompt: str, max_tokens: int = 2048, temperature: float = 0.7) -> str:
+        """
+        Generate with hedging.
+        
+        Args:
+            prompt: Input text
+            max_tokens: Max response length
+            temperature: Sampling temperature
+        
+        Returns:
+            First valid response from the primary or hedge request
+        """
+        start = time.perf_counter()
+        threshold = self.hedge_delay()
+        with self._lock:
+            self.requests += 1
+        
+        primary_coro, primary_model = self._primary_call(prompt, max_tokens, temperature)
+        primary = asyncio.ensure_future(primary_coro)
+        
+        done, _ = await asyncio.wait({primary}, timeout=threshold)
+        if done:
+            response = primary.result()
+            self._record_latency(time.perf_counter() - start)
+            return response
+        
+        hedge_coro = self._hedge_call(prompt, max_tokens, temperature, primary_model)
+        if hedge_coro is None:
+            response = await primary
+            self._record_latency(time.perf_counter() - start)
+            return response
+        
+        print(f"   🪁 No answer after {threshold:.2f}s, sending hedge request")
+        hedge = asyncio.ensure_future(hedge_coro)
+        with self._lock:
+            self.hedges += 1
+        
+        pending = {primary, hedge}
+        last_error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                        continue
+                    response = task.result()
+                    if not self.validator(response):
+                        last_error = ValueError("Hedged response failed validation")
+                        continue
+                    
+                    elapsed = time.perf_counter() - start
+                    self._record_latency(elapsed)
+                    if task is hedge:
+                        saved = self._estimate_saved(threshold, elapsed)
+                        with self._lock:
+                            self.hedge_wins += 1
+                            self.latency_saved += saved
+                        print(f"   🪁 Hedge won after {elapsed:.2f}s (~{saved:.2f}s saved)")
+                    return response
+        finally:
+            # Cancel the loser (and anything still running on error)
+            for task in pending:
+                task.cancel()
+        
+        raise last_error or Exception("Hedged request failed")
+    
+    def generate(self, prompt: str, max_tokens: int = 2048, temperature: float = 0.7) -> str:
+        """
+        Blocking generate() with hedging, run on the wrapper's event loop thread.
+        
+        Args:
+            prompt: Input text
+            max_tokens: Max response length
+            temperature: Sampling temperature
+        
+        Returns:
+            First valid response
+        """
+        future = asyncio.run_coroutine_threadsafe(
+            self._run_in_context(contextvars.copy_context(), prompt, max_tokens, temperature),
+            self._get_loop()
+        )
+        return future.result()
+    
+    async def _run_in_context(self, context: contextvars.Context, prompt: str, max_tokens: int, temperature: float):
+        """Carry the caller's context variables (e.g. the run's routing log) onto the loop thread"""
+        for var, value in context.items():
+            var.set(value)
+        return await self.agenerate(prompt, max_tokens, temperature)
+    
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """Start (once) the background event loop used by generate()"""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=self._loop.run_forever, name="hedging-loop", daemon=True)
+                thread.start()
+            return self._loop
+    
+    def _record_latency(self, latency: float):
+        with self._lock:
+            self.latencies.append(latency)
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Hedging statistics for threshold tuning.
+        
+        Returns:
+            {"requests", "hedges", "hedge_rate", "hedge_wins", "latency_saved_seconds", "threshold_seconds"}
+        """
+        with self._lock:
+            requests, hedges, wins, saved = self.requests, self.hedges, self.hedge_wins, self.latency_saved
+        return {
+            "requests": requests,
+            "hedges": hedges,
+            "hedge_rate": hedges / requests if requests else 0.0,
+            "hedge_wins": wins,
+            "latency_saved_seconds": round(saved, 3),
+            "threshold_seconds": round(self.hedge_delay(), 3)
+        }
@@ -0,0 +1,165 @@
+"""
+Shared HTTP Transport
+Process-wide pooled httpx clients (keep-alive, HTTP/2 when available) for all LLM clients
+"""
+import asyncio
+import threading
+import weakref
+from typing import Dict, Any, Optional
+
+import httpx
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+# Pool configuration (override with configure_transport() before clients are built)
+_config = {
+    "max_connections": 20,
+    "max_keepalive_connections": 10,
+    "keepalive_expiry": 60.0,  # seconds
+    "http2": HTTP2_AVAILABLE
+}
+
+_lock = threading.Lock()
+_sync_client: Optional[httpx.Client] = None
+# Async connections are bound to the event loop that opened them
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+class _ConnectionStats:
+    """Counts requests vs. newly opened connections across all transports"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+        self.seen = weakref.WeakSet()
+    
+    def record(self, pool):
+        """Record one request and any connections the pool opened for it"""
+        with self.lock:
+            self.requests += 1
+            for connection in list(getattr(pool, "connections", [])):
+                if connection not in self.seen:
+                    self.seen.add(connection)
+                    self.connections_opened += 1
+
+
+_stats = _ConnectionStats()
+
+
+class CountingTransport(httpx.HTTPTransport):
+    """HTTPTransport that reports connection reuse to the shared stats"""
+    
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        response = super().handle_request(request)
+        _stats.record(self._pool)
+        return response
+
+
+class AsyncCountingTransport(httpx.AsyncHTTPTransport):
+    """AsyncHTTPTransport that reports connection reuse to the shared stats"""
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await super().handle_async_request(request)
+        _stats.record(self._pool)
+        return response
+
+
+def configure_transport(max_connections: Optional[int] = None,
+                        max_keepalive_connections: Optional[int] = None,
+                        keepalive_expiry: Optional[float] = None,
+                        http2: Optional[bool] = None):
+    """
+    Set pool limits for the shared clients.
+    
+    Must be called before the first client is created; later calls only
+    affect event loops that have not opened an async client yet.
+    
+    Args:
+        max_connections: Total connections across all hosts
+        max_keepalive_connections: Idle connections kept open for reuse
+        keepalive_expiry: Seconds an idle connection stays in the pool
+        http2: Force HTTP/2 on/off (defaults to on when 'h2' is installed)
+    """
+    with _lock:
+        if max_connections is not None:
+            _config["max_connections"] = max_connections
+        if max_keepalive_connections is not None:
+            _config["max_keepalive_connections"] = max_keepalive_connections
+        if keepalive_expiry is not None:
+            _config["keepalive_expiry"] = keepalive_expiry
+        if http2 is not None:
+            _config["http2"] = http2 and HTTP2_AVAILABLE
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=_config["max_connections"],
+        max_keepalive_connections=_config["max_keepalive_connections"],
+        keepalive_expiry=_config["keepalive_expiry"]
+    )
+
+
+def get_http_client() -> httpx.Client:
+    """
+    Return the process-wide blocking httpx client.
+    
+    Returns:
+        Shared httpx.Client
+    """
+    global _sync_client
+    with _lock:
+        if _sync_client is None:
+            _sync_client = httpx.Client(
+                transport=CountingTransport(http2=_config["http2"], limits=_limits()),
+                timeout=httpx.Timeout(60.0, connect=10.0)
+            )
+            print(f"✓ Shared HTTP transport initialized "
+                  f"(max {_config['max_connections']} connections, "
+                  f"HTTP/2: {'on' if _config['http2'] else 'off'})")
+        return _sync_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Return the shared async httpx client for the running event loop.
+    
+    Returns:
+        Shared httpx.AsyncClient
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                transport=AsyncCountingTransport(http2=_config["http2"], limits=_limits()),
+                timeout=httpx.Timeout(60.0, connect=10.0)
+            )
+            _async_clients[loop] = client
+        return client
+
+
+def transport_stats() -> Dict[str, Any]:
+    """
+    Connection reuse metrics across all shared clients.
+    
+    Returns:
+        {"requests", "connections_opened", "reused", "reuse_rate", "http2"}
+    """
+    with _stats.lock:
+        requests = _stats.requests
+        opened = _stats.connections_opened
+    
+    reused = max(0, requests - opened)
+    return {
+        "requests": requests,
+        "connections_opened": opened,
+        "reused": reused,
+        "reuse_rate": reused / requests if requests else 0.0,
+        "http2": _config["http2"]
+    }
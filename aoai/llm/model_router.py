@@ -0,0 +1,217 @@
+"""
+Model Router
+Latency- and health-aware model selection with per-model circuit breakers
+"""
+import math
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, List, Tuple, Iterable
+
+
+# Per-run list that collects routing decisions (set by the Orchestrator)
+routing_decisions: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("routing_decisions", default=None)
+
+
+def record_routing_decision(provider: str, model: str, reason: str):
+    """Append a routing decision to the current run's log, if one is active"""
+    decisions = routing_decisions.get()
+    if decisions is not None:
+        decisions.append({
+            "provider": provider,
+            "model": model,
+            "reason": reason,
+            "timestamp": time.time()
+        })
+
+
+def _percentile(values: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile (p in 0..100)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(p / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class ModelHealth:
+    """Rolling latency/error window and circuit breaker for one model"""
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, model: str, window: int):
+        self.model = model
+        self.samples = deque(maxlen=window)  # (latency_seconds, ok)
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+    
+    def latencies(self) -> List[float]:
+        return [latency for latency, ok in self.samples if ok]
+    
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+
+class ModelRouter:
+    """Picks the fastest healthy model for each request"""
+    
+    WINDOW = 50                # samples kept per model
+    FAILURE_THRESHOLD = 3      # consecutive failures that open the breaker
+    OPEN_SECONDS = 30.0        # cool-down before a half-open probe
+    MAX_ERROR_RATE = 0.5       # closed models above this are deprioritized
+    
+    def __init__(self, provider: str, models: Iterable[str]):
+        """
+        Args:
+            provider: Provider name (for logs)
+            models: Candidate models in preference order
+        """
+        self.provider = provider
+        self.models = list(models)
+        self.health = {model: ModelHealth(model, self.WINDOW) for model in self.models}
+        self._lock = threading.Lock()
+    
+    def _refresh_locked(self, health: ModelHealth):
+        """Move open breakers to half-open once the cool-down has passed"""
+        if health.state == ModelHealth.OPEN and time.time() - health.opened_at >= self.OPEN_SECONDS:
+            health.state = ModelHealth.HALF_OPEN
+            health.probe_in_flight = False
+    
+    def choose(self, exclude: Iterable[str] = ()) -> Tuple[Optional[str], str]:
+        """
+        Pick a model for the next request.
+        
+        Args:
+            exclude: Models already tried for this request
+        
+        Returns:
+            (model or None if every candidate is excluded, reason)
+        """
+        excluded = set(exclude)
+        with self._lock:
+            candidates = [self.health[m] for m in self.models if m not in excluded]
+            if not candidates:
+                return None, "all models tried"
+            
+            for health in candidates:
+                self._refresh_locked(health)
+            
+            # Half-open breakers get exactly one probe request
+            for health in candidates:
+                if health.state == ModelHealth.HALF_OPEN and not health.probe_in_flight:
+                    health.probe_in_flight = True
+                    return health.model, f"half-open probe after {self.OPEN_SECONDS:.0f}s cool-down"
+            
+            closed = [h for h in candidates if h.state == ModelHealth.CLOSED]
+            if not closed:
+                # Everything is tripped: use the breaker that reopens soonest
+                soonest = min(candidates, key=lambda h: h.opened_at)
+                return soonest.model, "all circuits open; using least recently tripped model"
+            
+            healthy = [h for h in closed if h.error_rate() <= self.MAX_ERROR_RATE] or closed
+            
+            def score(health):
+                p50 = _percentile(health.latencies(), 50)
+                return (p50 if p50 is not None else float("inf"), self.models.index(health.model))
+            
+            best = min(healthy, key=score)
+            p50 = _percentile(best.latencies(), 50)
+            if p50 is None:
+                reason = "preferred order (no latency data yet)"
+            elif len(healthy) == 1:
+                reason = f"only healthy model (p50 {p50:.2f}s)"
+            else:
+                reason = f"fastest healthy model (p50 {p50:.2f}s)"
+            if excluded:
+                reason += f"; fallback from {', '.join(sorted(excluded))}"
+            return best.model, reason
+    
+    def record_success(self, model: str, latency: float):
+        """Close the breaker and record latency"""
+        with self._lock:
+            health = self.health[model]
+            health.samples.append((latency, True))
+            health.consecutive_failures = 0
+            health.state = ModelHealth.CLOSED
+            health.probe_in_flight = False
+    
+    def record_failure(self, model: str, latency: float):
+        """Record a failed request; open the breaker after repeated failures"""
+        with self._lock:
+            health = self.health[model]
+            health.samples.append((latency, False))
+            health.consecutive_failures += 1
+            if health.state == ModelHealth.HALF_OPEN or health.consecutive_failures >= self.FAILURE_THRESHOLD:
+                if health.state != ModelHealth.OPEN:
+                    print(f"⚡ Circuit opened for {self.provider}:{model}")
+                health.state = ModelHealth.OPEN
+                health.opened_at = time.time()
+                health.probe_in_flight = False
+    
+    def record_cancelled(self, model: str, latency: float):
+        """
+        Record a request abandoned by its caller (e.g. a losing hedge).
+        
+        Cancellation says nothing about errors, so the breaker is untouched;
+        the elapsed time is kept as a lower bound on latency so slow models
+        do not look faster than they are, and a half-open probe is released.
+        """
+        with self._lock:
+            health = self.health[model]
+            health.samples.append((latency, True))
+            health.probe_in_flight = False
+    
+    def release(self, model: str):
+        """Hand back a routing decision that never became a request (frees a half-open probe)"""
+        with self._lock:
+            health = self.health[model]
+            if health.state == ModelHealth.HALF_OPEN:
+                health.probe_in_flight = False
+    
+    def latency_percentile(self, model: str, p: float) -> Optional[float]:
+        """Rolling latency percentile of successful requests (seconds)"""
+        with self._lock:
+            return _percentile(self.health[model].latencies(), p)
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-model state, latency percentiles and error rate"""
+        with self._lock:
+            result = {}
+            for model in self.models:
+                health = self.health[model]
+                self._refresh_locked(health)
+                latencies = health.latencies()
+                result[model] = {
+                    "state": health.state,
+                    "samples": len(health.samples),
+                    "p50_seconds": _percentile(latencies, 50),
+                    "p95_seconds": _percentile(latencies, 95),
+                    "error_rate": round(health.error_rate(), 3)
+                }
+            return result
+
+
+_routers: Dict[Tuple[str, Tuple[str, ...]], ModelRouter] = {}
+_routers_lock = threading.Lock()
+
+
+def get_model_router(provider: str, models: Iterable[str]) -> ModelRouter:
+    """
+    Return the process-wide router for a provider and model list.
+    
+    Clients with the same model list share health data.
+    """
+    key = (provider, tuple(models))
+    with _routers_lock:
+        router = _routers.get(key)
+        if router is None:
+            router = ModelRouter(provider, key[1])
+            _routers[key] = router
+        return router
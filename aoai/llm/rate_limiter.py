@@ -0,0 +1,419 @@
+"""
+Adaptive Rate Limiter
+Token bucket per provider/model, shared by all client instances, with
+Retry-After handling, jittered exponential backoff and AIMD concurrency
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+from utils.deadline import remaining_time, deadline_exceeded
+
+try:
+    import fcntl  # POSIX only; cross-process sharing is disabled on other platforms
+except ImportError:
+    fcntl = None
+
+
+# Requests per minute per provider (free-tier defaults, override with configure_rate_limits)
+DEFAULT_RPM = {
+    "groq": 30,
+    "gemini": 60
+}
+DEFAULT_MAX_CONCURRENCY = 8
+MAX_BACKOFF = 60.0  # seconds
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a rate-limit header duration into seconds.
+    
+    Accepts plain seconds ("7"), Groq-style durations ("2m59.56s", "120ms")
+    and HTTP dates (Retry-After).
+    
+    Args:
+        value: Header value
+    
+    Returns:
+        Seconds, or None if the value can't be parsed
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    
+    parts = _DURATION_PART.findall(value)
+    if parts and "".join(n + u for n, u in parts) == value:
+        scale = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+        return sum(float(n) * scale[u] for n, u in parts)
+    
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _headers_of(error: Exception):
+    """Return response headers attached to an SDK exception, if any"""
+    response = getattr(error, "response", None)
+    return getattr(response, "headers", None)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """
+    Decide whether an exception is a rate-limit / quota error.
+    
+    Uses the HTTP status when the SDK exposes one, otherwise falls back to
+    matching the message text.
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is None and isinstance(getattr(error, "code", None), int):
+        status = error.code  # google.api_core exceptions
+    if status is not None:
+        return status == 429
+    
+    error_msg = str(error).lower()
+    return "rate" in error_msg or "limit" in error_msg or "quota" in error_msg
+
+
+def retry_after_from_error(error: Exception) -> Optional[float]:
+    """
+    Extract the server-requested wait from a rate-limit exception.
+    
+    Args:
+        error: Exception raised by an SDK call
+    
+    Returns:
+        Seconds to wait, or None if the server didn't say
+    """
+    headers = _headers_of(error)
+    if headers:
+        for name in ("retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+            seconds = parse_duration(headers.get(name))
+            if seconds is not None:
+                return seconds
+    
+    # e.g. "Please try again in 7.66s"
+    match = re.search(r'try again in ((?:\d+(?:\.\d+)?(?:ms|h|m|s))+)', str(error))
+    if match:
+        return parse_duration(match.group(1))
+    return None
+
+
+class AdaptiveRateLimiter:
+    """Token bucket + AIMD concurrency limit for one provider/model"""
+    
+    def __init__(self, key: str, requests_per_minute: float,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 lock_dir: Optional[Path] = None):
+        """
+        Args:
+            key: 'provider:model'
+            requests_per_minute: Sustained request rate (bucket refill rate)
+            max_concurrency: Upper bound for the AIMD concurrency limit
+            lock_dir: If set, bucket state is shared across processes via a lock file
+        """
+        self.key = key
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(1.0, min(requests_per_minute, float(max_concurrency)))
+        self.max_concurrency = max_concurrency
+        
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # wall clock, from Retry-After / reset headers
+        
+        self.concurrency_limit = float(max_concurrency)
+        self.in_flight = 0
+        
+        self.requests = 0
+        self.rate_limited = 0
+        
+        self._cond = threading.Condition()
+        
+        self.lock_path = None
+        if lock_dir is not None and fcntl is not None:
+            Path(lock_dir).mkdir(parents=True, exist_ok=True)
+            safe_key = re.sub(r'[^\w.-]', '_', key)
+            self.lock_path = Path(lock_dir) / f"{safe_key}.lock"
+    
+    # ------------------------------------------------------------------
+    # Acquire / release
+    # ------------------------------------------------------------------
+    
+    def _try_acquire_locked(self) -> float:
+        """Take a token + concurrency slot if possible; return seconds to wait otherwise"""
+        if self.in_flight >= max(1, int(self.concurrency_limit)):
+            return 0.05
+        
+        if self.lock_path is not None:
+            wait = self._take_shared_token()
+        else:
+            wait = max(0.0, self.blocked_until - time.time())
+            if wait <= 0:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                else:
+                    wait = (1.0 - self.tokens) / self.rate
+        
+        if wait <= 0:
+            self.in_flight += 1
+            self.requests += 1
+        return wait
+    
+    @staticmethod
+    def _check_wait(wait: float):
+        """Give up instead of waiting past the job deadline (the wait would not leave time for the request)"""
+        remaining = remaining_time()
+        if remaining is not None and wait >= remaining:
+            raise deadline_exceeded("rate limiter")
+    
+    def acquire(self):
+        """
+        Block until a request may be sent.
+        
+        Raises:
+            DeadlineExceeded: The wait would outlast the current job's deadline
+        """
+        with self._cond:
+            while True:
+                wait = self._try_acquire_locked()
+                if wait <= 0:
+                    return
+                self._check_wait(wait)
+                self._cond.wait(timeout=wait)
+    
+    async def acquire_async(self):
+        """Wait (without blocking the event loop) until a request may be sent; deadline-bounded like acquire()"""
+        while True:
+            with self._cond:
+                wait = self._try_acquire_locked()
+            if wait <= 0:
+                return
+            self._check_wait(wait)
+            await asyncio.sleep(wait)
+    
+    def release(self):
+        """Give back the concurrency slot taken by acquire()"""
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            self._cond.notify_all()
+    
+    # ------------------------------------------------------------------
+    # Feedback
+    # ------------------------------------------------------------------
+    
+    def record_success(self, headers=None):
+        """
+        Additive increase of the concurrency limit; honour exhausted-quota headers.
+        
+        Args:
+            headers: Response headers (x-ratelimit-remaining-*, x-ratelimit-reset-*)
+        """
+        with self._cond:
+            self.concurrency_limit = min(
+                float(self.max_concurrency),
+                self.concurrency_limit + 1.0 / max(1.0, self.concurrency_limit)
+            )
+            
+            if headers:
+                for kind in ("requests", "tokens"):
+                    remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                    if remaining is not None and str(remaining).strip() == "0":
+                        reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                        if reset:
+                            self._block_for(reset)
+            self._cond.notify_all()
+    
+    def record_rate_limit(self, error: Optional[Exception] = None) -> Optional[float]:
+        """
+        Multiplicative decrease of the concurrency limit after a 429.
+        
+        Args:
+            error: The rate-limit exception (its Retry-After is honoured)
+        
+        Returns:
+            Server-requested wait in seconds, if any
+        """
+        retry_after = retry_after_from_error(error) if error is not None else None
+        with self._cond:
+            self.rate_limited += 1
+            self.concurrency_limit = max(1.0, self.concurrency_limit / 2.0)
+            if retry_after:
+                self._block_for(retry_after)
+        return retry_after
+    
+    def _block_for(self, seconds: float):
+        """Stop handing out tokens for the given time (caller holds the lock)"""
+        until = time.time() + seconds
+        self.blocked_until = max(self.blocked_until, until)
+        if self.lock_path is not None:
+            self._update_shared(lambda state: state.update(
+                blocked_until=max(state.get("blocked_until", 0.0), until)
+            ))
+    
+    def backoff_delay(self, attempt: int, base: float, retry_after: Optional[float] = None) -> float:
+        """
+        Delay before the next retry: Retry-After if known, else full-jitter exponential backoff.
+        
+        Args:
+            attempt: 1-based attempt number that just failed
+            base: Base delay in seconds
+            retry_after: Server-requested wait, if any
+        
+        Returns:
+            Seconds to sleep
+        """
+        if retry_after is not None:
+            # Small jitter so waiting clients don't all wake at once
+            return retry_after + random.uniform(0, 0.1 * max(1.0, retry_after))
+        return random.uniform(0, min(MAX_BACKOFF, base * (2 ** (attempt - 1))))
+    
+    def stats(self) -> Dict[str, Any]:
+        """Counters and current AIMD state"""
+        with self._cond:
+            return {
+                "key": self.key,
+                "requests": self.requests,
+                "rate_limited": self.rate_limited,
+                "concurrency_limit": round(self.concurrency_limit, 2),
+                "in_flight": self.in_flight,
+                "blocked_for_seconds": round(max(0.0, self.blocked_until - time.time()), 2)
+            }
+    
+    # ------------------------------------------------------------------
+    # Cross-process bucket (lock file)
+    # ------------------------------------------------------------------
+    
+    def _update_shared(self, mutate) -> Dict[str, Any]:
+        """Read-modify-write the shared bucket state under an exclusive file lock"""
+        fd = os.open(str(self.lock_path), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            raw = b""
+            while True:
+                chunk = os.read(fd, 4096)
+                if not chunk:
+                    break
+                raw += chunk
+            try:
+                state = json.loads(raw.decode("utf-8")) if raw else {}
+            except ValueError:
+                state = {}
+            
+            result = mutate(state)
+            
+            data = json.dumps(state).encode("utf-8")
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, data)
+            return result
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+    
+    def _take_shared_token(self) -> float:
+        """Token bucket step against the shared state; returns seconds to wait"""
+        def step(state):
+            now = time.time()
+            blocked = state.get("blocked_until", 0.0) - now
+            if blocked > 0:
+                return blocked
+            
+            tokens = state.get("tokens", self.capacity)
+            updated = state.get("updated", now)
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            state["updated"] = now
+            
+            if tokens >= 1.0:
+                state["tokens"] = tokens - 1.0
+                return 0.0
+            state["tokens"] = tokens
+            return (1.0 - tokens) / self.rate
+        
+        return self._update_shared(step)
+
+
+# ----------------------------------------------------------------------
+# Process-wide registry
+# ----------------------------------------------------------------------
+
+_registry: Dict[str, AdaptiveRateLimiter] = {}
+_registry_lock = threading.Lock()
+_settings = {
+    "rpm": {},
+    "max_concurrency": DEFAULT_MAX_CONCURRENCY,
+    "lock_dir": None
+}
+
+
+def configure_rate_limits(rpm: Optional[Dict[str, float]] = None,
+                          max_concurrency: Optional[int] = None,
+                          lock_dir: Optional[Path] = None):
+    """
+    Configure limiters created after this call.
+    
+    Args:
+        rpm: Requests per minute per provider (e.g. {"groq": 30})
+        max_concurrency: AIMD concurrency ceiling per provider/model
+        lock_dir: Directory for lock files that share buckets across processes
+    """
+    with _registry_lock:
+        if rpm:
+            _settings["rpm"].update(rpm)
+        if max_concurrency is not None:
+            _settings["max_concurrency"] = max_concurrency
+        if lock_dir is not None:
+            _settings["lock_dir"] = Path(lock_dir)
+            if fcntl is None:
+                print("⚠️  Cross-process rate limiting needs fcntl; using per-process limits")
+
+
+def get_rate_limiter(provider: str, model: str) -> AdaptiveRateLimiter:
+    """
+    Return the shared limiter for a provider/model (created on first use).
+    
+    Args:
+        provider: 'groq', 'gemini', ...
+        model: Model identifier
+    
+    Returns:
+        AdaptiveRateLimiter shared by every client in this process
+    """
+    key = f"{provider}:{model}"
+    with _registry_lock:
+        limiter = _registry.get(key)
+        if limiter is None:
+            rpm = _settings["rpm"].get(provider, DEFAULT_RPM.get(provider, 60))
+            limiter = AdaptiveRateLimiter(
+                key,
+                requests_per_minute=rpm,
+                max_concurrency=_settings["max_concurrency"],
+                lock_dir=_settings["lock_dir"]
+            )
+            _registry[key] = limiter
+        return limiter
+
+
+def rate_limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """Stats for every limiter created in this process"""
+    with _registry_lock:
+        limiters = list(_registry.values())
+    return {limiter.key: limiter.stats() for limiter in limiters}
@@ -0,0 +1,235 @@
+"""
+Record/Replay LLM Client
+Captures request/response pairs to disk and serves them back for offline,
+deterministic pipeline runs (no API keys or network needed in replay mode)
+"""
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Callable
+
+
+def prompt_hash(prompt: str) -> str:
+    """SHA-256 of the prompt text"""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class ReplayStore:
+    """Append-only JSONL store of recorded LLM exchanges, shared by ReplayClients"""
+    
+    def __init__(self, path: Path):
+        """
+        Args:
+            path: JSONL file (created on first record)
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        
+        # prompt hash -> recorded exchanges, in recording order
+        self.index: Dict[str, List[Dict[str, Any]]] = {}
+        # prompt hash -> how many times it has been replayed (for repeated prompts)
+        self.cursors: Dict[str, int] = {}
+        
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        self._index(json.loads(line))
+        
+        print(f"✓ Replay store loaded ({self.path}, {len(self)} prompts)")
+    
+    def __len__(self) -> int:
+        return len(self.index)
+    
+    def _index(self, record: Dict[str, Any]):
+        self.index.setdefault(record["prompt_hash"], []).append(record)
+    
+    def add(self, prompt: str, response: str, max_tokens: int, temperature: float,
+            source: str, latency_seconds: float = 0.0, persist: bool = True):
+        """
+        Record one exchange.
+        
+        Args:
+            prompt: Full prompt text
+            response: Response text
+            max_tokens: Requested max tokens
+            temperature: Requested temperature
+            source: Where it came from ('groq', 'gemini', 'session_log', ...)
+            latency_seconds: Observed latency (used for simulated latency)
+            persist: Append to the JSONL file (False for in-memory seeds)
+        """
+        record = {
+            "prompt_hash": prompt_hash(prompt),
+            "prompt_preview": prompt[:200],
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "response": response,
+            "source": source,
+            "latency_seconds": round(latency_seconds, 4),
+            "recorded_at": time.time()
+        }
+        with self._lock:
+            self._index(record)
+            if persist:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    
+    def lookup(self, prompt: str, max_tokens: int, temperature: float) -> Optional[Dict[str, Any]]:
+        """
+        Find a recorded exchange for a prompt.
+        
+        Repeated identical prompts get successive recordings (wrapping around),
+        so retries replay the same sequence they were recorded with. Exchanges
+        with matching sampling params are preferred.
+        
+        Returns:
+            Recorded exchange or None
+        """
+        key = prompt_hash(prompt)
+        with self._lock:
+            records = self.index.get(key)
+            if not records:
+                return None
+            
+            exact = [r for r in records if r["max_tokens"] == max_tokens and r["temperature"] == temperature]
+            candidates = exact or records
+            
+            cursor = self.cursors.get(key, 0)
+            self.cursors[key] = cursor + 1
+            return candidates[cursor % len(candidates)]
+
+
+class ReplayClient:
+    """Implements the generate() interface from recorded exchanges"""
+    
+    PROVIDER = "replay"
+    
+    def __init__(self, store: ReplayStore, mode: str = "replay", inner=None,
+                 simulated_latency: float = 0.0, use_recorded_latency: bool = False):
+        """
+        Args:
+            store: Shared ReplayStore
+            mode: 'record' (call inner client and save) or 'replay' (serve from store)
+            inner: Live client to record from (required in record mode)
+            simulated_latency: Fixed delay per replayed call (seconds)
+            use_recorded_latency: Replay each call with its recorded latency instead
+        """
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown replay mode: {mode}")
+        if mode == "record" and inner is None:
+            raise ValueError("Record mode needs a live client to record from")
+        
+        self.store = store
+        self.mode = mode
+        self.inner = inner
+        self.simulated_latency = simulated_latency
+        self.use_recorded_latency = use_recorded_latency
+        
+        self.hits = 0
+        self.misses = 0
+        
+        source = type(inner).__name__ if inner is not None else "store"
+        print(f"✓ Replay Client initialized ({mode} mode, source: {source})")
+    
+    def _replay(self, prompt: str, max_tokens: int, temperature: float):
+        """Return (response, delay) for a recorded prompt or raise"""
+        record = self.store.lookup(prompt, max_tokens, temperature)
+        if record is None:
+            self.misses += 1
+            raise Exception(f"No recorded response for prompt {prompt_hash(prompt)[:12]} "
+                            f"({prompt[:60]!r}...)")
+        self.hits += 1
+        delay = record["latency_seconds"] if self.use_recorded_latency else self.simulated_latency
+        return record["response"], delay
+    
+    def generate(self, prompt: str, max_tokens: int = 2048, temperature: float = 0.7) -> str:
+        """
+        Record or replay one LLM call.
+        
+        Args:
+            prompt: Input text
+            max_tokens: Max response length
+            temperature: Sampling temperature
+        
+        Returns:
+            Model response as string
+        """
+        if self.mode == "record":
+            start = time.perf_counter()
+            response = self.inner.generate(prompt=prompt, max_tokens=max_tokens, temperature=temperature)
+            self.store.add(prompt, response, max_tokens, temperature,
+                           source=getattr(self.inner, "PROVIDER", type(self.inner).__name__),
+                           latency_seconds=time.perf_counter() - start)
+            return response
+        
+        print(f"\n📼 Replaying LLM response ({len(prompt)} char prompt)")
+        response, delay = self._replay(prompt, max_tokens, temperature)
+        if delay:
+            time.sleep(delay)
+        return response
+    
+    async def agenerate(self, prompt: str, max_tokens: int = 2048, temperature: float = 0.7) -> str:
+        """Async variant of generate()"""
+        if self.mode == "record":
+            start = time.perf_counter()
+            response = await self.inner.agenerate(prompt, max_tokens, temperature)
+            self.store.add(prompt, response, max_tokens, temperature,
+                           source=getattr(self.inner, "PROVIDER", type(self.inner).__name__),
+                           latency_seconds=time.perf_counter() - start)
+            return response
+        
+        response, delay = self._replay(prompt, max_tokens, temperature)
+        if delay:
+            await asyncio.sleep(delay)
+        return response
+    
+    def seed_from_session_logs(self, log_dir: Path, prompt_builders: Dict[str, Callable]) -> int:
+        """
+        Seed the store from existing session_*.json logs.
+        
+        Session logs hold the Logician and Director outputs but not the raw
+        prompts, so prompts are rebuilt with the agents' prompt builders.
+        
+        Args:
+            log_dir: Directory containing session logs
+            prompt_builders: {'logician': fn(user_prompt), 'director': fn(reasoning)}
+        
+        Returns:
+            Number of exchanges seeded
+        """
+        seeded = 0
+        for log_path in sorted(Path(log_dir).glob("session_*.json")):
+            try:
+                with open(log_path, 'r', encoding='utf-8') as f:
+                    session = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Skipping unreadable log {log_path.name}: {str(e)}")
+                continue
+            
+            stages = session.get("stages", {})
+            reasoning = stages.get("reasoning")
+            scene_manifest = stages.get("scene_manifest")
+            
+            if reasoning and "logician" in prompt_builders:
+                self.store.add(prompt_builders["logician"](session["user_prompt"]),
+                               json.dumps(reasoning), max_tokens=2048, temperature=0.7,
+                               source="session_log", persist=False)
+                seeded += 1
+            
+            if reasoning and scene_manifest and "director" in prompt_builders:
+                self.store.add(prompt_builders["director"](reasoning),
+                               json.dumps(scene_manifest), max_tokens=2048, temperature=0.6,
+                               source="session_log", persist=False)
+                seeded += 1
+        
+        print(f"📼 Seeded {seeded} exchanges from session logs in {log_dir}")
+        return seeded
+    
+    def stats(self) -> Dict[str, Any]:
+        """Replay hit/miss counters"""
+        return {"mode": self.mode, "hits": self.hits, "misses": self.misses, "prompts": len(self.store)}
@@ -0,0 +1,237 @@
+"""
+LLM Response Cache
+Disk-backed, content-addressed cache for LLM completions (SQLite under storage/cache)
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Optional, Dict, Any, Callable
+
+
+# Cache behaviour of the LLM calls in progress (set by agents with cache_policy())
+current_cache_policy: ContextVar[Optional[Dict[str, Any]]] = ContextVar("current_cache_policy", default=None)
+
+
+@contextmanager
+def cache_policy(accept: Optional[Callable[[str], bool]] = None, read: bool = True):
+    """
+    Scope how the response cache treats the LLM calls made inside the block.
+    
+    Args:
+        accept: Only responses it returns True for are stored (e.g. the agent's
+                validator), so a response that fails validation is never replayed
+        read: False skips lookups, e.g. on a retry after a response failed validation
+    """
+    token = current_cache_policy.set({"accept": accept, "read": read})
+    try:
+        yield
+    finally:
+        current_cache_policy.reset(token)
+
+
+class ResponseCache:
+    """Persistent LRU cache keyed on provider + model + prompt + sampling params"""
+    
+    DB_FILENAME = "llm_responses.sqlite"
+    DEFAULT_MAX_BYTES = 64 * 1024 * 1024  # 64 MB of cached responses
+    DEFAULT_TTL = 7 * 24 * 3600  # 1 week
+    
+    def __init__(self, cache_dir: Path, max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttl_seconds: Optional[float] = DEFAULT_TTL, bypass: bool = False):
+        """
+        Args:
+            cache_dir: Directory holding the SQLite database
+            max_bytes: Size bound; least recently used entries are evicted above it
+            ttl_seconds: Entries older than this are treated as misses (None = never expire)
+            bypass: Skip cache reads (responses are still written, refreshing entries)
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.cache_dir / self.DB_FILENAME
+        
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.bypass = bypass
+        
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.rejected = 0  # Responses the caller's cache_policy() did not accept
+        self.evictions = 0
+        
+        # Clients may be shared across threads, so serialize access to the connection
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+        self._conn.commit()
+        
+        print(f"✓ Response Cache initialized ({self.db_path})")
+        if self.bypass:
+            print("   Bypass enabled: reads skipped, writes refreshed")
+    
+    @staticmethod
+    def make_key(provider: str, model: str, prompt: str, max_tokens: int, temperature: float) -> str:
+        """
+        Build a content-addressed key for a request.
+        
+        Args:
+            provider: 'groq', 'gemini', ...
+            model: Model identifier
+            prompt: Full prompt text
+            max_tokens: Max response length
+            temperature: Sampling temperature
+        
+        Returns:
+            SHA-256 hex digest
+        """
+        payload = json.dumps(
+            {
+                "provider": provider,
+                "model": model,
+                "prompt": prompt,
+                "max_tokens": max_tokens,
+                "temperature": round(float(temperature), 4)
+            },
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached response.
+        
+        Args:
+            key: Key from make_key()
+        
+        Returns:
+            Cached response text or None on miss / bypass / expiry
+        """
+        policy = current_cache_policy.get()
+        if self.bypass or (policy is not None and not policy["read"]):
+            self.bypassed += 1
+            return None
+        
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            
+            if row is None:
+                self.misses += 1
+                return None
+            
+            response, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return response
+    
+    def put(self, key: str, provider: str, model: str, response: str):
+        """
+        Store a response and evict least recently used entries above max_bytes.
+        
+        Args:
+            key: Key from make_key()
+            provider: Provider name (for inspection)
+            model: Model that produced the response
+            response: Response text
+        """
+        policy = current_cache_policy.get()
+        if policy is not None and policy["accept"] is not None:
+            try:
+                accepted = bool(policy["accept"](response))
+            except Exception:
+                accepted = False
+            if not accepted:
+                self.rejected += 1
+                return
+        
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, provider, model, response, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, model, response, size, now, now)
+            )
+            self._evict_locked()
+            self._conn.commit()
+    
+    def _evict_locked(self):
+        """Drop expired entries, then LRU entries until under max_bytes (lock must be held)"""
+        if self.ttl_seconds is not None:
+            cursor = self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            self.evictions += cursor.rowcount
+        
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+    
+    def clear(self):
+        """Remove all cached responses"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+        print("🧹 Cleared LLM response cache")
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return cache counters for this process plus on-disk totals.
+        
+        Returns:
+            {"hits", "misses", "bypassed", "rejected", "evictions", "hit_rate", "entries", "bytes"}
+        """
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "rejected": self.rejected,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": total
+        }
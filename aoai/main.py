@@ -11,9 +11,11 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
-# Import LLM clients
-from llm.groq_client import GroqClient
-from llm.gemini_client import GeminiClient
+# Import LLM clients (provider SDKs are imported lazily so replay mode runs offline)
+from llm.response_cache import ResponseCache
+from llm.rate_limiter import configure_rate_limits, rate_limiter_stats
+from llm.hedging import HedgedClient
+from llm.replay_client import ReplayClient, ReplayStore
 
 # Import agents
 from agents.logician_agent import LogicianAgent
@@ -26,6 +28,13 @@ from agents.narrator_agent import NarratorAgent
 from pipeline.orchestrator import Orchestrator
 from pipeline.execution_sandbox import ExecutionSandbox
 from pipeline.retry_manager import RetryManager
+from pipeline.smoke_runner import SmokeRunner
+from pipeline.batch_runner import BatchRunner, load_jobs
+from pipeline.job_server import JobServer
+from pipeline.result_cache import ResultCache
+from utils.tracing import configure_tracing, load_spans, render_waterfall
+from utils.deadline import parse_duration
+from utils.manim_index import load_manim_index
 
 
 def main():
@@ -36,7 +45,68 @@ def main():
     parser.add_argument(
         "prompt",
         type=str,
-        help="Math concept to visualize (e.g., 'Explain derivatives')"
+        nargs="?",
+        help="Math concept to visualize (e.g., 'Explain derivatives'), 'serve' to run the job API, "
+             "or 'trace' to print a run's span waterfall"
+    )
+    parser.add_argument(
+        "--batch",
+        type=str,
+        default=None,
+        help="JSONL file of prompts to run as a batch (one string or {\"id\", \"prompt\"} per line)"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Batch jobs in flight at once (default: 4)"
+    )
+    parser.add_argument(
+        "--render-concurrency",
+        type=int,
+        default=None,
+        help="Simultaneous Manim renders (default: one per CPU core)"
+    )
+    parser.add_argument(
+        "--batch-output",
+        type=str,
+        default=None,
+        help="JSONL file for per-job batch results (default: storage/outputs/batch_<timestamp>.jsonl)"
+    )
+    parser.add_argument(
+        "--host",
+        type=str,
+        default="127.0.0.1",
+        help="Address the job API binds to in serve mode (default: 127.0.0.1)"
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8765,
+        help="Port of the job API in serve mode (default: 8765)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=2,
+        help="Jobs run at the same time in serve mode (default: 2)"
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=16,
+        help="Jobs allowed to wait in serve mode before submissions get HTTP 429 (default: 16)"
+    )
+    parser.add_argument(
+        "--no-trace",
+        action="store_true",
+        help="Disable span tracing (default: spans go to storage/traces/spans.jsonl)"
+    )
+    parser.add_argument(
+        "--trace-id",
+        type=str,
+        default=None,
+        help="With 'trace': trace id or prefix to show (default: the latest run; see trace_id in session logs)"
     )
     parser.add_argument(
         "--no-logs",
@@ -48,14 +118,182 @@ def main():
         action="store_true",
         help="Execute Manim rendering after code generation (requires manim installed)"
     )
+    parser.add_argument(
+        "--warm-render",
+        action="store_true",
+        help="With --execute, render in forked children of pre-imported Manim workers "
+             "(benchmark: python pipeline/render_worker.py --benchmark)"
+    )
+    parser.add_argument(
+        "--no-preflight",
+        action="store_true",
+        help="Skip the static check of generated code against the installed manim API"
+    )
+    parser.add_argument(
+        "--no-smoke",
+        action="store_true",
+        help="Skip the frameless run of construct() that catches runtime errors before a real render"
+    )
+    parser.add_argument(
+        "--quality",
+        choices=list(ExecutionSandbox.QUALITIES),
+        default="medium",
+        help="Quality of the final video (default: medium)"
+    )
+    parser.add_argument(
+        "--validation-quality",
+        choices=list(ExecutionSandbox.QUALITIES),
+        default="low",
+        help="Quality of the renders in the retry loop; a passing script is re-rendered at --quality "
+             "(same as --quality = render once; default: low)"
+    )
+    parser.add_argument(
+        "--background-final",
+        action="store_true",
+        help="Return the validation render as a preview while the final render runs in the background"
+    )
+    parser.add_argument(
+        "--speculative",
+        type=int,
+        default=0,
+        metavar="K",
+        help="With --execute, generate K candidate scripts and keep the first that renders"
+    )
+    parser.add_argument(
+        "--max-llm-calls",
+        type=int,
+        default=40,
+        help="LLM API requests allowed per run across all retry layers (0 = unlimited, default: 40)"
+    )
+    parser.add_argument(
+        "--max-renders",
+        type=int,
+        default=12,
+        help="Manim renders allowed per run (0 = unlimited, default: 12)"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Reuse checkpointed stage outputs of an earlier run of the same prompt"
+    )
+    parser.add_argument(
+        "--deadline",
+        type=parse_duration,
+        default=None,
+        metavar="DURATION",
+        help="Time budget per run, e.g. 120s or 2m (LLM calls, retries and renders stop when it runs out)"
+    )
     parser.add_argument(
         "--debug",
         action="store_true",
         help="Enable verbose debug output"
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Disable the persistent LLM response cache"
+    )
+    parser.add_argument(
+        "--no-result-cache",
+        action="store_true",
+        help="Disable the whole-pipeline result cache (always run every agent)"
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Invalidate cached results for this prompt and run it again"
+    )
+    parser.add_argument(
+        "--similarity-threshold",
+        type=float,
+        default=None,
+        help="Also reuse results of near-duplicate prompts (MinHash similarity, e.g. 0.8)"
+    )
+    parser.add_argument(
+        "--result-cache-mb",
+        type=int,
+        default=2048,
+        help="Disk cap of the result cache in MB (default: 2048)"
+    )
+    parser.add_argument(
+        "--cache-bypass",
+        action="store_true",
+        help="Skip cache reads but refresh cached responses with new ones"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream LLM tokens and abort malformed responses early"
+    )
+    parser.add_argument(
+        "--http-max-connections",
+        type=int,
+        default=None,
+        help="Connection pool size of the shared HTTP transport"
+    )
+    parser.add_argument(
+        "--http-max-keepalive",
+        type=int,
+        default=None,
+        help="Idle keep-alive connections kept by the shared HTTP transport"
+    )
+    parser.add_argument(
+        "--groq-rpm",
+        type=float,
+        default=None,
+        help="Requests per minute allowed per Groq model (token bucket refill rate)"
+    )
+    parser.add_argument(
+        "--shared-rate-limit",
+        action="store_true",
+        help="Share rate-limit buckets with other AoAI processes via lock files"
+    )
+    parser.add_argument(
+        "--hedge",
+        action="store_true",
+        help="Send a duplicate request to the next model when a Groq call is unusually slow"
+    )
+    parser.add_argument(
+        "--hedge-percentile",
+        type=float,
+        default=95.0,
+        help="Latency percentile after which a hedge request is sent (default: 95)"
+    )
+    parser.add_argument(
+        "--llm-mode",
+        choices=["live", "record", "replay"],
+        default="live",
+        help="live: call the APIs; record: call the APIs and save responses; "
+             "replay: serve saved responses offline (no API keys needed)"
+    )
+    parser.add_argument(
+        "--replay-file",
+        type=str,
+        default=None,
+        help="Recorded responses for record/replay (default: storage/replay/llm_responses.jsonl)"
+    )
+    parser.add_argument(
+        "--replay-latency",
+        type=float,
+        default=0.0,
+        help="Simulated latency per replayed call in seconds (default: 0, full speed)"
+    )
+    parser.add_argument(
+        "--replay-recorded-latency",
+        action="store_true",
+        help="Replay each call with the latency observed when it was recorded"
+    )
     
     args = parser.parse_args()
     
+    if bool(args.prompt) == bool(args.batch):
+        parser.error("give either a prompt, 'serve' or --batch FILE")
+    serve = args.prompt == "serve"
+    
+    traces_path = Path(__file__).parent / "storage" / "traces" / "spans.jsonl"
+    if args.prompt == "trace":
+        return show_trace(traces_path, args.trace_id)
+    
     # Print banner
     print("\n" + "="*60)
     print("  🎬 AoAI — Agent of Agents Infrastructure")
@@ -63,36 +301,124 @@ def main():
     print("="*60 + "\n")
     
     try:
-        # Check for API keys
-        if not os.getenv("GROQ_API_KEY"):
-            print("❌ Error: GROQ_API_KEY not found in environment")
-            print("   Please set it in .env file or environment variables")
-            return 1
+        storage_path = Path(__file__).parent / "storage"
         
-        if not os.getenv("GEMINI_API_KEY"):
-            print("❌ Error: GEMINI_API_KEY not found in environment")
-            print("   Please set it in .env file or environment variables")
-            return 1
+        # Stage, LLM call and render spans for 'main.py trace'
+        if not args.no_trace:
+            configure_tracing(traces_path)
         
-        # Initialize LLM clients
-        print("📡 Initializing API clients...")
-        groq_reasoning = GroqClient(model_type="reasoning")
-        groq_code = GroqClient(model_type="code")
-        gemini_client = GeminiClient()
+        if args.llm_mode == "replay":
+            # Offline: every call is served from recorded responses
+            print("📼 Replay mode: serving recorded LLM responses (offline)")
+            replay_store = ReplayStore(Path(args.replay_file) if args.replay_file
+                                       else storage_path / "replay" / "llm_responses.jsonl")
+            groq_reasoning = groq_code = gemini_client = None
+            reasoning_llm = code_llm = ReplayClient(
+                replay_store,
+                mode="replay",
+                simulated_latency=args.replay_latency,
+                use_recorded_latency=args.replay_recorded_latency
+            )
+        else:
+            # Check for API keys
+            if not os.getenv("GROQ_API_KEY"):
+                print("❌ Error: GROQ_API_KEY not found in environment")
+                print("   Please set it in .env file or environment variables")
+                return 1
+            
+            if not os.getenv("GEMINI_API_KEY"):
+                print("❌ Error: GEMINI_API_KEY not found in environment")
+                print("   Please set it in .env file or environment variables")
+                return 1
+            
+            from llm.groq_client import GroqClient
+            from llm.gemini_client import GeminiClient
+            from llm.http_transport import configure_transport
+            
+            # Shared response cache (replays of identical prompts skip the network)
+            cache = None
+            if not args.no_cache:
+                cache = ResponseCache(storage_path / "cache", bypass=args.cache_bypass)
+            
+            # All clients share one pooled HTTP transport
+            configure_transport(
+                max_connections=args.http_max_connections,
+                max_keepalive_connections=args.http_max_keepalive
+            )
+            
+            # Rate limits are shared by every client for the same provider/model
+            configure_rate_limits(
+                rpm={"groq": args.groq_rpm} if args.groq_rpm else None,
+                lock_dir=storage_path / "locks" if args.shared_rate_limit else None
+            )
+            
+            # Initialize LLM clients
+            print("📡 Initializing API clients...")
+            groq_reasoning = GroqClient(model_type="reasoning", cache=cache)
+            groq_code = GroqClient(model_type="code", cache=cache)
+            gemini_client = GeminiClient(cache=cache)
+            
+            # Optionally hedge slow Groq calls to the next-best model
+            reasoning_llm, code_llm = groq_reasoning, groq_code
+            if args.hedge:
+                reasoning_llm = HedgedClient(groq_reasoning, percentile=args.hedge_percentile)
+                code_llm = HedgedClient(groq_code, percentile=args.hedge_percentile)
+            
+            # Record every exchange for later offline replays
+            if args.llm_mode == "record":
+                replay_store = ReplayStore(Path(args.replay_file) if args.replay_file
+                                           else storage_path / "replay" / "llm_responses.jsonl")
+                reasoning_llm = ReplayClient(replay_store, mode="record", inner=reasoning_llm)
+                code_llm = ReplayClient(replay_store, mode="record", inner=code_llm)
         
         # Initialize agents with optimized models
         print("\n🤖 Initializing agents...")
-        logician = LogicianAgent(groq_reasoning)  # Reasoning model for math logic
-        director = DirectorAgent(groq_reasoning)  # Reasoning model for scene planning
-        engineer = EngineerAgent(groq_code)      # Code model for Manim generation
-        fixer = FixerAgent(groq_code)            # Code model for debugging
-        narrator = NarratorAgent(groq_reasoning) # Reasoning model for storytelling
+        logician = LogicianAgent(reasoning_llm, stream=args.stream)  # Reasoning model for math logic
+        director = DirectorAgent(reasoning_llm, stream=args.stream)  # Reasoning model for scene planning
+        engineer = EngineerAgent(code_llm, stream=args.stream)       # Code model for Manim generation
+        fixer = FixerAgent(code_llm)            # Code model for debugging
+        narrator = NarratorAgent(reasoning_llm) # Reasoning model for storytelling
+        
+        if args.llm_mode == "replay":
+            # Past session logs cover the Logician and Director stages
+            reasoning_llm.seed_from_session_logs(
+                storage_path / "logs",
+                {'logician': logician.build_prompt, 'director': director.build_prompt}
+            )
         
         # Initialize pipeline components
         print("\n⚙️  Initializing pipeline...")
-        storage_path = Path(__file__).parent / "storage"
-        sandbox = ExecutionSandbox(storage_path)
-        retry_manager = RetryManager(fixer, sandbox)
+        sandbox = ExecutionSandbox(
+            storage_path,
+            max_concurrent_renders=args.render_concurrency,
+            warm_workers=args.warm_render
+        )
+        # Generated scripts are checked against the installed manim API before rendering
+        manim_index = None
+        if args.execute and not args.no_preflight:
+            manim_index = load_manim_index(storage_path / "cache")
+        # ...and run once without frames, so runtime errors reach the Fixer in seconds
+        smoke_runner = None
+        if args.execute and not args.no_smoke:
+            smoke_runner = SmokeRunner(storage_path, render_workers=sandbox.render_workers)
+        retry_manager = RetryManager(
+            fixer,
+            sandbox,
+            manim_index=manim_index,
+            smoke_runner=smoke_runner,
+            final_quality=args.quality,
+            validation_quality=args.validation_quality,
+            background_final=args.background_final
+        )
+
+        # Finished results of (near-)identical prompts are reused without any agent calls
+        result_cache = None
+        if not args.no_result_cache:
+            result_cache = ResultCache(
+                storage_path / "result_cache",
+                max_bytes=args.result_cache_mb * 1024 * 1024,
+                similarity_threshold=args.similarity_threshold
+            )
         
         # Create orchestrator
         orchestrator = Orchestrator(
@@ -105,32 +431,126 @@ def main():
             },
             storage_path=storage_path,
             sandbox=sandbox,
-            retry_manager=retry_manager
+            retry_manager=retry_manager,
+            speculative_candidates=args.speculative,
+            result_cache=result_cache,
+            max_llm_calls=args.max_llm_calls or None,
+            max_renders=args.max_renders or None
         )
         
         # Run pipeline
-        result = orchestrator.run(args.prompt, save_logs=not args.no_logs, execute=args.execute)
+        if serve:
+            # Agents, clients and the sandbox stay warm across jobs
+            server = JobServer(
+                orchestrator,
+                workers=args.workers,
+                queue_size=args.queue_size,
+                save_logs=not args.no_logs,
+                execute=args.execute,
+                deadline=args.deadline
+            )
+            server.serve(args.host, args.port)
+            served = server.stats()
+            result = {"success": True}
+        elif args.batch:
+            jobs = load_jobs(Path(args.batch))
+            runner = BatchRunner(
+                orchestrator,
+                concurrency=args.concurrency,
+                results_path=Path(args.batch_output) if args.batch_output else None
+            )
+            summary = runner.run(jobs, save_logs=not args.no_logs, execute=args.execute, resume=args.resume,
+                                 deadline=args.deadline)
+            result = {"success": summary["failed"] == 0}
+        else:
+            result = orchestrator.run(
+                args.prompt,
+                save_logs=not args.no_logs,
+                execute=args.execute,
+                resume=args.resume,
+                refresh=args.refresh,
+                deadline=args.deadline
+            )
         
         # Print final result
         print("\n" + "="*60)
-        if result["success"]:
+        if serve:
+            print(f"🛰️  SERVER STOPPED: {served['succeeded']} jobs succeeded, {served['failed']} failed, "
+                  f"{served['rejected']} rejected (queue full)")
+        elif args.batch:
+            print(f"📦 BATCH COMPLETED: {summary['succeeded']}/{summary['jobs']} jobs succeeded")
+            if summary["jobs"]:
+                print(f"⏱️  Wall time: {summary['wall_seconds']:.1f}s "
+                      f"({summary['jobs_per_minute']:.2f} jobs/min at concurrency {args.concurrency})")
+                print(f"   Job latency: mean {summary['latency_mean']:.1f}s, p50 {summary['latency_p50']:.1f}s, "
+                      f"p95 {summary['latency_p95']:.1f}s, max {summary['latency_max']:.1f}s")
+            print(f"📄 Results: {summary['results_path']}")
+            if args.background_final and not retry_manager.wait_for_final_renders(timeout=0):
+                print(f"⏳ Waiting for background final renders...")
+                retry_manager.wait_for_final_renders()
+        elif result["success"]:
             print("✅ PIPELINE COMPLETED SUCCESSFULLY")
             if result["code_path"]:
                 print(f"📄 Code: {result['code_path']}")
             if result.get("video_path"):
                 print(f"📹 Video: {result['video_path']}")
+            final_render = result.get("final_render")
+            if final_render and final_render["status"] == "pending":
+                print(f"⏳ Waiting for the final {final_render['quality']} render...")
+                retry_manager.wait_for_final_renders()
+            if final_render and final_render["status"] == "succeeded":
+                if final_render["video_path"] != result["video_path"]:
+                    print(f"🎞️  Final video ({final_render['quality']}): {final_render['video_path']}")
+            elif final_render:
+                print(f"⚠️  Final render {final_render['status']}, the video above is the preview")
             print(f"📊 Logs: {storage_path / 'logs'}")
         else:
             print("❌ PIPELINE FAILED")
             print(f"Error: {result.get('error', 'Unknown error')}")
+        if result_cache is not None:
+            results = result_cache.stats()
+            print(f"♻️  Result cache: {results['hits']} hits, {results['near_hits']} near-duplicate hits, "
+                  f"{results['misses']} misses ({results['entries']} entries, {results['bytes'] / 1024 / 1024:.1f} MB)")
+        if args.llm_mode == "replay":
+            replay = reasoning_llm.stats()
+            print(f"📼 Replay: {replay['hits']} responses served, {replay['misses']} missing "
+                  f"({replay['prompts']} recorded prompts)")
+        else:
+            if cache is not None:
+                stats = cache.stats()
+                print(f"⚡ LLM cache: {stats['hits']} hits, {stats['misses']} misses "
+                      f"({stats['entries']} entries, {stats['bytes'] / 1024:.1f} KB)")
+            from llm.http_transport import transport_stats
+            http = transport_stats()
+            print(f"🔌 HTTP: {http['requests']} requests over {http['connections_opened']} connections "
+                  f"(reuse rate {http['reuse_rate']:.0%}, HTTP/2: {'on' if http['http2'] else 'off'})")
+        if args.llm_mode == "record":
+            print(f"📼 Recorded responses: {replay_store.path}")
+        for key, limiter in rate_limiter_stats().items():
+            if limiter["rate_limited"]:
+                print(f"🚦 {key}: {limiter['rate_limited']}/{limiter['requests']} requests rate limited "
+                      f"(concurrency limit now {limiter['concurrency_limit']})")
+        if args.hedge and args.llm_mode != "replay":
+            for name, client in (("reasoning", reasoning_llm), ("code", code_llm)):
+                hedge = getattr(client, "inner", client).stats()
+                print(f"🪁 Hedging ({name}): {hedge['hedges']}/{hedge['requests']} requests hedged "
+                      f"({hedge['hedge_rate']:.0%}), {hedge['hedge_wins']} wins, "
+                      f"~{hedge['latency_saved_seconds']:.1f}s saved, threshold {hedge['threshold_seconds']:.2f}s")
+        if args.stream and args.llm_mode != "replay":
+            for name, client in (("reasoning", groq_reasoning), ("code", groq_code)):
+                summary = client.stream_summary()
+                ttft = summary["mean_ttft_seconds"]
+                print(f"✂️  Groq {name} streams: {summary['streams']} "
+                      f"(aborted {summary['aborted']} after {summary['aborted_tokens']} tokens"
+                      f"{f', mean TTFT {ttft:.2f}s' if ttft is not None else ''})")
         print("="*60 + "\n")
         
         return 0 if result["success"] else 1
-        
+    
     except KeyboardInterrupt:
         print("\n\n⚠️  Pipeline interrupted by user")
         return 130
-        
+    
     except Exception as e:
         print(f"\n❌ Fatal error: {str(e)}")
         if args.debug:
@@ -139,5 +559,23 @@ def main():
         return 1
 
 
+def show_trace(traces_path: Path, trace_id=None) -> int:
+    """Print the span waterfall of one traced run"""
+    if not traces_path.exists():
+        print(f"❌ No traces recorded yet ({traces_path})")
+        return 1
+    try:
+        spans = load_spans(traces_path, trace_id)
+    except ValueError as e:
+        print(f"❌ {str(e)}")
+        return 1
+    if not spans:
+        print(f"❌ No trace found{f' for {trace_id}' if trace_id else ''}")
+        return 1
+    
+    print("\n".join(render_waterfall(spans)))
+    return 0
+
+
 if __name__ == "__main__":
     sys.exit(main())
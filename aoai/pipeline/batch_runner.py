@@ -0,0 +1,166 @@
+"""
+Batch Runner
+Runs many pipeline jobs concurrently so LLM stages overlap with Manim renders
+"""
+import json
+import math
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+
+def _percentile(values: List[float], percentile: float) -> Optional[float]:
+    """Nearest-rank percentile of a list of values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(percentile / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def load_jobs(path: Path) -> List[Dict[str, Any]]:
+    """
+    Read batch jobs from a JSONL file.
+    
+    Each line is either a JSON string (the prompt) or an object with a
+    "prompt" and optional "id". Blank lines and lines starting with '#' are skipped.
+    
+    Args:
+        path: JSONL file
+    
+    Returns:
+        [{"id": str, "prompt": str}, ...]
+    """
+    jobs = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_number}: invalid JSON ({str(e)})")
+            
+            if isinstance(entry, str):
+                entry = {"prompt": entry}
+            if not isinstance(entry, dict) or not entry.get("prompt"):
+                raise ValueError(f"{path}:{line_number}: expected a prompt string or an object with 'prompt'")
+            
+            job_id = str(entry.get("id") or f"job{len(jobs) + 1:04d}")
+            # Job ids end up in filenames
+            entry["id"] = re.sub(r'[^A-Za-z0-9_-]+', '_', job_id)
+            jobs.append(entry)
+    
+    ids = [job["id"] for job in jobs]
+    if len(set(ids)) != len(ids):
+        raise ValueError(f"{path}: job ids must be unique")
+    return jobs
+
+
+class BatchRunner:
+    """Runs Orchestrator jobs on a thread pool and streams per-job results as JSONL"""
+    
+    def __init__(self, orchestrator, concurrency: int = 4, results_path: Optional[Path] = None):
+        """
+        Args:
+            orchestrator: Shared Orchestrator (agents and clients are initialized once)
+            concurrency: Jobs in flight at once
+            results_path: JSONL file for per-job results (default: storage/outputs/batch_<timestamp>.jsonl)
+        """
+        self.orchestrator = orchestrator
+        self.concurrency = max(1, concurrency)
+        if results_path is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            results_path = orchestrator.outputs_dir / f"batch_{timestamp}.jsonl"
+        self.results_path = Path(results_path)
+        self._write_lock = threading.Lock()
+        
+        print(f"✓ Batch Runner initialized (concurrency: {self.concurrency})")
+        print(f"   Results: {self.results_path}")
+    
+    def _run_job(self, job: Dict[str, Any], save_logs: bool, execute: bool, resume: bool,
+                 deadline: Optional[float]) -> Dict[str, Any]:
+        """Run one job; never raises"""
+        start = time.perf_counter()
+        try:
+            result = self.orchestrator.run(job["prompt"], save_logs=save_logs, execute=execute,
+                                             job_id=job["id"], resume=resume, deadline=deadline)
+        except Exception as e:
+            result = {"success": False, "code_path": None, "error": str(e), "logs": {}}
+        
+        logs = result.get("logs") or {}
+        return {
+            "id": job["id"],
+            "prompt": job["prompt"],
+            "success": result["success"],
+            "code_path": result.get("code_path"),
+            "video_path": result.get("video_path"),
+            # Status when the job finished (a background final render may still be running)
+            "final_render": dict(result["final_render"]) if result.get("final_render") else None,
+            "error": result.get("error"),
+            "duration_seconds": round(time.perf_counter() - start, 3),
+            "token_summary": logs.get("token_summary"),
+            "deadline": logs.get("deadline"),
+            "call_budget": logs.get("call_budget"),
+            "finished_at": datetime.now().isoformat()
+        }
+    
+    def _write_result(self, record: Dict[str, Any]):
+        with self._write_lock:
+            with open(self.results_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+    
+    def run(self, jobs: List[Dict[str, Any]], save_logs: bool = True, execute: bool = False,
+            resume: bool = False, deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Run all jobs and append each result to the JSONL file as it finishes.
+        
+        Args:
+            jobs: Jobs from load_jobs()
+            save_logs: Save per-job logs
+            execute: Render videos (renders are capped by the sandbox's render slots)
+            resume: Reuse checkpointed stage outputs (re-running a batch only redoes unfinished work)
+            deadline: Time budget in seconds for each job (None = no limit)
+        
+        Returns:
+            Throughput/latency summary:
+            {"jobs", "succeeded", "failed", "wall_seconds", "jobs_per_minute",
+             "latency_mean", "latency_p50", "latency_p95", "latency_max", "results_path"}
+        """
+        print(f"\n📦 Starting batch: {len(jobs)} jobs, {self.concurrency} at a time")
+        self.results_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        start = time.perf_counter()
+        records = []
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch-job") as executor:
+            futures = {executor.submit(self._run_job, job, save_logs, execute, resume, deadline): job for job in jobs}
+            for future in as_completed(futures):
+                record = future.result()
+                records.append(record)
+                self._write_result(record)
+                status = "✅" if record["success"] else "❌"
+                print(f"\n{status} [{len(records)}/{len(jobs)}] {record['id']} "
+                      f"finished in {record['duration_seconds']:.1f}s")
+        
+        wall = time.perf_counter() - start
+        latencies = [record["duration_seconds"] for record in records]
+        succeeded = sum(1 for record in records if record["success"])
+        return {
+            "jobs": len(records),
+            "succeeded": succeeded,
+            "failed": len(records) - succeeded,
+            "wall_seconds": round(wall, 3),
+            "jobs_per_minute": round(len(records) / wall * 60, 2) if wall > 0 else 0.0,
+            "latency_mean": round(sum(latencies) / len(latencies), 3) if latencies else None,
+            "latency_p50": _percentile(latencies, 50),
+            "latency_p95": _percentile(latencies, 95),
+            "latency_max": max(latencies) if latencies else None,
+            "results_path": str(self.results_path)
+        }
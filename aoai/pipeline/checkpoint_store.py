@@ -0,0 +1,107 @@
+"""
+Checkpoint Store
+Persists stage outputs per run key so an interrupted or failed run can resume
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Any
+
+
+class CheckpointStore:
+    """One directory per run key, one JSON file per completed stage output"""
+    
+    # Process-wide, so every store on the same directory shares them
+    _locks: Dict[str, threading.Lock] = {}
+    _locks_guard = threading.Lock()
+    
+    def __init__(self, checkpoint_dir: Path):
+        """
+        Args:
+            checkpoint_dir: Root directory (storage/checkpoints)
+        """
+        self.checkpoint_dir = Path(checkpoint_dir)
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        print(f"✓ Checkpoint Store initialized ({self.checkpoint_dir})")
+    
+    @staticmethod
+    def make_run_key(user_prompt: str, config: Dict[str, Any]) -> str:
+        """
+        Deterministic key for a prompt under a pipeline configuration.
+        
+        Args:
+            user_prompt: User's natural language input
+            config: Anything that changes stage outputs (models, templates, ...)
+        
+        Returns:
+            16-char hex key
+        """
+        payload = json.dumps({"prompt": user_prompt.strip(), "config": config}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+    
+    def _run_dir(self, run_key: str) -> Path:
+        return self.checkpoint_dir / run_key
+    
+    def lock(self, run_key: str) -> threading.Lock:
+        """
+        Lock held by the run currently using a run key's checkpoints.
+        
+        Concurrent runs of the same prompt/config would otherwise clear and
+        overwrite each other's files, so they take turns.
+        """
+        with self._locks_guard:
+            return self._locks.setdefault(str(self._run_dir(run_key).resolve()), threading.Lock())
+    
+    def save(self, run_key: str, name: str, value: Any):
+        """
+        Checkpoint one stage output (written atomically).
+        
+        Args:
+            run_key: Key from make_run_key()
+            name: Output name ('reasoning', 'scene_manifest', 'manim_code', ...)
+            value: JSON-serializable output
+        """
+        run_dir = self._run_dir(run_key)
+        run_dir.mkdir(parents=True, exist_ok=True)
+        
+        fd, tmp_path = tempfile.mkstemp(dir=str(run_dir), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"name": name, "value": value}, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, run_dir / f"{name}.json")
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+    
+    def load(self, run_key: str) -> Dict[str, Any]:
+        """
+        Load every checkpointed output of a run.
+        
+        Args:
+            run_key: Key from make_run_key()
+        
+        Returns:
+            {output name: value} (empty if the run has no checkpoints)
+        """
+        run_dir = self._run_dir(run_key)
+        if not run_dir.exists():
+            return {}
+        
+        outputs = {}
+        for path in sorted(run_dir.glob("*.json")):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+                outputs[entry["name"]] = entry["value"]
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️  Ignoring unreadable checkpoint {path.name}: {str(e)}")
+        return outputs
+    
+    def clear(self, run_key: str):
+        """Remove all checkpoints of a run"""
+        shutil.rmtree(self._run_dir(run_key), ignore_errors=True)
@@ -2,17 +2,50 @@
 Execution Sandbox
 Safely runs Manim scripts and captures output/errors
 """
+import asyncio
+import contextvars
 import subprocess
 import os
+import sys
 import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, Any, Optional
 
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.tracing import start_span
+from utils.deadline import cap_timeout, remaining_time, deadline_exceeded
+from pipeline.render_worker import RenderWorkerPool, RenderWorkerError
+
 
 class ExecutionSandbox:
     """Isolated environment for running Manim renders"""
     
-    def __init__(self, storage_path: str):
+    RENDER_TIMEOUT = 300  # 5 minute timeout per render
+    POLL_INTERVAL = 0.5   # Seconds between cancellation checks
+
+    # Render quality -> (manim flag, description)
+    QUALITIES = {
+        "low": ("-ql", "Low (480p15)"),
+        "medium": ("-qm", "Medium (720p30)"),
+        "high": ("-qh", "High (1080p60)"),
+        "4k": ("-qk", "4K (2160p60)")
+    }
+
+    def __init__(self, storage_path: str, max_concurrent_renders: Optional[int] = None,
+                 warm_workers: bool = False):
+        """
+        Args:
+            storage_path: Storage root (outputs/ and temp/ live here)
+            max_concurrent_renders: Cap on simultaneous Manim processes (None = one per CPU core)
+            warm_workers: Render in forked children of pre-imported Manim workers
+                          (falls back to the manim CLI when they are unavailable)
+        """
         self.storage_path = Path(storage_path)
         self.outputs_dir = self.storage_path / "outputs"
         self.temp_dir = self.storage_path / "temp"
@@ -21,18 +54,85 @@ class ExecutionSandbox:
         self.outputs_dir.mkdir(parents=True, exist_ok=True)
         self.temp_dir.mkdir(parents=True, exist_ok=True)
         
-        print(f"✓ Execution Sandbox initialized")
+        # Rendering is CPU-bound; concurrent jobs queue here while others use the network
+        self.max_concurrent_renders = max_concurrent_renders or os.cpu_count() or 1
+        self.render_slots = threading.Semaphore(self.max_concurrent_renders)
+        
+        # Worker threads behind arun(); each one drives (and mostly waits on) a Manim process
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        
+        # One warm worker per render slot
+        self.render_workers = RenderWorkerPool(self.max_concurrent_renders, self.temp_dir) if warm_workers else None
+        
+        # Workspaces of renders in progress (cleanup_temp leaves them alone)
+        self._active_workspaces = set()
+        self._workspaces_lock = threading.Lock()
+        
+        print(f"✓ Execution Sandbox initialized ({self.max_concurrent_renders} concurrent renders)")
         print(f"   Output directory: {self.outputs_dir}")
         print(f"   Temp directory: {self.temp_dir}")
     
-    def run(self, code: str, scene_name: str = "GeneratedScene") -> Dict[str, Any]:
+    def run(self, code: str, scene_name: str = "GeneratedScene", job_id: Optional[str] = None,
+            cancel_event: Optional[threading.Event] = None, quality: str = "medium",
+            output_suffix: str = "") -> Dict[str, Any]:
+        """Traced wrapper around _run() (see there)"""
+        with start_span("sandbox.render", kind="CLIENT", aoai__scene=scene_name, aoai__job_id=job_id,
+                        aoai__code_lines=len(code.splitlines()), aoai__quality=quality) as span:
+            result = self._run(code, scene_name, job_id, cancel_event, quality, output_suffix)
+            span.set_attributes(process__exit_code=result["exit_code"], aoai__success=result["success"],
+                                aoai__cancelled=result["exit_code"] == -5)
+            span.set_status("OK" if result["success"] else "ERROR",
+                            "" if result["success"] else result["stderr"][-200:])
+            return result
+    
+    async def arun(self, code: str, scene_name: str = "GeneratedScene", job_id: Optional[str] = None,
+                   cancel_event: Optional[threading.Event] = None, quality: str = "medium",
+                   output_suffix: str = "") -> Dict[str, Any]:
+        """
+        Async variant of run() for event-loop callers.
+        
+        The render runs on the sandbox's worker pool (sized to the render
+        slots), so many scenes can be awaited at once, e.g. with
+        asyncio.gather(); the render slots still cap simultaneous Manim
+        processes.
+        
+        Returns:
+            Same result dict as run()
+        """
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent_renders,
+                                                    thread_name_prefix="sandbox-render")
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, lambda: context.run(
+            self.run, code, scene_name, job_id, cancel_event, quality, output_suffix))
+
+    def shutdown(self):
+        """Stop the arun() worker pool (waits for renders in progress) and the warm render workers"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+        if self.render_workers is not None:
+            self.render_workers.close()
+    
+    def _run(self, code: str, scene_name: str = "GeneratedScene", job_id: Optional[str] = None,
+             cancel_event: Optional[threading.Event] = None, quality: str = "medium",
+             output_suffix: str = "") -> Dict[str, Any]:
         """
         Execute Manim script and capture results.
         
         Args:
             code: Python script containing Manim scene
             scene_name: Name of the Scene class to render
-            
+            job_id: Batch job id; gives the script and video job-specific names
+                    (otherwise they are named after a random render id)
+            cancel_event: When set, a waiting or running render is stopped (exit code -5)
+            quality: Key of QUALITIES
+            output_suffix: Appended to the script and video names (e.g. "_preview")
+
         Returns:
             {
                 "success": bool,
@@ -46,9 +146,26 @@ class ExecutionSandbox:
         print("🎬 EXECUTING MANIM RENDER")
         print(f"{'='*60}")
         
-        # Save code to temp file
-        script_path = self.temp_dir / "scene.py"
+        # Each render gets its own workspace (script, media dir, partial movie files)
+        render_id = uuid.uuid4().hex[:8]
+        script_stem = (f"scene_{job_id}" if job_id else f"scene_{render_id}") + output_suffix
+        workspace = self.temp_dir / f"render_{render_id}"
+        with self._workspaces_lock:
+            self._active_workspaces.add(workspace)
+        try:
+            return self._render(code, scene_name, script_stem, workspace, cancel_event, quality)
+        finally:
+            with self._workspaces_lock:
+                self._active_workspaces.discard(workspace)
+            shutil.rmtree(workspace, ignore_errors=True)
+    
+    def _render(self, code: str, scene_name: str, script_stem: str, workspace: Path,
+                cancel_event: Optional[threading.Event], quality: str) -> Dict[str, Any]:
+        """Write the script into the render's workspace and run Manim there (see _run)"""
+        # Save code to the workspace
+        script_path = workspace / f"{script_stem}.py"
         try:
+            workspace.mkdir(parents=True, exist_ok=True)
             script_path.write_text(code, encoding='utf-8')
             print(f"📝 Saved script to: {script_path}")
         except Exception as e:
@@ -61,31 +178,50 @@ class ExecutionSandbox:
             }
         
         # Build Manim command
+        quality_flag, quality_name = self.QUALITIES[quality]
         cmd = [
             "manim",
-            "-qm",  # Medium quality
-            "-o", "output.mp4",  # Output filename
+            quality_flag,
+            "-o", f"{script_stem}.mp4",  # Output filename
+            "--media_dir", str(workspace / "media"),
             str(script_path),
             scene_name
         ]
         
         print(f"🔧 Running: {' '.join(cmd)}")
         print(f"   Scene: {scene_name}")
-        print(f"   Quality: Medium")
+        print(f"   Quality: {quality_name}")
+
+        if self.render_slots is not None and not self.render_slots.acquire(blocking=False):
+            print(f"   Waiting for a render slot...")
+            while not self.render_slots.acquire(timeout=self.POLL_INTERVAL):
+                if cancel_event is not None and cancel_event.is_set():
+                    return self._cancelled_result()
+                if remaining_time() == 0:
+                    return self._deadline_result()
         
         try:
-            # Run Manim subprocess
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                cwd=str(self.temp_dir),
-                timeout=300  # 5 minute timeout
-            )
-            
-            stdout = result.stdout
-            stderr = result.stderr
-            exit_code = result.returncode
+            # Run Manim subprocess (polled so a cancelled render can be killed)
+            process = self._start_process(cmd, workspace)
+            # The job deadline can cut the render short
+            render_timeout = cap_timeout(self.RENDER_TIMEOUT)
+            render_deadline = time.monotonic() + render_timeout
+            while True:
+                try:
+                    stdout, stderr = process.communicate(timeout=self.POLL_INTERVAL)
+                    break
+                except subprocess.TimeoutExpired:
+                    if cancel_event is not None and cancel_event.is_set():
+                        process.kill()
+                        process.communicate()
+                        return self._cancelled_result()
+                    if time.monotonic() > render_deadline:
+                        process.kill()
+                        process.communicate()
+                        if render_timeout < self.RENDER_TIMEOUT:
+                            return self._deadline_result()
+                        raise
+            exit_code = process.returncode
             
             print(f"\n📊 Execution completed")
             print(f"   Exit code: {exit_code}")
@@ -95,7 +231,7 @@ class ExecutionSandbox:
             # Check if successful
             if exit_code == 0:
                 # Find generated video
-                video_path = self._find_video_output(scene_name)
+                video_path = self._find_video_output(workspace, script_stem)
                 
                 if video_path and video_path.exists():
                     # Move video to outputs directory
@@ -168,38 +304,88 @@ class ExecutionSandbox:
                 "stderr": error_msg,
                 "exit_code": -4
             }
+        
+        finally:
+            if self.render_slots is not None:
+                self.render_slots.release()
+    
+    def _start_process(self, cmd, workspace: Path):
+        """Start Manim in a warm worker's forked child if one is idle, else as a fresh CLI process"""
+        if self.render_workers is not None:
+            worker = self.render_workers.acquire()
+            if worker is not None:
+                try:
+                    process = worker.start(cmd[1:], workspace)
+                    print(f"   ♨️  Warm worker (child pid {process.pid})")
+                    return process
+                except RenderWorkerError as e:
+                    self.render_workers.discard(worker)
+                    print(f"   ⚠️  {str(e)}, using the manim CLI")
+        return subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            cwd=str(workspace)
+        )
+    
+    def _cancelled_result(self) -> Dict[str, Any]:
+        print(f"\n⏹️  Render cancelled")
+        return {
+            "success": False,
+            "video_path": None,
+            "stdout": "",
+            "stderr": "Render cancelled",
+            "exit_code": -5
+        }
+    
+    def _deadline_result(self) -> Dict[str, Any]:
+        error_msg = str(deadline_exceeded("manim render"))
+        print(f"\n⏳ {error_msg}")
+        return {
+            "success": False,
+            "video_path": None,
+            "stdout": "",
+            "stderr": error_msg,
+            "exit_code": -6
+        }
     
-    def _find_video_output(self, scene_name: str) -> Optional[Path]:
+    def _find_video_output(self, workspace: Path, script_stem: str) -> Optional[Path]:
         """
         Find the generated video file in Manim's output structure.
-        Manim typically outputs to: media/videos/scene/{quality}/output.mp4
+        Manim outputs to: {workspace}/media/videos/{script_stem}/{quality}/{script_stem}.mp4
         
         Args:
-            scene_name: Name of the scene class
+            workspace: The render's workspace
+            script_stem: Script filename without .py (also the -o output name)
             
         Returns:
             Path to video file or None
         """
         # Manim output structure
-        media_dir = self.temp_dir / "media" / "videos" / "scene"
+        media_dir = workspace / "media" / "videos" / script_stem
         
         if not media_dir.exists():
             return None
         
-        # Search for mp4 files in quality subdirectories
+        # Search quality subdirectories for this render's output file
         for quality_dir in media_dir.iterdir():
-            if quality_dir.is_dir():
-                for video_file in quality_dir.glob("*.mp4"):
-                    return video_file
+            video_file = quality_dir / f"{script_stem}.mp4"
+            if video_file.is_file():
+                return video_file
         
         return None
     
     def cleanup_temp(self):
-        """Clean up temporary files after execution"""
+        """Clean up temporary files after execution (workspaces of running renders are kept)"""
         try:
             if self.temp_dir.exists():
+                with self._workspaces_lock:
+                    active = set(self._active_workspaces)
                 # Remove all contents but keep the directory
                 for item in self.temp_dir.iterdir():
+                    if item in active:
+                        continue
                     if item.is_file():
                         item.unlink()
                     elif item.is_dir():
@@ -0,0 +1,460 @@
+"""
+Job Server
+Long-running HTTP/JSON service that keeps one warm Orchestrator and runs submitted jobs
+"""
+import json
+import queue
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlparse
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.deadline import parse_duration
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+class JobServer:
+    """
+    Bounded job queue in front of a shared Orchestrator.
+    
+    Agents, LLM clients, the HTTP transport and the sandbox are created once
+    and reused by every job; a fixed pool of worker threads runs jobs and
+    the queue rejects new ones (HTTP 429) when it is full.
+    """
+    
+    FINISHED_STATES = ("succeeded", "failed")
+    MAX_BODY_BYTES = 64 * 1024
+    KEEPALIVE_SECONDS = 15.0  # SSE comment interval while a job is quiet
+    
+    def __init__(self, orchestrator, workers: int = 2, queue_size: int = 16,
+                 save_logs: bool = True, execute: bool = False, max_finished_jobs: int = 500,
+                 deadline: Optional[float] = None):
+        """
+        Args:
+            orchestrator: Warm Orchestrator shared by all jobs
+            workers: Jobs that run at the same time
+            queue_size: Jobs allowed to wait for a worker before submissions get 429
+            save_logs: Save per-job logs
+            execute: Render videos unless a job says otherwise
+            max_finished_jobs: Finished jobs kept for status/artifact requests
+            deadline: Default time budget in seconds for each job's run (None = no limit)
+        """
+        self.orchestrator = orchestrator
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.save_logs = save_logs
+        self.execute = execute
+        self.max_finished_jobs = max_finished_jobs
+        self.deadline = deadline
+        
+        self._queue: "queue.Queue[str]" = queue.Queue(maxsize=self.queue_size)
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._events: Dict[str, List[Dict[str, Any]]] = {}
+        self._changed = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._counts = {"submitted": 0, "rejected": 0, "succeeded": 0, "failed": 0}
+        self._started_at = time.time()
+        
+        print(f"✓ Job Server initialized ({self.workers} workers, queue size {self.queue_size})")
+    
+    # ========================================
+    # Job lifecycle
+    # ========================================
+    
+    def start(self):
+        """Start the worker threads"""
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{index + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    
+    def submit(self, prompt: str, execute: Optional[bool] = None, resume: bool = False,
+               refresh: bool = False, deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Queue a job.
+        
+        Args:
+            prompt: Math concept to visualize
+            execute: Render the video (defaults to the server setting)
+            resume: Reuse checkpointed stage outputs of an earlier run of this prompt
+            refresh: Ignore and replace cached results for this prompt
+            deadline: Time budget in seconds for the run (defaults to the server setting)
+        
+        Returns:
+            Public job status
+        
+        Raises:
+            JobQueueFull: No room in the queue
+        """
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            "id": job_id,
+            "prompt": prompt,
+            "execute": self.execute if execute is None else bool(execute),
+            "resume": bool(resume),
+            "refresh": bool(refresh),
+            "deadline": self.deadline if deadline is None else deadline,
+            "status": "queued",
+            "submitted_at": datetime.now().isoformat(),
+            "started_at": None,
+            "finished_at": None,
+            "duration_seconds": None,
+            "code_path": None,
+            "video_path": None,
+            "final_render": None,
+            "error": None,
+            "token_summary": None,
+            "deadline_report": None,
+            "call_budget": None
+        }
+        
+        with self._changed:
+            try:
+                self._queue.put_nowait(job_id)
+            except queue.Full:
+                self._counts["rejected"] += 1
+                raise JobQueueFull(f"Job queue is full ({self.queue_size} waiting)")
+            self._jobs[job_id] = job
+            self._events[job_id] = []
+            self._counts["submitted"] += 1
+            self._add_event(job_id, {"type": "job", "status": "queued"})
+        
+        print(f"📥 Job {job_id} queued: '{prompt[:60]}'")
+        return self.job_status(job_id)
+    
+    def _add_event(self, job_id: str, event: Dict[str, Any]):
+        """Append a progress event and wake SSE listeners (caller may hold the lock)"""
+        with self._changed:
+            events = self._events.get(job_id)
+            if events is None:
+                return
+            events.append(dict(event, id=len(events), time=datetime.now().isoformat()))
+            self._changed.notify_all()
+    
+    def _worker(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._run_job(job_id)
+            finally:
+                self._queue.task_done()
+    
+    def _run_job(self, job_id: str):
+        """Run one job on the shared orchestrator; never raises"""
+        with self._changed:
+            job = self._jobs[job_id]
+            job["status"] = "running"
+            job["started_at"] = datetime.now().isoformat()
+        self._add_event(job_id, {"type": "job", "status": "running"})
+        
+        start = time.perf_counter()
+        try:
+            result = self.orchestrator.run(
+                job["prompt"],
+                save_logs=self.save_logs,
+                execute=job["execute"],
+                job_id=job_id,
+                resume=job["resume"],
+                refresh=job["refresh"],
+                deadline=job["deadline"],
+                on_event=lambda event: self._add_event(job_id, dict(event, type="stage"))
+            )
+        except Exception as e:
+            result = {"success": False, "code_path": None, "error": str(e), "logs": {}}
+        
+        status = "succeeded" if result["success"] else "failed"
+        with self._changed:
+            job.update({
+                "status": status,
+                "finished_at": datetime.now().isoformat(),
+                "duration_seconds": round(time.perf_counter() - start, 3),
+                "code_path": result.get("code_path"),
+                "video_path": result.get("video_path"),
+                # With a background final render this is the preview; the dict is updated in place
+                "final_render": result.get("final_render"),
+                "error": result.get("error"),
+                "token_summary": (result.get("logs") or {}).get("token_summary"),
+                "deadline_report": (result.get("logs") or {}).get("deadline"),
+                "call_budget": (result.get("logs") or {}).get("call_budget")
+            })
+            self._counts[status] += 1
+            self._add_event(job_id, {"type": "job", "status": status, "error": job["error"]})
+            self._forget_old_jobs()
+        
+        print(f"{'✅' if result['success'] else '❌'} Job {job_id} {status} in {job['duration_seconds']:.1f}s")
+    
+    def _forget_old_jobs(self):
+        """Drop the oldest finished jobs beyond max_finished_jobs (lock held)"""
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] in self.FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
+            del self._events[job_id]
+    
+    # ========================================
+    # Queries
+    # ========================================
+    
+    def job_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Public view of a job (None if unknown)"""
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            status = dict(job)
+            if job["final_render"] is not None:
+                status["final_render"] = dict(job["final_render"])
+                status["video_path"] = self._video_path(job)
+            status["artifacts"] = {
+                name: f"/jobs/{job_id}/artifacts/{name}"
+                for name in self._artifacts(job)
+            }
+            return status
+    
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        """Public view of every known job, oldest first"""
+        with self._changed:
+            job_ids = list(self._jobs)
+        return [status for status in map(self.job_status, job_ids) if status is not None]
+    
+    @staticmethod
+    def _video_path(job: Dict[str, Any]) -> Optional[str]:
+        """The job's best video so far: the final render once it succeeded, else the (preview) video"""
+        final_render = job.get("final_render")
+        if final_render and final_render["status"] == "succeeded":
+            return final_render["video_path"]
+        return job.get("video_path")
+
+    @classmethod
+    def _artifacts(cls, job: Dict[str, Any]) -> Dict[str, Tuple[str, str]]:
+        """{artifact name: (file path, content type)} for the files a job produced"""
+        artifacts = {}
+        if job.get("code_path"):
+            artifacts["scene.py"] = (job["code_path"], "text/x-python; charset=utf-8")
+        video_path = cls._video_path(job)
+        if video_path:
+            artifacts["video.mp4"] = (video_path, "video/mp4")
+        if job.get("final_render") and video_path != job.get("video_path"):
+            artifacts["preview.mp4"] = (job["video_path"], "video/mp4")
+        return artifacts
+    
+    def artifact(self, job_id: str, name: str) -> Optional[Tuple[Path, str]]:
+        """Resolve an artifact to (path, content type); only files recorded for the job are served"""
+        with self._changed:
+            job = self._jobs.get(job_id)
+            entry = self._artifacts(job).get(name) if job else None
+        if entry is None or not Path(entry[0]).is_file():
+            return None
+        return Path(entry[0]), entry[1]
+    
+    def wait_for_events(self, job_id: str, after: int, timeout: float) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Block until the job has events newer than `after` (or timeout).
+        
+        Returns:
+            (new events, whether the job has finished)
+        """
+        def finished() -> bool:
+            job = self._jobs.get(job_id)
+            return job is None or job["status"] in self.FINISHED_STATES
+        
+        with self._changed:
+            self._changed.wait_for(
+                lambda: len(self._events.get(job_id, [])) > after + 1 or finished(),
+                timeout=timeout
+            )
+            return list(self._events.get(job_id, [])[after + 1:]), finished()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Worker, queue and job counters"""
+        with self._changed:
+            running = sum(1 for job in self._jobs.values() if job["status"] == "running")
+            return dict(
+                self._counts,
+                workers=self.workers,
+                running=running,
+                queued=self._queue.qsize(),
+                queue_size=self.queue_size,
+                uptime_seconds=round(time.time() - self._started_at, 1)
+            )
+    
+    # ========================================
+    # HTTP
+    # ========================================
+    
+    def serve(self, host: str = "127.0.0.1", port: int = 8765):
+        """
+        Start the workers and serve the job API until interrupted.
+        
+        Endpoints:
+            GET  /health                        Worker/queue counters
+            POST /jobs                          {"prompt", "execute"?, "resume"?, "refresh"?, "deadline"?} → 202, or 429 when full
+            GET  /jobs                          All known jobs
+            GET  /jobs/<id>                     Job status
+            GET  /jobs/<id>/events              Progress as Server-Sent Events
+            GET  /jobs/<id>/artifacts/<name>    scene.py or video.mp4
+        """
+        self.start()
+        handler = type("JobRequestHandler", (_JobRequestHandler,), {"job_server": self})
+        httpd = ThreadingHTTPServer((host, port), handler)
+        httpd.daemon_threads = True
+        
+        print("\n" + "="*60)
+        print(f"🛰️  Serving job API on http://{host}:{httpd.server_address[1]}")
+        print("="*60)
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            print("\n⚠️  Server interrupted, unfinished jobs are abandoned")
+        finally:
+            httpd.server_close()
+
+
+class _JobRequestHandler(BaseHTTPRequestHandler):
+    """Routes the job API to a JobServer (bound as the job_server class attribute)"""
+    
+    job_server: JobServer = None
+    protocol_version = "HTTP/1.1"
+    
+    def log_message(self, format, *args):
+        print(f"🌐 {self.address_string()} {format % args}")
+    
+    def _send_json(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _send_error(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        self._send_json(status, {"error": message}, headers)
+    
+    def _route(self) -> List[str]:
+        return [part for part in urlparse(self.path).path.split("/") if part]
+    
+    def do_GET(self):
+        parts = self._route()
+        server = self.job_server
+        
+        if parts == ["health"]:
+            return self._send_json(200, server.stats())
+        if parts == ["jobs"]:
+            return self._send_json(200, {"jobs": server.list_jobs()})
+        if len(parts) < 2 or parts[0] != "jobs":
+            return self._send_error(404, "Not found")
+        
+        status = server.job_status(parts[1])
+        if status is None:
+            return self._send_error(404, f"Unknown job: {parts[1]}")
+        if len(parts) == 2:
+            return self._send_json(200, status)
+        if parts[2:] == ["events"]:
+            return self._stream_events(parts[1])
+        if len(parts) == 4 and parts[2] == "artifacts":
+            return self._send_artifact(parts[1], parts[3])
+        return self._send_error(404, "Not found")
+    
+    def do_POST(self):
+        if self._route() != ["jobs"]:
+            return self._send_error(404, "Not found")
+        
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > JobServer.MAX_BODY_BYTES:
+            return self._send_error(413, "Request body too large")
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            return self._send_error(400, f"Invalid JSON: {str(e)}")
+        
+        prompt = payload.get("prompt") if isinstance(payload, dict) else None
+        if not isinstance(prompt, str) or not prompt.strip():
+            return self._send_error(400, "Expected a JSON object with a non-empty 'prompt'")
+        
+        # Seconds, or a duration string such as "90s" / "2m"
+        deadline = payload.get("deadline")
+        try:
+            if isinstance(deadline, str):
+                deadline = parse_duration(deadline)
+            elif deadline is not None and (isinstance(deadline, bool) or not isinstance(deadline, (int, float))
+                                           or deadline <= 0):
+                raise ValueError(f"Invalid deadline: {deadline!r}")
+        except ValueError as e:
+            return self._send_error(400, str(e))
+        
+        # JSON booleans only: bool("false") would be True
+        for flag in ("execute", "resume", "refresh"):
+            if payload.get(flag) is not None and not isinstance(payload[flag], bool):
+                return self._send_error(400, f"Invalid {flag}: {payload[flag]!r} (expected true or false)")
+        
+        try:
+            status = self.job_server.submit(prompt.strip(), payload.get("execute"), payload.get("resume") or False,
+                                            payload.get("refresh") or False, deadline)
+        except JobQueueFull as e:
+            return self._send_error(429, str(e), {"Retry-After": "10"})
+        self._send_json(202, status, {"Location": f"/jobs/{status['id']}"})
+    
+    def _stream_events(self, job_id: str):
+        """Server-Sent Events until the job finishes (resumes after Last-Event-ID)"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        
+        try:
+            last = int(self.headers.get("Last-Event-ID", -1))
+        except ValueError:
+            last = -1
+        
+        try:
+            while True:
+                events, finished = self.job_server.wait_for_events(job_id, last, JobServer.KEEPALIVE_SECONDS)
+                if not events and not finished:
+                    self.wfile.write(b": keepalive\n\n")
+                for event in events:
+                    last = event["id"]
+                    data = json.dumps(event, ensure_ascii=False)
+                    self.wfile.write(f"id: {last}\nevent: {event['type']}\ndata: {data}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                if finished and not events:
+                    self.wfile.write(b"event: end\ndata: {}\n\n")
+                    self.wfile.flush()
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away; the job keeps running
+            return
+    
+    def _send_artifact(self, job_id: str, name: str):
+        artifact = self.job_server.artifact(job_id, name)
+        if artifact is None:
+            return self._send_error(404, f"No artifact '{name}' for job {job_id}")
+        
+        path, content_type = artifact
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(path.stat().st_size))
+        self.send_header("Content-Disposition", f'attachment; filename="{job_id}_{name}"')
+        self.end_headers()
+        try:
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(64 * 1024)
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            return
@@ -3,8 +3,9 @@ Pipeline Orchestrator
 Coordinates the 4-agent workflow from prompt to video
 """
 import sys
+import hashlib
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Callable
 from datetime import datetime
 import json
 
@@ -12,12 +13,34 @@ import json
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from utils.file_io import save_json_log, save_code
+from llm.model_router import routing_decisions
+from utils.prompt_budget import token_usage, summarize_token_usage
+from pipeline.stage_graph import StageGraph
+from pipeline.checkpoint_store import CheckpointStore
+from pipeline.result_cache import ResultCache
+from llm.hedging import HedgedClient
+from llm.replay_client import ReplayClient
+from utils.tracing import open_span
+from utils.deadline import Deadline, current_deadline, check_cancelled
+from utils.call_budget import CallBudget, current_call_budget
 
 
 class Orchestrator:
     """Main pipeline controller that routes data between agents"""
     
-    def __init__(self, agents: Dict[str, Any], storage_path: Path, sandbox=None, retry_manager=None):
+    # Per-stage timeout (seconds per attempt) and retry policy for the stage graph
+    STAGE_POLICIES = {
+        'logician': {"timeout": 300},
+        'director': {"timeout": 300},
+        'engineer': {"timeout": 600},
+        'narrator': {"timeout": 300, "retries": 1, "optional": True},
+        'render': {}  # The sandbox enforces its own per-render timeout
+    }
+    
+    def __init__(self, agents: Dict[str, Any], storage_path: Path, sandbox=None, retry_manager=None,
+                 stage_policies: Optional[Dict[str, Dict[str, Any]]] = None, speculative_candidates: int = 0,
+                 result_cache: Optional[ResultCache] = None, max_llm_calls: Optional[int] = None,
+                 max_renders: Optional[int] = None):
         """
         Args:
             agents: Dictionary containing initialized agents
@@ -25,6 +48,12 @@ class Orchestrator:
             storage_path: Path to storage directory
             sandbox: Optional ExecutionSandbox instance
             retry_manager: Optional RetryManager instance
+            stage_policies: Overrides for STAGE_POLICIES ({stage: {"timeout", "retries", ...}})
+            speculative_candidates: When rendering, generate this many scripts and race their
+                                    renders (0 or 1 = a single script)
+            result_cache: Optional ResultCache; hits skip every agent and the render
+            max_llm_calls: LLM API requests allowed per run, across all retry layers (None = unlimited)
+            max_renders: Manim renders allowed per run (None = unlimited)
         """
         self.logician = agents['logician']
         self.director = agents['director']
@@ -33,6 +62,13 @@ class Orchestrator:
         self.narrator = agents.get('narrator')  # Optional narrator agent
         self.sandbox = sandbox
         self.retry_manager = retry_manager
+        self.speculative_candidates = speculative_candidates
+        self.result_cache = result_cache
+        self.max_llm_calls = max_llm_calls
+        self.max_renders = max_renders
+        self.stage_policies = {name: dict(policy) for name, policy in self.STAGE_POLICIES.items()}
+        for name, policy in (stage_policies or {}).items():
+            self.stage_policies.setdefault(name, {}).update(policy)
         
         # Set up storage paths
         self.storage_path = Path(storage_path)
@@ -45,6 +81,9 @@ class Orchestrator:
         self.logs_dir.mkdir(parents=True, exist_ok=True)
         self.temp_dir.mkdir(parents=True, exist_ok=True)
         
+        # Stage outputs are checkpointed per run key for --resume
+        self.checkpoints = CheckpointStore(self.storage_path / "checkpoints")
+        
         print("\n" + "="*60)
         print("🎯 AOAI ORCHESTRATOR INITIALIZED")
         print("="*60)
@@ -52,7 +91,35 @@ class Orchestrator:
         print(f"📁 Outputs: {self.outputs_dir}")
         print(f"📁 Logs: {self.logs_dir}")
     
-    def run(self, user_prompt: str, save_logs: bool = True, execute: bool = False) -> Dict[str, Any]:
+    def _run_config(self) -> Dict[str, Any]:
+        """Settings that change stage outputs; part of the checkpoint run key"""
+        prompts_path = Path(__file__).parent.parent / "utils" / "prompts.py"
+        config = {"templates": hashlib.sha256(prompts_path.read_bytes()).hexdigest()[:16]}
+        for name in ('logician', 'director', 'engineer', 'narrator'):
+            agent = getattr(self, name)
+            config[name] = self._llm_models(getattr(agent, "llm", None))
+        # Cached videos are only reused at the same quality (medium keeps the earlier keys)
+        quality = getattr(self.retry_manager, "final_quality", "medium")
+        if quality != "medium":
+            config["quality"] = quality
+        return config
+    
+    @staticmethod
+    def _llm_models(llm) -> Any:
+        """Model list of the client behind any hedging/recording wrappers (else its class name)"""
+        while True:
+            if isinstance(llm, HedgedClient):
+                llm = llm.client
+            elif isinstance(llm, ReplayClient) and llm.inner is not None:
+                llm = llm.inner
+            else:
+                break
+        return getattr(llm, "MODELS", None) or type(llm).__name__
+    
+    def run(self, user_prompt: str, save_logs: bool = True, execute: bool = False,
+            job_id: Optional[str] = None, resume: bool = False,
+            on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+            refresh: bool = False, deadline: Optional[float] = None) -> Dict[str, Any]:
         """
         Execute full pipeline: Reasoning → Planning → Generation → (Optional) Execution
         
@@ -60,12 +127,19 @@ class Orchestrator:
             user_prompt: User's natural language input
             save_logs: Whether to save intermediate logs
             execute: Whether to execute Manim rendering (requires manim installed)
+            job_id: Batch job id; keeps code, video and log filenames of concurrent runs apart
+            resume: Reuse checkpointed stage outputs of an earlier run of this prompt/config
+                    (always done after waiting for a concurrent run of it)
+            on_event: Receives stage progress events ({"stage", "status", ...})
+            refresh: Ignore and replace cached results for this prompt
+            deadline: Time budget in seconds for the whole run (None = no limit)
             
         Returns:
             {
                 "success": bool,
                 "code_path": str | None,
                 "video_path": str | None,
+                "final_render": {...} | None,  # Progressive quality: final render status (see RetryManager)
                 "logs": {...},
                 "error": str | None
             }
@@ -74,69 +148,106 @@ class Orchestrator:
         print(f"⏰ Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         
         start_time = datetime.now()
+        run_deadline = Deadline(deadline) if deadline is not None else None
+        log_suffix = f"_{job_id}" if job_id else ""
+        
+        # Root of this run's trace; stage, LLM and render spans nest under it
+        root_span = open_span("pipeline.run", aoai__job_id=job_id, aoai__prompt_chars=len(user_prompt),
+                              aoai__execute=execute, aoai__resume=resume)
+        
+        run_config = self._run_config()
+        config_key = hashlib.sha256(json.dumps(run_config, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        if self.result_cache is not None:
+            if refresh:
+                self.result_cache.invalidate(user_prompt)
+            else:
+                cached = self.result_cache.get(user_prompt, config_key, with_video=execute)
+                if cached is not None:
+                    root_span.set_attribute("aoai.result_cache", cached["match"])
+                    root_span.end()
+                    return self._cached_result(user_prompt, cached, start_time, save_logs, job_id, log_suffix, on_event)
+        
+        run_key = CheckpointStore.make_run_key(user_prompt, run_config)
+        run_lock = self.checkpoints.lock(run_key)
+        waited = not run_lock.acquire(blocking=False)
+        if waited:
+            print(f"⏳ Another run of this prompt and config ({run_key}) is in progress, waiting for it")
+            if not run_lock.acquire(timeout=run_deadline.remaining() if run_deadline is not None else -1):
+                error = run_deadline.exceeded("waiting for a concurrent run")
+                root_span.set_status("ERROR", str(error))
+                root_span.end()
+                raise error
+            # The other run has finished: reuse what it produced instead of redoing it
+            cached = None
+            if self.result_cache is not None and not refresh:
+                cached = self.result_cache.get(user_prompt, config_key, with_video=execute)
+            if cached is not None:
+                run_lock.release()
+                root_span.set_attribute("aoai.result_cache", cached["match"])
+                root_span.end()
+                return self._cached_result(user_prompt, cached, start_time, save_logs, job_id, log_suffix, on_event)
+        
         session_logs = {
+            "job_id": job_id,
             "user_prompt": user_prompt,
             "start_time": start_time.isoformat(),
-            "stages": {}
+            "stages": {},
+            "model_routing": [],  # Model chosen for each LLM request and why
+            "token_usage": []     # Prompt/completion tokens of each LLM call
         }
+        routing_token = routing_decisions.set(session_logs["model_routing"])
+        usage_token = token_usage.set(session_logs["token_usage"])
+        deadline_token = current_deadline.set(run_deadline)
+        call_budget = CallBudget(self.max_llm_calls, self.max_renders)
+        budget_token = current_call_budget.set(call_budget)
         
+        session_logs["run_key"] = run_key
+        session_logs["trace_id"] = root_span.trace_id
         try:
-            # ========================================
-            # Phase 1: Mathematical Reasoning (Agent A)
-            # ========================================
-            print("\n" + "="*60)
-            print("📍 PHASE 1: Mathematical Reasoning")
-            print("="*60)
-            
-            reasoning = self.logician.process(user_prompt)
-            session_logs["stages"]["reasoning"] = reasoning
-            
-            if save_logs:
-                save_json_log(reasoning, self.logs_dir, "logician")
-            
-            # ========================================
-            # Phase 2: Scene Planning (Agent B)
-            # ========================================
-            print("\n" + "="*60)
-            print("📍 PHASE 2: Scene Planning")
-            print("="*60)
-            
-            scene_manifest = self.director.process(reasoning)
-            session_logs["stages"]["scene_manifest"] = scene_manifest
-            
-            if save_logs:
-                save_json_log(scene_manifest, self.logs_dir, "director")
-            
-            # ========================================
-            # Phase 3: Code Generation (Agent C)
-            # ========================================
-            print("\n" + "="*60)
-            print("📍 PHASE 3: Code Generation")
-            print("="*60)
+            # After waiting, the other run's checkpoints are as good as our own
+            if resume or (waited and not refresh):
+                restored = self._restore(run_key, session_logs, execute)
+            else:
+                # A fresh run replaces whatever an earlier run of this key left behind
+                self.checkpoints.clear(run_key)
+                restored = {}
             
-            manim_code = self.engineer.process(scene_manifest)
-            session_logs["stages"]["code_length"] = len(manim_code)
-            
-            # Save generated code
-            code_path = save_code(manim_code, self.outputs_dir, "scene.py")
+            graph = self._build_graph(session_logs, save_logs, execute, job_id, log_suffix, run_key, restored)
+            graph.on_event = on_event
+        except BaseException:
+            run_lock.release()
+            routing_decisions.reset(routing_token)
+            token_usage.reset(usage_token)
+            current_deadline.reset(deadline_token)
+            current_call_budget.reset(budget_token)
+            root_span.end()
+            raise
+        
+        try:
+            values = graph.run(dict(restored, user_prompt=user_prompt))
+            session_logs["stage_timings"] = graph.timings()
+            session_logs["critical_path"] = graph.critical_path()
+            self._report_deadline(run_deadline, graph, session_logs)
+            session_logs["call_budget"] = call_budget.report()
             
-            # ========================================
-            # Phase 4: Execution (Optional)
-            # ========================================
+            code_path = values["code_path"]
             video_path = None
-            if execute:
-                print("\n" + "="*60)
-                print("📍 PHASE 4: Manim Execution")
-                print("="*60)
-                
-                # Execute the generated Manim code with auto-retry on errors
-                execution_result = self.retry_manager.execute_with_retry(manim_code)
-                
+            final_render = None
+            execution_result = values.get("execution_result")
+            if execution_result is not None:
                 if execution_result["success"]:
                     video_path = execution_result.get("video_path")
+                    final_render = execution_result.get("final_render")
                     print(f"✅ Video rendering completed!")
                     if video_path:
                         print(f"📹 Video saved: {video_path}")
+                    if final_render and final_render["status"] == "pending":
+                        print(f"🎞️  Final {final_render['quality']} render still running (this is the preview)")
+                    speculation = execution_result.get("speculation")
+                    if speculation and speculation["winner"]:
+                        print(f"🏁 Candidate {speculation['winner']}/{speculation['candidates']} won in "
+                              f"{speculation['time_to_first_success_seconds']:.1f}s "
+                              f"({speculation['wasted_render_seconds']:.1f}s of render time wasted)")
                 else:
                     print(f"❌ Execution failed after {execution_result.get('attempts', 0)} attempts")
                     print(f"   Last error: {execution_result.get('stderr', 'Unknown error')[:200]}...")
@@ -151,15 +262,37 @@ class Orchestrator:
             session_logs["duration_seconds"] = duration
             session_logs["success"] = True
             session_logs["video_path"] = video_path
+            session_logs["final_render"] = dict(final_render) if final_render else None
+            session_logs["token_summary"] = summarize_token_usage(session_logs["token_usage"])
+            root_span.set_status("OK")
             
             # Save complete session log
             if save_logs:
-                save_json_log(session_logs, self.logs_dir, "session")
+                save_json_log(session_logs, self.logs_dir, "session" + log_suffix)
+
+            # Runs that were asked to render are only cached with their (final) video
+            narration = session_logs["stages"].get("narration")
+            pending = final_render is not None and final_render["status"] == "pending"
+            if self.result_cache is not None and pending:
+                # Background final render: cache once it ends (keeping the preview if it failed, like a sync run)
+                self.retry_manager.on_final_render(final_render, lambda final: self._cache_result(
+                    user_prompt, config_key, code_path,
+                    final["video_path"] if final["status"] == "succeeded" else video_path, narration))
+            elif self.result_cache is not None and (video_path or not execute):
+                self._cache_result(user_prompt, config_key, code_path, video_path, narration)
             
             print("\n" + "="*60)
             print("✅ PIPELINE COMPLETED SUCCESSFULLY")
             print("="*60)
             print(f"⏱️  Duration: {duration:.2f}s")
+            critical = session_logs["critical_path"]
+            print(f"🧭 Critical path: {' → '.join(critical['stages'])} ({critical['seconds']:.1f}s)")
+            tokens = session_logs["token_summary"]
+            print(f"🧮 Tokens: {tokens['prompt_tokens']} prompt / {tokens['completion_tokens']} completion "
+                  f"over {tokens['calls']} calls ({tokens['savings_rate']:.0%} prompt tokens saved)")
+            calls = session_logs["call_budget"]
+            print(f"🔁 LLM calls: {calls['llm_calls']} (amplification {calls['amplification'] or 0:.2f}x), "
+                  f"renders: {calls['renders']}")
             print(f"📄 Code saved: {code_path}")
             if video_path:
                 print(f"📹 Video saved: {video_path}")
@@ -170,6 +303,8 @@ class Orchestrator:
                 "success": True,
                 "code_path": str(code_path),
                 "video_path": video_path,
+                "final_render": final_render,
+                "narration": session_logs["stages"].get("narration"),
                 "logs": session_logs,
                 "error": None
             }
@@ -187,10 +322,21 @@ class Orchestrator:
             session_logs["duration_seconds"] = duration
             session_logs["success"] = False
             session_logs["error"] = error_msg
+            root_span.set_status("ERROR", error_msg[:200])
+            session_logs["stage_timings"] = graph.timings()
+            session_logs["critical_path"] = graph.critical_path()
+            session_logs["token_summary"] = summarize_token_usage(session_logs["token_usage"])
+            self._report_deadline(run_deadline, graph, session_logs)
+            session_logs["call_budget"] = call_budget.report()
+            calls = session_logs["call_budget"]
+            if calls["exhausted"]:
+                retries = {layer: stats["retries"] for layer, stats in calls["layers"].items() if stats["retries"]}
+                print(f"🔁 Call budget exhausted ({calls['llm_calls']} LLM calls, {calls['renders']} renders), "
+                      f"retries by layer: {retries}")
             
             # Save error log
             if save_logs:
-                save_json_log(session_logs, self.logs_dir, "session_error")
+                save_json_log(session_logs, self.logs_dir, "session_error" + log_suffix)
             
             print("\n" + "="*60)
             print("❌ PIPELINE FAILED")
@@ -206,3 +352,255 @@ class Orchestrator:
                 "error": error_msg,
                 "logs": session_logs
             }
+        
+        finally:
+            run_lock.release()
+            routing_decisions.reset(routing_token)
+            token_usage.reset(usage_token)
+            current_deadline.reset(deadline_token)
+            current_call_budget.reset(budget_token)
+            root_span.end()
+    
+    def _cache_result(self, user_prompt: str, config_key: str, code_path, video_path: Optional[str],
+                      narration: Optional[Dict[str, Any]]):
+        """Store a finished run in the result cache (failures are logged, not raised)"""
+        try:
+            self.result_cache.put(user_prompt, config_key, str(code_path), video_path, narration)
+        except Exception as e:
+            print(f"⚠️  Could not cache result: {str(e)}")
+    
+    def _report_deadline(self, run_deadline: Optional[Deadline], graph: StageGraph, session_logs: Dict[str, Any]):
+        """Record how the run's time budget was spent (and which stages used it up)"""
+        if run_deadline is None:
+            return
+        exceeded = run_deadline.expired() or run_deadline.exceeded_in is not None
+        exhausted_by = []
+        if exceeded:
+            # Stages that were running when the budget ran out
+            for name, record in graph.records.items():
+                if record.get("start") is None or record["start"] > run_deadline.expires_at:
+                    continue
+                if record.get("end") is None or record["end"] >= run_deadline.expires_at:
+                    exhausted_by.append(name)
+        session_logs["deadline"] = {
+            "budget_seconds": run_deadline.seconds,
+            "remaining_seconds": round(run_deadline.remaining(), 3),
+            "exceeded": exceeded,
+            "exceeded_during": run_deadline.exceeded_in,
+            "exhausted_by": exhausted_by
+        }
+        if exceeded:
+            print(f"⏳ Deadline of {run_deadline.seconds:g}s used up during "
+                  f"{', '.join(exhausted_by) or run_deadline.exceeded_in or 'the run'}")
+    
+    def _cached_result(self, user_prompt: str, cached: Dict[str, Any], start_time: datetime, save_logs: bool,
+                       job_id: Optional[str], log_suffix: str,
+                       on_event: Optional[Callable[[Dict[str, Any]], None]]) -> Dict[str, Any]:
+        """Answer a run from the result cache (no LLM calls, no render)"""
+        end_time = datetime.now()
+        duration = (end_time - start_time).total_seconds()
+        session_logs = {
+            "job_id": job_id,
+            "user_prompt": user_prompt,
+            "start_time": start_time.isoformat(),
+            "end_time": end_time.isoformat(),
+            "duration_seconds": duration,
+            "stages": {"narration": cached["narration"]} if cached["narration"] else {},
+            "result_cache": {
+                "match": cached["match"],
+                "similarity": cached["similarity"],
+                "cached_prompt": cached["prompt"]
+            },
+            "model_routing": [],
+            "token_usage": [],
+            "token_summary": summarize_token_usage([]),
+            "success": True,
+            "video_path": cached["video_path"]
+        }
+        if on_event is not None:
+            on_event({"stage": "result_cache", "status": "hit", "match": cached["match"]})
+        if save_logs:
+            save_json_log(session_logs, self.logs_dir, "session" + log_suffix)
+        
+        print("\n" + "="*60)
+        print("⚡ RESULT CACHE HIT")
+        print("="*60)
+        match = "normalized match" if cached["match"] == "exact" else f"similarity {cached['similarity']:.2f}"
+        print(f"♻️  Reusing result of '{cached['prompt']}' ({match})")
+        print(f"📄 Code: {cached['code_path']}")
+        if cached["video_path"]:
+            print(f"📹 Video: {cached['video_path']}")
+        print("="*60)
+        
+        return {
+            "success": True,
+            "code_path": cached["code_path"],
+            "video_path": cached["video_path"],
+            "narration": cached["narration"],
+            "logs": session_logs,
+            "error": None
+        }
+    
+    def _restore(self, run_key: str, session_logs: Dict[str, Any], execute: bool) -> Dict[str, Any]:
+        """
+        Load checkpointed outputs to resume from.
+        
+        A render result is only reused if it succeeded; otherwise rendering
+        restarts from the last Fixer-patched code.
+        """
+        restored = self.checkpoints.load(run_key)
+        execution_result = restored.get("execution_result")
+        if not execute or not (execution_result and execution_result.get("success")):
+            restored.pop("execution_result", None)
+        
+        # An output is only valid if everything it was derived from is restored too
+        upstream = {
+            "scene_manifest": ["reasoning"],
+            "manim_code": ["scene_manifest"],
+            "narration": ["scene_manifest"],
+            "patched_code": ["manim_code"],
+            "execution_result": ["manim_code"]
+        }
+        for name in ("scene_manifest", "manim_code", "narration", "patched_code", "execution_result"):
+            if name in restored and not all(parent in restored for parent in upstream[name]):
+                del restored[name]
+        
+        if not restored:
+            print(f"♻️  No checkpoints for run {run_key}, starting from the beginning")
+            return {}
+        
+        print(f"♻️  Resuming run {run_key} (restored: {', '.join(sorted(restored))})")
+        stages = session_logs["stages"]
+        if "reasoning" in restored:
+            stages["reasoning"] = restored["reasoning"]
+        if "scene_manifest" in restored:
+            stages["scene_manifest"] = restored["scene_manifest"]
+        if "manim_code" in restored:
+            stages["code_length"] = len(restored["manim_code"])
+        if "narration" in restored:
+            stages["narration"] = restored["narration"]
+        session_logs["resumed_from"] = sorted(restored)
+        return restored
+    
+    def _build_graph(self, session_logs: Dict[str, Any], save_logs: bool, execute: bool,
+                     job_id: Optional[str], log_suffix: str, run_key: str,
+                     restored: Dict[str, Any]) -> StageGraph:
+        """
+        Register the pipeline stages for one run.
+        
+        logician → director → {engineer, narrator} → render; the narrator only
+        needs the manifest and reasoning, so it overlaps code generation and
+        rendering. The Fixer runs inside the render stage's retry loop.
+        Each stage checkpoints its output under run_key.
+        """
+        graph = StageGraph(max_workers=4)
+        
+        def banner(title: str):
+            print("\n" + "="*60)
+            print(f"📍 {title}")
+            print("="*60)
+        
+        def logician(user_prompt):
+            banner("PHASE 1: Mathematical Reasoning")
+            reasoning = self.logician.process(user_prompt)
+            check_cancelled("logician stage")
+            session_logs["stages"]["reasoning"] = reasoning
+            if save_logs:
+                save_json_log(reasoning, self.logs_dir, "logician" + log_suffix)
+            self.checkpoints.save(run_key, "reasoning", reasoning)
+            return reasoning
+        
+        def director(reasoning):
+            banner("PHASE 2: Scene Planning")
+            scene_manifest = self.director.process(reasoning)
+            check_cancelled("director stage")
+            session_logs["stages"]["scene_manifest"] = scene_manifest
+            if save_logs:
+                save_json_log(scene_manifest, self.logs_dir, "director" + log_suffix)
+            self.checkpoints.save(run_key, "scene_manifest", scene_manifest)
+            return scene_manifest
+        
+        # Speculative mode: extra Engineer candidates raced in the render stage
+        speculative = execute and self.speculative_candidates > 1
+        candidates = []
+        
+        def engineer(scene_manifest):
+            banner("PHASE 3: Code Generation")
+            if speculative:
+                candidates.extend(self.engineer.generate_candidates(scene_manifest, k=self.speculative_candidates))
+                manim_code = candidates[0]
+            else:
+                manim_code = self.engineer.process(scene_manifest)
+            check_cancelled("engineer stage")
+            session_logs["stages"]["code_length"] = len(manim_code)
+            self.checkpoints.save(run_key, "manim_code", manim_code)
+            return manim_code
+        
+        def save_generated_code(manim_code):
+            return save_code(manim_code, self.outputs_dir, f"scene{log_suffix}.py")
+        
+        def narrator(scene_manifest, reasoning):
+            banner("PHASE 3b: Narration (parallel)")
+            try:
+                narration = self.narrator.process(scene_manifest, reasoning)
+            except Exception as e:
+                check_cancelled("narrator stage")
+                session_logs["stages"]["narration_error"] = str(e)
+                raise
+            check_cancelled("narrator stage")
+            session_logs["stages"]["narration"] = narration
+            if save_logs:
+                save_json_log(narration, self.logs_dir, "narrator" + log_suffix)
+            self.checkpoints.save(run_key, "narration", narration)
+            return narration
+        
+        def render(manim_code, code_path=None):
+            banner("PHASE 4: Manim Execution")
+            # Pick up where the Fixer left off in an earlier run
+            if restored.get("patched_code"):
+                print("♻️  Resuming from the last Fixer-patched code")
+                manim_code = restored["patched_code"]
+            
+            def on_patch(patched):
+                check_cancelled("render stage")
+                self.checkpoints.save(run_key, "patched_code", patched)
+            
+            if len(candidates) > 1 and not restored.get("patched_code"):
+                # Race the candidates' renders; the first success wins
+                execution_result = self.retry_manager.execute_speculative(candidates, job_id=job_id, on_patch=on_patch)
+                check_cancelled("render stage")
+                session_logs["stages"]["speculation"] = execution_result["speculation"]
+                winning_code = execution_result.get("code")
+                if winning_code and winning_code != manim_code:
+                    # The saved scene should be the script that actually rendered
+                    save_code(winning_code, self.outputs_dir, Path(code_path).name)
+                    on_patch(winning_code)
+            else:
+                # Execute the generated Manim code with auto-retry on errors
+                execution_result = self.retry_manager.execute_with_retry(manim_code, job_id=job_id, on_patch=on_patch)
+            check_cancelled("render stage")
+            if execution_result["success"]:
+                self.checkpoints.save(run_key, "execution_result", {
+                    "success": True,
+                    "video_path": execution_result.get("video_path"),
+                    "attempts": execution_result.get("attempts")
+                })
+            return execution_result
+        
+        graph.add_stage("logician", logician, inputs=["user_prompt"], output="reasoning",
+                        **self.stage_policies.get("logician", {}))
+        graph.add_stage("director", director, inputs=["reasoning"], output="scene_manifest",
+                        **self.stage_policies.get("director", {}))
+        graph.add_stage("engineer", engineer, inputs=["scene_manifest"], output="manim_code",
+                        **self.stage_policies.get("engineer", {}))
+        graph.add_stage("save_code", save_generated_code, inputs=["manim_code"], output="code_path")
+        if self.narrator:
+            graph.add_stage("narrator", narrator, inputs=["scene_manifest", "reasoning"], output="narration",
+                            **self.stage_policies.get("narrator", {}))
+        if execute:
+            # In speculative mode the winner overwrites the saved script, so save it first
+            graph.add_stage("render", render,
+                            inputs=["manim_code", "code_path"] if speculative else ["manim_code"],
+                            output="execution_result",
+                            **self.stage_policies.get("render", {}))
+        return graph
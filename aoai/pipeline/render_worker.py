@@ -0,0 +1,415 @@
+"""
+Render Worker
+Fork-server that imports Manim once and forks a child per render, skipping interpreter startup
+"""
+import argparse
+import json
+import os
+import queue
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+class RenderWorkerError(Exception):
+    """Raised when a warm render worker cannot start or dies"""
+
+
+class WarmRender:
+    """
+    Handle of one render running in a worker's forked child.
+    
+    Mirrors the parts of subprocess.Popen the sandbox uses (communicate,
+    kill, returncode), so warm and cold renders share one polling loop.
+    """
+    
+    def __init__(self, worker: "RenderWorker", pid: int, stdout_path: Path, stderr_path: Path):
+        self.worker = worker
+        self.pid = pid
+        self.stdout_path = stdout_path
+        self.stderr_path = stderr_path
+        self.returncode: Optional[int] = None
+    
+    def communicate(self, timeout: Optional[float] = None) -> Tuple[str, str]:
+        """
+        Wait for the render to finish.
+        
+        Raises:
+            subprocess.TimeoutExpired: Still running after `timeout` seconds
+        """
+        if self.returncode is None:
+            try:
+                message = self.worker.read_message(timeout)
+            except queue.Empty:
+                raise subprocess.TimeoutExpired(["manim"], timeout)
+            if message is None:
+                self.returncode = -4
+                self.worker.pool.discard(self.worker)
+                return "", "Render worker exited during the render"
+            self.returncode = message["exit_code"]
+            self.worker.pool.release(self.worker)
+        return self._read(self.stdout_path), self._read(self.stderr_path)
+    
+    def kill(self):
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    
+    @staticmethod
+    def _read(path: Path) -> str:
+        try:
+            return path.read_text(encoding='utf-8', errors='replace')
+        except OSError:
+            return ""
+
+
+class RenderWorker:
+    """One warm fork-server process (see serve())"""
+    
+    STARTUP_TIMEOUT = 120  # Seconds allowed for importing Manim
+    
+    def __init__(self, pool: "RenderWorkerPool"):
+        self.pool = pool
+        self.process = subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve()), "--serve"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+            cwd=str(pool.cwd)
+        )
+        # The reader thread turns the server's stdout into messages that can be awaited with a timeout
+        self._messages: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        threading.Thread(target=self._read_loop, name="render-worker-reader", daemon=True).start()
+        
+        try:
+            ready = self.read_message(self.STARTUP_TIMEOUT)
+        except queue.Empty:
+            ready = None
+        if not ready or ready.get("event") != "ready":
+            self.close()
+            reason = (ready or {}).get("message", "no response")
+            raise RenderWorkerError(f"Render worker failed to start: {reason}")
+    
+    def _read_loop(self):
+        for line in self.process.stdout:
+            try:
+                self._messages.put(json.loads(line))
+            except ValueError:
+                continue
+        self._messages.put(None)  # Server exited
+    
+    def read_message(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Next message from the server (None = server exited); raises queue.Empty on timeout"""
+        return self._messages.get(timeout=timeout)
+    
+    def alive(self) -> bool:
+        return self.process.poll() is None
+    
+    def start(self, argv: List[str], cwd: Path, mode: str = "render") -> WarmRender:
+        """
+        Fork a child that runs the Manim CLI (or a smoke run) in-process with `argv`.
+        
+        Args:
+            argv: Manim CLI arguments without the leading 'manim'
+                  (mode 'smoke': smoke_runner.smoke_main() arguments)
+            cwd: Render workspace; receives the child's stdout/stderr files
+            mode: 'render' or 'smoke'
+        
+        Returns:
+            WarmRender handle
+        """
+        stdout_path = cwd / "worker_stdout.txt"
+        stderr_path = cwd / "worker_stderr.txt"
+        request = {"mode": mode, "argv": argv, "cwd": str(cwd), "stdout": str(stdout_path), "stderr": str(stderr_path)}
+        try:
+            self.process.stdin.write(json.dumps(request) + "\n")
+            self.process.stdin.flush()
+        except OSError as e:
+            raise RenderWorkerError(f"Render worker is gone: {str(e)}")
+        try:
+            message = self.read_message(self.STARTUP_TIMEOUT)
+        except queue.Empty:
+            message = None
+        if not message or message.get("event") != "started":
+            raise RenderWorkerError("Render worker did not start the render")
+        with self.pool._lock:
+            self.pool.stats["warm_renders"] += 1
+        return WarmRender(self, message["pid"], stdout_path, stderr_path)
+    
+    def close(self):
+        if self.alive():
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+
+
+class RenderWorkerPool:
+    """
+    Warm render workers, one per render slot.
+    
+    Workers are started in the background at creation so the Manim import
+    overlaps the LLM stages. When workers cannot run (no fork(), Manim not
+    importable in this interpreter) the pool reports itself unavailable
+    and the sandbox keeps using the manim CLI.
+    """
+    
+    def __init__(self, size: int, cwd: Path):
+        """
+        Args:
+            size: Workers to keep warm (the sandbox's render slots)
+            cwd: Working directory of the servers
+        """
+        self.size = max(1, size)
+        self.cwd = Path(cwd)
+        self.available = hasattr(os, "fork")
+        self._idle: "queue.Queue[RenderWorker]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = 0
+        self.stats = {"warm_renders": 0, "worker_starts": 0, "worker_failures": 0}
+        
+        if self.available:
+            for _ in range(self.size):
+                self._start_in_background()
+    
+    def _spawn(self) -> Optional[RenderWorker]:
+        with self._lock:
+            if not self.available or self._workers >= self.size:
+                return None
+            self._workers += 1
+        try:
+            worker = RenderWorker(self)
+        except (RenderWorkerError, OSError) as e:
+            with self._lock:
+                self._workers -= 1
+                self.available = False
+                self.stats["worker_failures"] += 1
+            print(f"⚠️  Warm render workers disabled: {str(e)}")
+            return None
+        with self._lock:
+            self.stats["worker_starts"] += 1
+        return worker
+    
+    def _warm_up(self):
+        worker = self._spawn()
+        if worker is not None:
+            self._idle.put(worker)
+    
+    def _start_in_background(self):
+        threading.Thread(target=self._warm_up, name="render-worker-start", daemon=True).start()
+    
+    def acquire(self, timeout: float = 0) -> Optional[RenderWorker]:
+        """
+        An idle live worker, or None (pool unavailable / none ready in time).
+        
+        The caller holds a render slot, so a worker frees up soon whenever
+        all of them are busy. Dead workers are replaced in the background;
+        a render that finds none ready falls back to the CLI rather than
+        waiting for a cold start.
+        """
+        deadline = time.monotonic() + timeout
+        while self.available:
+            try:
+                worker = self._idle.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                return None
+            if worker.alive():
+                return worker
+            self.discard(worker)
+        return None
+    
+    def wait_ready(self, timeout: float) -> bool:
+        """Wait until a worker has finished starting (False if the pool is unavailable)"""
+        worker = self.acquire(timeout)
+        if worker is None:
+            return False
+        self.release(worker)
+        return True
+    
+    def release(self, worker: RenderWorker):
+        if worker.alive():
+            self._idle.put(worker)
+        else:
+            self.discard(worker)
+    
+    def discard(self, worker: RenderWorker):
+        """Close a dead or broken worker and start its replacement in the background"""
+        worker.close()
+        with self._lock:
+            self._workers -= 1
+        if self.available:
+            self._start_in_background()
+    
+    def close(self):
+        """Stop idle workers"""
+        self.available = False
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+# ========================================
+# Server side (runs in the worker process)
+# ========================================
+
+def _run_child(request: Dict[str, Any], entry_point):
+    """Forked child: run the manim CLI (or a smoke run) in-process, then exit with its exit code"""
+    exit_code = 1
+    try:
+        os.chdir(request["cwd"])
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.dup2(os.open(request["stdout"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644), 1)
+        os.dup2(os.open(request["stderr"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644), 2)
+        sys.stdin = open(os.devnull)
+        sys.stdout = os.fdopen(1, "w", buffering=1)
+        sys.stderr = os.fdopen(2, "w", buffering=1)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        try:
+            entry_point(request["argv"])
+            exit_code = 0
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+            exit_code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(exit_code)
+
+
+def serve():
+    """
+    Worker process main loop.
+    
+    Imports Manim (and with it numpy, cairo, ...) once, then for each JSON
+    request on stdin forks a child that runs the Manim CLI in-process
+    (or, for mode 'smoke', smoke_runner.smoke_main()).
+    Replies on stdout: {"event": "ready"} after the imports, then per
+    request {"event": "started", "pid"} and {"event": "finished", "exit_code"}.
+    """
+    def send(message: Dict[str, Any]):
+        sys.stdout.write(json.dumps(message) + "\n")
+        sys.stdout.flush()
+    
+    try:
+        import manim  # noqa: F401  (the warm part)
+        from manim.__main__ import main as manim_main
+        from pipeline.smoke_runner import smoke_main
+    except Exception as e:
+        send({"event": "error", "message": f"Cannot import manim: {str(e)}"})
+        sys.exit(1)
+    
+    send({"event": "ready", "pid": os.getpid()})
+    for line in sys.stdin:
+        try:
+            request = json.loads(line)
+        except ValueError:
+            continue
+        pid = os.fork()
+        if pid == 0:
+            if request.get("mode") == "smoke":
+                _run_child(request, smoke_main)
+            else:
+                _run_child(request, lambda argv: manim_main(args=argv, prog_name="manim"))
+        send({"event": "started", "pid": pid})
+        _, status = os.waitpid(pid, 0)
+        send({"event": "finished", "exit_code": os.waitstatus_to_exitcode(status)})
+
+
+# ========================================
+# Benchmark
+# ========================================
+
+BENCHMARK_SCENE = '''from manim import *
+
+class GeneratedScene(Scene):
+    def construct(self):
+        circle = Circle()
+        self.play(Create(circle), run_time=0.5)
+'''
+
+
+def benchmark(storage_path: Path, runs: int = 3) -> Dict[str, Any]:
+    """
+    Compare cold (manim CLI) and warm (forked worker) render latency.
+    
+    Args:
+        storage_path: Scratch storage root for the sandboxes
+        runs: Renders per mode
+    
+    Returns:
+        {"runs", "cold_seconds", "warm_seconds", "cold_median", "warm_median", "speedup"}
+    """
+    from pipeline.execution_sandbox import ExecutionSandbox
+    
+    timings = {}
+    for mode, warm in (("cold", False), ("warm", True)):
+        sandbox = ExecutionSandbox(str(storage_path / mode), max_concurrent_renders=1, warm_workers=warm)
+        if warm and not sandbox.render_workers.wait_ready(RenderWorker.STARTUP_TIMEOUT):
+            raise RenderWorkerError("Warm render workers are not available here")
+        seconds = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = sandbox.run(BENCHMARK_SCENE, "GeneratedScene")
+            seconds.append(round(time.perf_counter() - start, 3))
+            if not result["success"]:
+                raise RenderWorkerError(f"Benchmark render failed ({mode}): {result['stderr'][-300:]}")
+        sandbox.shutdown()
+        timings[mode] = seconds
+    
+    cold_median = round(statistics.median(timings["cold"]), 3)
+    warm_median = round(statistics.median(timings["warm"]), 3)
+    return {
+        "runs": runs,
+        "cold_seconds": timings["cold"],
+        "warm_seconds": timings["warm"],
+        "cold_median": cold_median,
+        "warm_median": warm_median,
+        "speedup": round(cold_median / warm_median, 2) if warm_median else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm Manim render worker")
+    parser.add_argument("--serve", action="store_true", help="Run as a worker process (used by the sandbox)")
+    parser.add_argument("--benchmark", action="store_true", help="Compare cold vs warm render latency")
+    parser.add_argument("--runs", type=int, default=3, help="Renders per mode for --benchmark (default: 3)")
+    args = parser.parse_args()
+    
+    if args.serve:
+        serve()
+    elif args.benchmark:
+        storage = Path(__file__).parent.parent / "storage" / "benchmark"
+        report = benchmark(storage, args.runs)
+        print("\n" + "="*60)
+        print("⏱️  RENDER LATENCY (cold manim CLI vs warm worker)")
+        print("="*60)
+        print(f"   Cold: median {report['cold_median']:.2f}s  {report['cold_seconds']}")
+        print(f"   Warm: median {report['warm_median']:.2f}s  {report['warm_seconds']}")
+        print(f"   Speedup: {report['speedup']}x")
+        print("="*60)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+"""
+Result Cache
+Whole-pipeline cache of rendered results keyed on normalized prompts (SQLite under storage/result_cache)
+"""
+import hashlib
+import json
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+
+# Words that phrase a request rather than name its subject
+STOP_WORDS = {
+    "a", "an", "the", "of", "to", "in", "on", "for", "and", "with", "using", "by", "about",
+    "me", "us", "please", "can", "you",
+    "what", "whats", "is", "are", "how", "does", "do", "why", "explain", "show", "visualize",
+    "visualise", "animate", "animation", "illustrate", "describe", "demonstrate", "concept"
+}
+PUNCTUATION = set("?.,!;:'\"`")
+
+
+def _stem(word: str) -> str:
+    """Light suffix stripping (derivatives/derivative, rotating/rotate share a stem)"""
+    for suffix, replacement in (("ies", "y"), ("sses", "ss"), ("ing", ""), ("ed", ""), ("s", "")):
+        if word.endswith(suffix) and not word.endswith("ss") and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)] + replacement
+            break
+    if word.endswith("e") and len(word) > 4:
+        word = word[:-1]
+    return word
+
+
+def normalize_prompt(prompt: str) -> List[str]:
+    """
+    Reduce a prompt to its content tokens.
+    
+    Lowercases, drops punctuation and request phrasing ("explain", "what is"),
+    and stems words. Numbers and math symbols are kept verbatim so that
+    "x^2" and "x^3" stay different.
+    
+    Args:
+        prompt: User's natural language input
+    
+    Returns:
+        Normalized tokens in prompt order
+    """
+    tokens = re.findall(r"[a-z]+|[0-9]+(?:\.[0-9]+)?|[^\sa-z0-9]", prompt.lower())
+    normalized = []
+    for token in tokens:
+        if token in PUNCTUATION or token in STOP_WORDS:
+            continue
+        normalized.append(_stem(token) if token.isalpha() else token)
+    return normalized
+
+
+def _shingles(tokens: List[str]) -> set:
+    """Word set (prompts are short, so word order is ignored)"""
+    return set(tokens)
+
+
+def _exact_tokens(tokens: List[str]) -> List[str]:
+    """Numbers and symbols, which must match exactly even for near-duplicates"""
+    return sorted(token for token in tokens if not token.isalpha())
+
+
+def minhash_signature(tokens: List[str], num_perm: int = 64) -> List[int]:
+    """
+    MinHash signature of a token list's shingles.
+    
+    Uses salted BLAKE2b rather than hash() so signatures are stable across processes.
+    
+    Args:
+        tokens: Output of normalize_prompt()
+        num_perm: Signature length (more = finer similarity estimates)
+    
+    Returns:
+        num_perm minimum hash values
+    """
+    shingles = _shingles(tokens) or {""}
+    signature = []
+    for seed in range(num_perm):
+        salt = seed.to_bytes(8, "little")
+        signature.append(min(
+            int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8, salt=salt).digest(), "little")
+            for shingle in shingles
+        ))
+    return signature
+
+
+def estimate_similarity(a: List[int], b: List[int]) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures"""
+    if not a or len(a) != len(b):
+        return 0.0
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+class ResultCache:
+    """Persistent LRU cache of successful pipeline results with copied artifacts"""
+    
+    DB_FILENAME = "results.sqlite"
+    DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 2 GB of cached scripts and videos
+    NUM_PERM = 64
+    
+    def __init__(self, cache_dir: Path, max_bytes: int = DEFAULT_MAX_BYTES,
+                 similarity_threshold: Optional[float] = None):
+        """
+        Args:
+            cache_dir: Directory holding the SQLite database and artifact copies
+            max_bytes: Disk cap for artifacts; least recently used entries are evicted above it
+            similarity_threshold: Enable MinHash near-duplicate matching at this estimated
+                                  Jaccard similarity (None = normalized exact matches only)
+        """
+        self.cache_dir = Path(cache_dir)
+        self.artifacts_dir = self.cache_dir / "artifacts"
+        self.artifacts_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.cache_dir / self.DB_FILENAME
+        
+        self.max_bytes = max_bytes
+        self.similarity_threshold = similarity_threshold
+        
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        # Shared by concurrent batch/serve jobs, so serialize access to the connection
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                config_key TEXT NOT NULL,
+                normalized TEXT NOT NULL,
+                exact_tokens TEXT NOT NULL,
+                signature TEXT NOT NULL,
+                prompt TEXT NOT NULL,
+                has_video INTEGER NOT NULL,
+                code_path TEXT NOT NULL,
+                video_path TEXT,
+                narration TEXT,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_config ON results(config_key)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_last_access ON results(last_access)")
+        self._conn.commit()
+        
+        print(f"✓ Result Cache initialized ({self.db_path})")
+        if similarity_threshold is not None:
+            print(f"   Near-duplicate matching at similarity ≥ {similarity_threshold:.2f}")
+    
+    @staticmethod
+    def make_key(normalized: List[str], config_key: str, with_video: bool) -> str:
+        payload = json.dumps({"prompt": normalized, "config": config_key, "video": with_video})
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+    
+    def get(self, prompt: str, config_key: str, with_video: bool) -> Optional[Dict[str, Any]]:
+        """
+        Look up a previous result for this prompt under this pipeline configuration.
+        
+        Args:
+            prompt: User's natural language input
+            config_key: Hash of the settings that shape results (models, templates)
+            with_video: Only accept entries that include a rendered video
+        
+        Returns:
+            {"code_path", "video_path", "narration", "prompt", "match", "similarity"} or None
+        """
+        normalized = normalize_prompt(prompt)
+        # A rendered entry also satisfies a code-only request
+        keys = [self.make_key(normalized, config_key, True)]
+        if not with_video:
+            keys.append(self.make_key(normalized, config_key, False))
+        now = time.time()
+        
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT * FROM results WHERE key IN ({', '.join('?' * len(keys))}) ORDER BY has_video DESC",
+                keys
+            ).fetchone()
+            match, similarity = "exact", 1.0
+            
+            if row is None and self.similarity_threshold is not None:
+                row, similarity = self._nearest_locked(normalized, config_key, with_video)
+                match = "near"
+            
+            if row is None:
+                self.misses += 1
+                return None
+            
+            entry = self._row_to_entry(row)
+            if not self._artifacts_exist(entry):
+                # Artifacts were removed behind our back; treat as a miss
+                self._delete_locked(entry["key"])
+                self._conn.commit()
+                self.misses += 1
+                return None
+            
+            self._conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (now, entry["key"]))
+            self._conn.commit()
+            if match == "exact":
+                self.hits += 1
+            else:
+                self.near_hits += 1
+        
+        return {
+            "code_path": entry["code_path"],
+            "video_path": entry["video_path"],
+            "narration": entry["narration"],
+            "prompt": entry["prompt"],
+            "match": match,
+            "similarity": round(similarity, 3)
+        }
+    
+    def _nearest_locked(self, normalized: List[str], config_key: str,
+                        with_video: bool) -> Tuple[Optional[tuple], float]:
+        """Best MinHash match above the threshold (linear scan; lock must be held)"""
+        signature = minhash_signature(normalized, self.NUM_PERM)
+        exact_tokens = json.dumps(_exact_tokens(normalized))
+        rows = self._conn.execute(
+            "SELECT * FROM results WHERE config_key = ? AND exact_tokens = ? AND has_video >= ?",
+            (config_key, exact_tokens, int(with_video))
+        ).fetchall()
+        
+        best, best_similarity = None, 0.0
+        for row in rows:
+            similarity = estimate_similarity(signature, json.loads(row[4]))
+            if similarity > best_similarity:
+                best, best_similarity = row, similarity
+        if best is None or best_similarity < self.similarity_threshold:
+            return None, 0.0
+        return best, best_similarity
+    
+    def put(self, prompt: str, config_key: str, code_path: str, video_path: Optional[str] = None,
+            narration: Optional[Dict[str, Any]] = None):
+        """
+        Store a successful result, copying its artifacts into the cache.
+        
+        Args:
+            prompt: User's natural language input
+            config_key: Hash of the settings that shape results
+            code_path: Generated script
+            video_path: Rendered video (None if the run did not render)
+            narration: Narrator output, if any
+        """
+        normalized = normalize_prompt(prompt)
+        with_video = bool(video_path)
+        key = self.make_key(normalized, config_key, with_video)
+        
+        entry_dir = self.artifacts_dir / key
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        cached_code = entry_dir / Path(code_path).name
+        shutil.copy2(code_path, cached_code)
+        cached_video = None
+        if video_path:
+            cached_video = entry_dir / Path(video_path).name
+            shutil.copy2(video_path, cached_video)
+        size = sum(path.stat().st_size for path in entry_dir.iterdir() if path.is_file())
+        
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results "
+                "(key, config_key, normalized, exact_tokens, signature, prompt, has_video, "
+                "code_path, video_path, narration, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key, config_key, " ".join(normalized), json.dumps(_exact_tokens(normalized)),
+                    json.dumps(minhash_signature(normalized, self.NUM_PERM)), prompt, int(with_video),
+                    str(cached_code), str(cached_video) if cached_video else None,
+                    json.dumps(narration, ensure_ascii=False) if narration is not None else None,
+                    size, now, now
+                )
+            )
+            self._evict_locked()
+            self._conn.commit()
+    
+    def _evict_locked(self):
+        """Drop least recently used entries until artifacts fit in max_bytes (lock must be held)"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        
+        rows = self._conn.execute("SELECT key, size FROM results ORDER BY last_access ASC").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._delete_locked(key)
+            total -= size
+            self.evictions += 1
+    
+    def _delete_locked(self, key: str):
+        self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+        shutil.rmtree(self.artifacts_dir / key, ignore_errors=True)
+    
+    @staticmethod
+    def _row_to_entry(row: tuple) -> Dict[str, Any]:
+        return {
+            "key": row[0],
+            "prompt": row[5],
+            "code_path": row[7],
+            "video_path": row[8],
+            "narration": json.loads(row[9]) if row[9] else None
+        }
+    
+    @staticmethod
+    def _artifacts_exist(entry: Dict[str, Any]) -> bool:
+        paths = [entry["code_path"]] + ([entry["video_path"]] if entry["video_path"] else [])
+        return all(Path(path).is_file() for path in paths)
+    
+    def invalidate(self, prompt: str) -> int:
+        """
+        Remove every cached result for a prompt (all configurations, with or without video).
+        
+        Args:
+            prompt: User's natural language input (normalized before matching)
+        
+        Returns:
+            Number of entries removed
+        """
+        normalized = " ".join(normalize_prompt(prompt))
+        with self._lock:
+            keys = [row[0] for row in self._conn.execute(
+                "SELECT key FROM results WHERE normalized = ?", (normalized,)
+            ).fetchall()]
+            for key in keys:
+                self._delete_locked(key)
+            self._conn.commit()
+        print(f"🧹 Invalidated {len(keys)} cached result(s) for '{prompt}'")
+        return len(keys)
+    
+    def clear(self):
+        """Remove all cached results and their artifacts"""
+        with self._lock:
+            keys = [row[0] for row in self._conn.execute("SELECT key FROM results").fetchall()]
+            for key in keys:
+                self._delete_locked(key)
+            self._conn.commit()
+        print("🧹 Cleared pipeline result cache")
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return cache counters for this process plus on-disk totals.
+        
+        Returns:
+            {"hits", "near_hits", "misses", "evictions", "hit_rate", "entries", "bytes"}
+        """
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+            ).fetchone()
+        
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": total
+        }
@@ -2,29 +2,218 @@
 Retry Manager
 Handles error correction loops with Agent D (Fixer)
 """
-from typing import Dict, Any, Callable
+import contextvars
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Any, Callable, Optional, List
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.tracing import start_span
+from utils.deadline import Cancelled, can_afford, current_deadline
+from utils.call_budget import CallBudgetExhausted, charge_renders, record_attempt, remaining_renders
+from utils.preflight import preflight_check, format_diagnostics
+from pipeline.smoke_runner import SCRIPT_ERROR
 
 
 class RetryManager:
     """Manages retry attempts when Manim execution fails"""
     
     MAX_RETRIES = 3
-    
-    def __init__(self, fixer_agent, sandbox):
+
+    def __init__(self, fixer_agent, sandbox, manim_index: Optional[Dict[str, Any]] = None,
+                 smoke_runner=None, final_quality: str = "medium", validation_quality: Optional[str] = "low",
+                 background_final: bool = False):
+        """
+        Args:
+            fixer_agent: FixerAgent that patches failed scripts
+            sandbox: ExecutionSandbox that renders them
+            manim_index: Symbol index (utils.manim_index) for static preflight checks (None = off)
+            smoke_runner: SmokeRunner that executes construct() without frames before a render (None = off)
+            final_quality: Quality of the delivered video (ExecutionSandbox.QUALITIES key)
+            validation_quality: Quality of the renders that find out whether a script works;
+                                a passing script is then re-rendered at final_quality
+                                (None or equal to final_quality = render once, at final_quality)
+            background_final: Return the validation render as a preview and run the final
+                              render in the background (see wait_for_final_renders)
+        """
         self.fixer = fixer_agent
         self.sandbox = sandbox
-        print(f"✓ Retry Manager initialized (max retries: {self.MAX_RETRIES})")
-    
-    def execute_with_retry(self, initial_code: str, scene_name: str = "GeneratedScene") -> Dict[str, Any]:
+        self.manim_index = manim_index
+        self.smoke_runner = smoke_runner
+        self.final_quality = final_quality
+        self.validation_quality = validation_quality or final_quality
+        self.progressive = self.validation_quality != final_quality
+        self.background_final = background_final and self.progressive
+        self._final_threads: List[threading.Thread] = []
+        self._final_listeners: Dict[int, List[Callable[[Dict[str, Any]], None]]] = {}  # id(final) -> callbacks
+        self._final_threads_lock = threading.Lock()
+        checks = [name for name, enabled in (("preflight", manim_index), ("smoke", smoke_runner)) if enabled is not None]
+        quality = (f"{self.validation_quality} → {final_quality}{' (background)' if self.background_final else ''}"
+                   if self.progressive else final_quality)
+        print(f"✓ Retry Manager initialized (max retries: {self.MAX_RETRIES}, "
+              f"checks: {', '.join(checks) or 'none'}, quality: {quality})")
+
+    def _preflight(self, code: str) -> Optional[Dict[str, Any]]:
+        """Static check of a script; returns a failed execution result (exit code -7) or None if it passes"""
+        if self.manim_index is None:
+            return None
+        with start_span("preflight.check", aoai__code_lines=len(code.splitlines())) as span:
+            start = time.perf_counter()
+            diagnostics = preflight_check(code, self.manim_index)
+            span.set_attribute("aoai.diagnostics", len(diagnostics))
+        if not diagnostics:
+            return None
+        error_log = format_diagnostics(diagnostics, self.manim_index.get("manim_version"))
+        print(f"\n🔍 Preflight found {len(diagnostics)} problem(s) in {(time.perf_counter() - start) * 1000:.0f}ms")
+        for diagnostic in diagnostics[:5]:
+            print(f"   line {diagnostic['line']}: {diagnostic['message']}")
+        return {
+            "success": False,
+            "video_path": None,
+            "stdout": "",
+            "stderr": error_log,
+            "exit_code": -7,
+            "preflight": diagnostics
+        }
+
+    def _smoke(self, code: str, scene_name: str, job_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Run construct() without frames; returns the failed result if the script raised, else None"""
+        if self.smoke_runner is None:
+            return None
+        start = time.perf_counter()
+        result = self.smoke_runner.run(code, scene_name, job_id=job_id)
+        seconds = time.perf_counter() - start
+        if result["exit_code"] != SCRIPT_ERROR:
+            # Passed, timed out or harness unavailable: only a render can tell
+            status = "passed" if result["success"] else f"inconclusive (exit code {result['exit_code']})"
+            print(f"\n💨 Smoke run {status} in {seconds:.2f}s")
+            return None
+        print(f"\n💨 Smoke run failed in {seconds:.2f}s")
+        print(result["stderr"][-500:])
+        result["smoke"] = True
+        return result
+
+    def _validation_render(self, code: str, scene_name: str, job_id: Optional[str],
+                           cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """Render at validation quality (a preview-named video when a final render follows)"""
+        return self.sandbox.run(code, scene_name, job_id=job_id, cancel_event=cancel_event,
+                                quality=self.validation_quality,
+                                output_suffix="_preview" if self.progressive else "")
+
+    def _final_render(self, result: Dict[str, Any], code: str, scene_name: str,
+                      job_id: Optional[str]) -> Dict[str, Any]:
+        """
+        Re-render a script that passed validation at final quality.
+
+        Adds "preview_path" (the validation video) and "final_render":
+        {"status", "quality", "video_path", "error", "render_seconds"}.
+        Synchronously, a successful final render replaces video_path; if it
+        fails, the preview stays the video. In background mode status is
+        "pending" and the dict is updated in place when the render ends.
+        """
+        if not self.progressive:
+            return result
+        result["preview_path"] = result["video_path"]
+        final = {"status": "pending", "quality": self.final_quality, "video_path": None,
+                 "error": None, "render_seconds": None}
+        result["final_render"] = final
+        try:
+            charge_renders("final_render")
+        except CallBudgetExhausted as e:
+            # The script works; the preview is still a usable video
+            print(f"\n⚠️  No final render: {str(e)}")
+            final.update(status="skipped", error=str(e))
+            return result
+
+        if self.background_final:
+            context = contextvars.copy_context()
+            # The job (and its deadline) ends with the preview; the final render runs on its own time
+            context.run(current_deadline.set, None)
+            thread = threading.Thread(target=context.run, args=(self._run_final_render, final, code, scene_name, job_id),
+                                      name=f"final-render-{job_id or 'run'}", daemon=True)
+            with self._final_threads_lock:
+                self._final_threads = [t for t in self._final_threads if t.is_alive()] + [thread]
+            thread.start()
+            print(f"\n🎞️  Final {self.final_quality} render started in the background, preview: {result['video_path']}")
+            return result
+
+        self._run_final_render(final, code, scene_name, job_id)
+        if final["status"] == "succeeded":
+            result["video_path"] = final["video_path"]
+        else:
+            print(f"\n⚠️  Final render failed, keeping the {self.validation_quality} preview")
+        return result
+
+    def _run_final_render(self, final: Dict[str, Any], code: str, scene_name: str, job_id: Optional[str]):
+        print(f"\n🎞️  Final render at {self.final_quality} quality")
+        started = time.perf_counter()
+        with start_span("retry.final_render", aoai__job_id=job_id, aoai__quality=self.final_quality):
+            render = self.sandbox.run(code, scene_name, job_id=job_id, quality=self.final_quality)
+        with self._final_threads_lock:
+            final.update(video_path=render["video_path"], render_seconds=round(time.perf_counter() - started, 3),
+                         error=None if render["success"] else render["stderr"][-500:])
+            final["status"] = "succeeded" if render["success"] else "failed"
+            listeners = self._final_listeners.pop(id(final), [])
+        self._notify_final(final, listeners)
+
+    @staticmethod
+    def _notify_final(final: Dict[str, Any], listeners: List[Callable[[Dict[str, Any]], None]]):
+        for callback in listeners:
+            try:
+                callback(final)
+            except Exception as e:
+                print(f"⚠️  Final render callback failed: {str(e)}")
+
+    def on_final_render(self, final: Dict[str, Any], callback: Callable[[Dict[str, Any]], None]):
+        """
+        Call callback(final) once a final render has finished (right away if it already has).
+
+        Args:
+            final: The "final_render" dict of an execution result
+            callback: Runs on the render's thread; exceptions are logged, not raised
+        """
+        with self._final_threads_lock:
+            if final["status"] == "pending":
+                self._final_listeners.setdefault(id(final), []).append(callback)
+                return
+        self._notify_final(final, [callback])
+
+    def wait_for_final_renders(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for background final renders to finish.
+
+        Returns:
+            True if none is still running
+        """
+        with self._final_threads_lock:
+            threads = list(self._final_threads)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        return not any(thread.is_alive() for thread in threads)
+
+    def execute_with_retry(self, initial_code: str, scene_name: str = "GeneratedScene",
+                           job_id: Optional[str] = None,
+                           on_patch: Optional[Callable[[str], None]] = None,
+                           first_result: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Try to execute code, fix errors if needed, retry up to MAX_RETRIES times.
         
         Args:
             initial_code: First version of Manim script
             scene_name: Scene class to render
+            job_id: Batch job id (job-specific script/video names)
+            on_patch: Called with each Fixer-patched version (e.g. to checkpoint it)
+            first_result: Already-known render result of initial_code (skips re-rendering it)
             
         Returns:
-            Final execution result (success or final failure)
+            Final execution result (success or final failure); with progressive
+            quality a success also has "preview_path" and "final_render"
         """
         print(f"\n{'='*60}")
         print("🔄 RETRY MANAGER STARTING")
@@ -32,16 +221,41 @@ class RetryManager:
         
         current_code = initial_code
         execution_history = []
+        render_seconds = 0.0
         
         for attempt in range(1, self.MAX_RETRIES + 1):
             print(f"\n{'='*60}")
             print(f"🔄 ATTEMPT {attempt}/{self.MAX_RETRIES}")
             print(f"{'='*60}")
+            record_attempt("retry_manager", attempt)
+            reuse = attempt == 1 and first_result is not None
+            # Scripts that fail the static check or the smoke run go straight back to
+            # the Fixer; the last attempt always renders, since the render has the final word
+            check_result = None
+            if not reuse and attempt < self.MAX_RETRIES:
+                check_result = self._preflight(current_code) or self._smoke(current_code, scene_name, job_id)
+            if not reuse and check_result is None:
+                charge_renders("retry_manager")
             
             # Try to execute current code
-            result = self.sandbox.run(current_code, scene_name)
+            with start_span("retry.attempt", aoai__attempt=attempt, aoai__job_id=job_id) as attempt_span:
+                if reuse:
+                    result = first_result
+                    attempt_span.set_attribute("aoai.reused_result", True)
+                elif check_result is not None:
+                    result = check_result
+                    attempt_span.set_attribute("aoai.check_failed", "smoke" if result.get("smoke") else "preflight")
+                else:
+                    render_started = time.perf_counter()
+                    result = self._validation_render(current_code, scene_name, job_id)
+                    render_seconds = time.perf_counter() - render_started
+                attempt_span.set_attributes(process__exit_code=result["exit_code"], aoai__success=result["success"])
+                attempt_span.set_status("OK" if result["success"] else "ERROR",
+                                        "" if result["success"] else result["stderr"][-200:])
             execution_history.append({
                 "attempt": attempt,
+                "check": "reused" if reuse else ("smoke" if result.get("smoke") else
+                                                 "preflight" if result.get("preflight") else "render"),
                 "exit_code": result["exit_code"],
                 "success": result["success"]
             })
@@ -50,18 +264,32 @@ class RetryManager:
                 print(f"\n✅ Success on attempt {attempt}!")
                 result["attempts"] = attempt
                 result["execution_history"] = execution_history
-                return result
-            
+                return self._final_render(result, current_code, scene_name, job_id)
+
             # Execution failed
             print(f"\n❌ Attempt {attempt} failed (exit code: {result['exit_code']})")
             
+            if result["exit_code"] == -6:
+                print(f"\n⏳ Job deadline reached, stopping retry loop")
+                break
+            
+            if attempt < self.MAX_RETRIES and not can_afford(render_seconds):
+                # A patched render would not finish before the job deadline
+                print(f"\n⏳ Not enough time left for another render (~{render_seconds:.0f}s), stopping retry loop")
+                break
+            
             if attempt < self.MAX_RETRIES:
                 print(f"\n🔧 Calling Fixer Agent to patch code...")
                 
                 try:
                     # Use Fixer Agent to correct the code
-                    current_code = self.fixer.process(current_code, result["stderr"])
+                    with start_span("fixer.patch", aoai__attempt=attempt, aoai__stderr_chars=len(result["stderr"])):
+                        current_code = self.fixer.process(current_code, result["stderr"])
                     print(f"✓ Fixer returned modified code")
+                    if on_patch is not None:
+                        on_patch(current_code)
+                except (CallBudgetExhausted, Cancelled):
+                    raise
                 except Exception as e:
                     print(f"❌ Fixer Agent failed: {str(e)}")
                     print(f"   Stopping retry loop")
@@ -78,3 +306,115 @@ class RetryManager:
         result["attempts"] = len(execution_history)
         result["execution_history"] = execution_history
         return result
+    
+    def execute_speculative(self, candidates: List[str], scene_name: str = "GeneratedScene",
+                            job_id: Optional[str] = None,
+                            on_patch: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """
+        Render several candidate scripts concurrently and keep the first success.
+        
+        Candidates that fail the preflight check are dropped first. Each
+        remaining candidate renders under its own script/video name; once one
+        succeeds the others are cancelled. If every candidate fails, the
+        regular Fixer loop continues from the first candidate's failure.
+        
+        Args:
+            candidates: Validated scripts (e.g. from EngineerAgent.generate_candidates)
+            scene_name: Scene class to render
+            job_id: Batch job id (candidate names derive from it)
+            on_patch: Called with each Fixer-patched version in the fallback loop
+            
+        Returns:
+            Execution result plus "code" (the winning script, if any) and
+            "speculation": {"candidates", "winner", "time_to_first_success_seconds",
+            "wasted_render_seconds", "renders", "preflight_rejected"}; candidate numbers
+            (winner, renders[*].candidate) are 1-based positions in `candidates`
+        """
+        print(f"\n{'='*60}")
+        print(f"🏁 SPECULATIVE RENDER ({len(candidates)} candidates)")
+        print(f"{'='*60}")
+        
+        total = len(candidates)
+        numbers = list(range(1, total + 1))  # Original candidate numbers, kept through filtering
+        rejected = [code for code in candidates if self._preflight(code) is not None]
+        if rejected:
+            print(f"\n🔍 Preflight rejected {len(rejected)}/{len(candidates)} candidates")
+            if len(rejected) == len(candidates):
+                print(f"\n❌ No candidate passed preflight, falling back to the Fixer loop")
+                result = self.execute_with_retry(candidates[0], scene_name, job_id=job_id, on_patch=on_patch)
+                result["speculation"] = {
+                    "candidates": len(candidates),
+                    "winner": None,
+                    "time_to_first_success_seconds": None,
+                    "wasted_render_seconds": 0.0,
+                    "renders": [],
+                    "preflight_rejected": len(rejected)
+                }
+                return result
+            numbers = [number for number, code in zip(numbers, candidates) if code not in rejected]
+            candidates = [code for code in candidates if code not in rejected]
+        
+        # Race only as many candidates as the render budget allows
+        available = remaining_renders()
+        if available is not None and available < len(candidates):
+            available = max(1, available)  # Nothing left: the charge below fails the stage
+            print(f"\n🔁 Render budget left for {available} of {len(candidates)} candidates")
+            numbers, candidates = numbers[:available], candidates[:available]
+        charge_renders("speculative", len(candidates))
+        start = time.perf_counter()
+        cancel_event = threading.Event()
+        results: List[Optional[Dict[str, Any]]] = [None] * len(candidates)
+        renders: List[Optional[Dict[str, Any]]] = [None] * len(candidates)
+        winner = None
+        time_to_first_success = None
+        
+        def render(index: int) -> Dict[str, Any]:
+            candidate_id = f"{job_id}_c{numbers[index]}" if job_id else f"c{numbers[index]}"
+            render_start = time.perf_counter()
+            result = self._validation_render(candidates[index], scene_name, candidate_id, cancel_event)
+            renders[index] = {
+                "candidate": numbers[index],
+                "success": result["success"],
+                "cancelled": result["exit_code"] == -5,
+                "exit_code": result["exit_code"],
+                "render_seconds": round(time.perf_counter() - render_start, 3)
+            }
+            return result
+        
+        with ThreadPoolExecutor(max_workers=len(candidates), thread_name_prefix="speculative-render") as executor:
+            futures = {executor.submit(contextvars.copy_context().run, render, index): index
+                       for index in range(len(candidates))}
+            for future in as_completed(futures):
+                index = futures[future]
+                results[index] = future.result()
+                if results[index]["success"] and winner is None:
+                    winner = index
+                    time_to_first_success = round(time.perf_counter() - start, 3)
+                    print(f"\n🏁 Candidate {numbers[index]} rendered first ({time_to_first_success:.1f}s), cancelling the rest")
+                    cancel_event.set()
+        
+        speculation = {
+            "candidates": total,
+            "winner": numbers[winner] if winner is not None else None,
+            "time_to_first_success_seconds": time_to_first_success,
+            "wasted_render_seconds": round(sum(r["render_seconds"] for i, r in enumerate(renders) if i != winner), 3),
+            "renders": renders,
+            "preflight_rejected": len(rejected)
+        }
+        print(f"   Wasted render time: {speculation['wasted_render_seconds']:.1f}s")
+        
+        if winner is not None:
+            result = results[winner]
+            result["attempts"] = 1
+            result["execution_history"] = [
+                {"attempt": 1, "check": "render", "exit_code": result["exit_code"], "success": True}
+            ]
+            result["code"] = candidates[winner]
+            result["speculation"] = speculation
+            return self._final_render(result, candidates[winner], scene_name, job_id)
+
+        print(f"\n❌ No candidate rendered, falling back to the Fixer loop")
+        result = self.execute_with_retry(candidates[0], scene_name, job_id=job_id,
+                                         on_patch=on_patch, first_result=results[0])
+        result["speculation"] = speculation
+        return result
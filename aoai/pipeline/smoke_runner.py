@@ -0,0 +1,190 @@
+"""
+Smoke Runner
+Executes a scene's construct() with play()/wait() stubbed out and no frame rendering, to catch runtime errors in seconds
+"""
+import argparse
+import runpy
+import shutil
+import subprocess
+import sys
+import traceback
+import uuid
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.tracing import start_span
+from utils.deadline import cap_timeout
+from pipeline.render_worker import RenderWorkerError
+
+
+# Exit codes of a smoke run
+SMOKE_PASSED = 0
+SCRIPT_ERROR = 1     # The script raised; stderr holds the traceback
+HARNESS_ERROR = 3    # Manim could not be imported/configured; says nothing about the script
+
+
+class SmokeRunner:
+    """Runs scripts through smoke_main() in a throwaway process (a warm worker's fork when one is idle)"""
+    
+    SMOKE_TIMEOUT = 20  # Seconds; construct() without frames should take a fraction of that
+    
+    def __init__(self, storage_path: str, render_workers=None):
+        """
+        Args:
+            storage_path: Storage root (workspaces go under temp/)
+            render_workers: Optional RenderWorkerPool shared with the sandbox; its
+                            pre-imported Manim makes a smoke run sub-second
+        """
+        self.temp_dir = Path(storage_path) / "temp"
+        self.temp_dir.mkdir(parents=True, exist_ok=True)
+        self.render_workers = render_workers
+        print(f"✓ Smoke Runner initialized (timeout: {self.SMOKE_TIMEOUT}s)")
+    
+    def run(self, code: str, scene_name: str = "GeneratedScene", job_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Smoke-test a script.
+        
+        Args:
+            code: Manim script
+            scene_name: Scene class whose construct() is executed
+            job_id: Batch job id (only used for tracing)
+        
+        Returns:
+            Same shape as ExecutionSandbox.run() (video_path is always None);
+            exit_code is SMOKE_PASSED, SCRIPT_ERROR, HARNESS_ERROR or -2 on timeout
+        """
+        with start_span("smoke.run", kind="CLIENT", aoai__scene=scene_name, aoai__job_id=job_id) as span:
+            workspace = self.temp_dir / f"smoke_{uuid.uuid4().hex[:8]}"
+            try:
+                workspace.mkdir(parents=True)
+                script_path = workspace / "scene.py"
+                script_path.write_text(code, encoding='utf-8')
+                result = self._execute([str(script_path), scene_name], workspace)
+            finally:
+                shutil.rmtree(workspace, ignore_errors=True)
+            span.set_attributes(process__exit_code=result["exit_code"], aoai__success=result["success"])
+            return result
+    
+    def _execute(self, argv: List[str], workspace: Path) -> Dict[str, Any]:
+        process = self._start(argv, workspace)
+        try:
+            stdout, stderr = process.communicate(timeout=cap_timeout(self.SMOKE_TIMEOUT))
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            return {
+                "success": False,
+                "video_path": None,
+                "stdout": "",
+                "stderr": f"Smoke run timed out (>{self.SMOKE_TIMEOUT}s)",
+                "exit_code": -2
+            }
+        return {
+            "success": process.returncode == SMOKE_PASSED,
+            "video_path": None,
+            "stdout": stdout,
+            "stderr": stderr,
+            "exit_code": process.returncode
+        }
+    
+    def _start(self, argv: List[str], workspace: Path):
+        """Fork from an idle warm worker if possible, else start a fresh interpreter"""
+        if self.render_workers is not None:
+            worker = self.render_workers.acquire()
+            if worker is not None:
+                try:
+                    return worker.start(argv, workspace, mode="smoke")
+                except RenderWorkerError:
+                    self.render_workers.discard(worker)
+        return subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve()), *argv],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            cwd=str(workspace)
+        )
+
+
+# ========================================
+# Smoke process side
+# ========================================
+
+def _patch_scene(scene_class):
+    """Make play() apply each animation's end state without frames, and wait() return at once"""
+    try:
+        from manim.animation.animation import prepare_animation
+    except ImportError:
+        prepare_animation = None
+    
+    def play(self, *animations, **kwargs):
+        for animation in animations:
+            if prepare_animation is not None:
+                animation = prepare_animation(animation)
+            # Same lifecycle as a real play(), minus the frames in between
+            if hasattr(animation, "_setup_scene"):
+                animation._setup_scene(self)
+            animation.begin()
+            animation.finish()
+            animation.clean_up_from_scene(self)
+    
+    def wait(self, *args, **kwargs):
+        pass
+    
+    def add_sound(self, *args, **kwargs):
+        pass
+    
+    scene_class.play = play
+    scene_class.wait = wait
+    scene_class.add_sound = add_sound
+
+
+def smoke_main(argv: List[str]):
+    """
+    Execute `scene_name`'s construct() from a script; exits with SMOKE_PASSED,
+    SCRIPT_ERROR (traceback on stderr) or HARNESS_ERROR.
+    
+    Args:
+        argv: [script_path, scene_name]
+    """
+    script_path, scene_name = argv
+    try:
+        from manim import Scene, config
+        config.dry_run = True
+        config.write_to_movie = False
+        config.save_last_frame = False
+        config.disable_caching = True
+        _patch_scene(Scene)
+    except Exception as e:
+        print(f"Smoke harness unavailable: {type(e).__name__}: {str(e)}", file=sys.stderr)
+        sys.exit(HARNESS_ERROR)
+    
+    try:
+        namespace = runpy.run_path(script_path, run_name="__smoke__")
+        scene_class = namespace.get(scene_name)
+        if scene_class is None:
+            raise NameError(f"Scene class '{scene_name}' is not defined in the script")
+        scene = scene_class()
+        scene.setup()
+        scene.construct()
+        scene.tear_down()
+    except Exception:
+        traceback.print_exc()
+        sys.exit(SCRIPT_ERROR)
+    
+    print(f"Smoke run of {scene_name} passed")
+    sys.exit(SMOKE_PASSED)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Smoke-run a Manim scene without rendering")
+    parser.add_argument("script", help="Manim script")
+    parser.add_argument("scene", nargs="?", default="GeneratedScene", help="Scene class (default: GeneratedScene)")
+    args = parser.parse_args()
+    smoke_main([args.script, args.scene])
+
+
+if __name__ == "__main__":
+    main()
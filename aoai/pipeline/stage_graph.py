@@ -0,0 +1,316 @@
+"""
+Stage Graph
+Declarative DAG of pipeline stages; each stage starts as soon as its inputs are ready
+"""
+import contextvars
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, FIRST_COMPLETED, wait
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Callable, Iterable
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.tracing import open_span
+from utils.deadline import (DeadlineExceeded, Cancelled, CancelToken, current_cancel_token, can_afford,
+                            cap_timeout, check_cancelled, check_deadline, deadline_exceeded)
+from utils.call_budget import CallBudgetExhausted, record_attempt
+
+
+class StageTimeout(Exception):
+    """Raised when a stage attempt exceeds its timeout"""
+
+
+class Stage:
+    """One node of the graph: a callable plus its inputs, output and policy"""
+    
+    def __init__(self, name: str, func: Callable[..., Any], inputs: Iterable[str] = (),
+                 output: Optional[str] = None, timeout: Optional[float] = None,
+                 retries: int = 0, retry_delay: float = 1.0, optional: bool = False):
+        """
+        Args:
+            name: Unique stage name
+            func: Called with the inputs as keyword arguments
+            inputs: Names of values the stage needs (initial values or other stages' outputs)
+            output: Name its return value is published under (defaults to the stage name)
+            timeout: Seconds per attempt (None = no limit)
+            retries: Extra attempts after a failure or timeout
+            retry_delay: Seconds before the first retry (doubles each retry)
+            optional: A failure is recorded and dependents are skipped instead of failing the run
+        """
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.output = output or name
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.optional = optional
+
+
+class StageGraph:
+    """Runs registered stages on a thread pool in dependency order"""
+    
+    def __init__(self, max_workers: int = 4, on_event: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """
+        Args:
+            max_workers: Stages that may run at the same time
+            on_event: Called with {"stage", "status", ...} whenever a stage changes status
+        """
+        self.max_workers = max_workers
+        self.on_event = on_event
+        self.stages: Dict[str, Stage] = {}
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self.started_at: Optional[float] = None
+    
+    def add_stage(self, name: str, func: Callable[..., Any], **policy) -> Stage:
+        """Register a stage (see Stage for the policy arguments)"""
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        stage = Stage(name, func, **policy)
+        self.stages[name] = stage
+        return stage
+    
+    def _producers(self) -> Dict[str, str]:
+        return {stage.output: stage.name for stage in self.stages.values()}
+    
+    def dependencies(self, name: str) -> List[str]:
+        """Stages whose outputs the named stage consumes"""
+        producers = self._producers()
+        return [producers[value] for value in self.stages[name].inputs if value in producers]
+    
+    def validate(self, initial: Iterable[str] = ()):
+        """
+        Check that every input is produced somewhere and there are no cycles.
+        
+        Raises:
+            ValueError: Missing input or dependency cycle
+        """
+        available = set(initial) | set(self._producers())
+        for stage in self.stages.values():
+            missing = [value for value in stage.inputs if value not in available]
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' needs undefined input(s): {', '.join(missing)}")
+        
+        visiting, done = set(), set()
+        
+        def visit(name: str, trail: List[str]):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependency cycle: {' -> '.join(trail + [name])}")
+            visiting.add(name)
+            for dependency in self.dependencies(name):
+                visit(dependency, trail + [name])
+            visiting.discard(name)
+            done.add(name)
+        
+        for name in self.stages:
+            visit(name, [])
+    
+    def _emit(self, name: str, status: str, **details):
+        """Report a status change to on_event (a failing listener never breaks the run)"""
+        if self.on_event is None:
+            return
+        try:
+            self.on_event(dict(details, stage=name, status=status))
+        except Exception as e:
+            print(f"⚠️  Stage event listener failed: {str(e)}")
+    
+    def _attempt(self, stage: Stage, kwargs: Dict[str, Any]) -> Any:
+        """Run one attempt, enforcing the stage timeout (cut short by the job deadline)"""
+        check_deadline(f"stage '{stage.name}'")
+        timeout = cap_timeout(stage.timeout)
+        if timeout is None:
+            return stage.func(**kwargs)
+        
+        # A timed-out attempt cannot be killed; it is cancelled and stops at its next check
+        token = CancelToken(parent=current_cancel_token.get())
+        context = contextvars.copy_context()
+        context.run(current_cancel_token.set, token)
+        helper = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"stage-{stage.name}")
+        try:
+            future = helper.submit(context.run, stage.func, **kwargs)
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            if stage.timeout is None or timeout < stage.timeout:
+                token.cancel("job deadline reached")
+                raise deadline_exceeded(f"stage '{stage.name}'")
+            token.cancel(f"attempt timed out after {stage.timeout:g}s")
+            raise StageTimeout(f"Stage '{stage.name}' timed out after {stage.timeout:g}s")
+        finally:
+            helper.shutdown(wait=False)
+    
+    def _run_stage(self, stage: Stage, kwargs: Dict[str, Any]) -> Any:
+        """Run a stage with its retry policy, recording timings"""
+        record = self.records[stage.name]
+        record["start"] = time.perf_counter()
+        record["status"] = "running"
+        self._emit(stage.name, "running")
+        span = open_span(f"stage.{stage.name}", aoai__stage=stage.name, aoai__timeout=stage.timeout)
+        
+        delay = stage.retry_delay
+        for attempt in range(1, stage.retries + 2):
+            record["attempts"] = attempt
+            try:
+                record_attempt(f"stage.{stage.name}", attempt)
+                result = self._attempt(stage, kwargs)
+                check_cancelled(f"stage '{stage.name}'")
+                record["end"] = time.perf_counter()
+                record["status"] = "succeeded"
+                self._emit(stage.name, "succeeded", seconds=round(record["end"] - record["start"], 3))
+                span.set_attribute("aoai.attempts", attempt)
+                span.set_status("OK")
+                span.end()
+                return result
+            except Cancelled as e:
+                # Abandoned by run(): its record and events are no longer ours to write
+                span.record_exception(e)
+                span.end()
+                raise
+            except Exception as e:
+                if attempt > stage.retries or isinstance(e, (DeadlineExceeded, CallBudgetExhausted)) or not can_afford(delay):
+                    record["end"] = time.perf_counter()
+                    record["status"] = "failed"
+                    record["error"] = str(e)
+                    self._emit(stage.name, "failed", error=str(e))
+                    span.set_attribute("aoai.attempts", attempt)
+                    span.record_exception(e)
+                    span.end()
+                    raise
+                span.add_event("retry", aoai__attempt=attempt, exception__message=str(e)[:200])
+                print(f"⚠️  Stage '{stage.name}' attempt {attempt} failed ({str(e)[:100]}), retrying in {delay:.0f}s")
+                self._emit(stage.name, "retrying", attempt=attempt, error=str(e))
+                time.sleep(delay)
+                delay *= 2
+    
+    def run(self, initial: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Execute the graph.
+        
+        Stages whose output is already in `initial` (e.g. restored from a
+        checkpoint) are marked 'restored' and not run.
+        
+        Args:
+            initial: Values available before any stage runs (e.g. {"user_prompt": ...})
+        
+        Returns:
+            All values: initial ones plus each successful stage's output
+        
+        Raises:
+            The first exception of a non-optional stage (remaining stages are not started)
+        """
+        self.validate(initial)
+        values = dict(initial)
+        self.records = {name: {"status": "pending", "attempts": 0} for name in self.stages}
+        self.started_at = time.perf_counter()
+        
+        pending = set()
+        for name, stage in self.stages.items():
+            if stage.output in values:
+                self.records[name]["status"] = "restored"
+                self._emit(name, "restored")
+            else:
+                pending.add(name)
+        running = {}
+        tokens: Dict[str, CancelToken] = {}
+        failure = None
+        
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="stage")
+        try:
+            while pending or running:
+                # Skip stages whose producers failed or were skipped
+                for name in sorted(pending):
+                    if any(self.records[dep]["status"] in ("failed", "skipped") for dep in self.dependencies(name)):
+                        self.records[name]["status"] = "skipped"
+                        self._emit(name, "skipped")
+                        pending.discard(name)
+                
+                if failure is None:
+                    for name in sorted(pending):
+                        stage = self.stages[name]
+                        if all(value in values for value in stage.inputs):
+                            pending.discard(name)
+                            kwargs = {value: values[value] for value in stage.inputs}
+                            # Stages see the caller's context variables (routing/token logs)
+                            tokens[name] = CancelToken(parent=current_cancel_token.get())
+                            context = contextvars.copy_context()
+                            context.run(current_cancel_token.set, tokens[name])
+                            future = executor.submit(context.run, self._run_stage, stage, kwargs)
+                            running[future] = stage
+                
+                if not running:
+                    break
+                
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    try:
+                        values[stage.output] = future.result()
+                    except Exception as e:
+                        if stage.optional:
+                            print(f"⚠️  Optional stage '{stage.name}' failed: {str(e)}")
+                        elif failure is None:
+                            failure = e
+                if failure is not None:
+                    # Fail fast: stages still running are abandoned and stop at their next check
+                    for stage in running.values():
+                        tokens[stage.name].cancel("pipeline failed in another stage")
+                    break
+        finally:
+            executor.shutdown(wait=failure is None)
+        
+        for name in pending:
+            self.records[name]["status"] = "skipped"
+            self._emit(name, "skipped")
+        for stage in running.values():
+            self.records[stage.name]["status"] = "abandoned"
+            self._emit(stage.name, "abandoned")
+        if failure is not None:
+            raise failure
+        return values
+    
+    def timings(self) -> Dict[str, Dict[str, Any]]:
+        """Per-stage status, attempts and start/end/duration relative to the run start"""
+        report = {}
+        for name, record in self.records.items():
+            entry = {"status": record["status"], "attempts": record["attempts"]}
+            if "start" in record:
+                end = record.get("end", time.perf_counter())
+                entry["start_seconds"] = round(record["start"] - self.started_at, 3)
+                entry["end_seconds"] = round(end - self.started_at, 3)
+                entry["duration_seconds"] = round(end - record["start"], 3)
+            if "error" in record:
+                entry["error"] = record["error"]
+            report[name] = entry
+        return report
+    
+    def critical_path(self) -> Dict[str, Any]:
+        """
+        Chain of stages that determined the run's length.
+        
+        Starts from the stage that finished last and walks back through the
+        dependency that finished last (the one its start waited for).
+        
+        Returns:
+            {"stages": [names], "seconds": total, "durations": {name: seconds}}
+        """
+        finished = {name: record for name, record in self.records.items() if "end" in record}
+        if not finished:
+            return {"stages": [], "seconds": 0.0, "durations": {}}
+        
+        current = max(finished, key=lambda name: finished[name]["end"])
+        path = [current]
+        while True:
+            dependencies = [dep for dep in self.dependencies(current) if dep in finished]
+            if not dependencies:
+                break
+            current = max(dependencies, key=lambda name: finished[name]["end"])
+            path.insert(0, current)
+        
+        return {
+            "stages": path,
+            "seconds": round(finished[path[-1]]["end"] - self.started_at, 3),
+            "durations": {name: round(finished[name]["end"] - finished[name]["start"], 3) for name in path}
+        }
@@ -0,0 +1,135 @@
+"""
+Test the Model Router
+Latency-ordered selection, circuit breakers and half-open probes (no API calls)
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import pytest
+
+from llm import model_router
+from llm.model_router import ModelHealth, ModelRouter, get_model_router, record_routing_decision, routing_decisions
+
+
+@pytest.fixture
+def router():
+    return ModelRouter("test", ["large", "small", "tiny"])
+
+
+def trip(router, model):
+    for _ in range(ModelRouter.FAILURE_THRESHOLD):
+        router.record_failure(model, 1.0)
+
+
+def test_preferred_order_without_latency_data(router):
+    assert router.choose() == ("large", "preferred order (no latency data yet)")
+    model, reason = router.choose(exclude=["large"])
+    assert model == "small"
+    assert reason.endswith("fallback from large")
+    assert router.choose(exclude=["large", "small", "tiny"]) == (None, "all models tried")
+
+
+def test_fastest_healthy_model_wins(router):
+    for latency in (3.0, 2.0, 4.0):
+        router.record_success("large", latency)
+    router.record_success("small", 1.0)
+    model, reason = router.choose()
+    # Models without samples rank after measured ones
+    assert model == "small"
+    assert reason == "fastest healthy model (p50 1.00s)"
+    assert router.latency_percentile("large", 50) == 3.0
+    assert router.latency_percentile("large", 95) == 4.0
+    assert router.latency_percentile("tiny", 50) is None
+
+
+def test_high_error_rate_is_deprioritized(router):
+    router.record_success("large", 5.0)
+    router.record_success("small", 0.5)
+    router.record_failure("small", 0.5)
+    router.record_failure("small", 0.5)
+    router.record_success("small", 0.5)  # Breaker stays closed, error rate 0.5
+    assert router.choose()[0] == "small"
+    router.record_failure("small", 0.5)
+    assert router.stats()["small"]["error_rate"] == 0.6
+    assert router.choose()[0] == "large"
+
+
+def test_breaker_opens_after_consecutive_failures(router):
+    router.record_failure("large", 1.0)
+    router.record_failure("large", 1.0)
+    assert router.health["large"].state == ModelHealth.CLOSED
+    router.record_failure("large", 1.0)
+    assert router.health["large"].state == ModelHealth.OPEN
+    assert router.choose()[0] == "small"
+
+
+def test_all_open_uses_least_recently_tripped(router, monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(model_router.time, "time", lambda: clock[0])
+    for model in ("small", "large", "tiny"):
+        trip(router, model)
+        clock[0] += 1.0
+    assert router.choose() == ("small", "all circuits open; using least recently tripped model")
+
+
+def test_half_open_allows_one_probe(router, monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(model_router.time, "time", lambda: clock[0])
+    trip(router, "large")
+    assert router.choose()[0] == "small"
+    
+    clock[0] += ModelRouter.OPEN_SECONDS
+    model, reason = router.choose()
+    assert model == "large"
+    assert reason.startswith("half-open probe")
+    assert router.stats()["large"]["state"] == ModelHealth.HALF_OPEN
+    # The probe is in flight, so other requests go elsewhere
+    assert router.choose()[0] == "small"
+
+
+def test_probe_success_closes_breaker(router, monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(model_router.time, "time", lambda: clock[0])
+    trip(router, "large")
+    clock[0] += ModelRouter.OPEN_SECONDS
+    assert router.choose()[0] == "large"
+    router.record_success("large", 0.2)
+    assert router.health["large"].state == ModelHealth.CLOSED
+    assert router.health["large"].consecutive_failures == 0
+    # Still deprioritized until its recent error rate recovers
+    assert router.stats()["large"]["error_rate"] == 0.75
+    assert router.choose()[0] == "small"
+
+
+def test_probe_failure_reopens_breaker(router, monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(model_router.time, "time", lambda: clock[0])
+    trip(router, "large")
+    clock[0] += ModelRouter.OPEN_SECONDS
+    assert router.choose()[0] == "large"
+    router.record_failure("large", 1.0)
+    assert router.health["large"].state == ModelHealth.OPEN
+    assert router.choose()[0] == "small"
+    clock[0] += ModelRouter.OPEN_SECONDS
+    assert router.choose()[0] == "large"
+
+
+def test_routing_decisions_are_logged_per_run():
+    record_routing_decision("test", "large", "outside a run")
+    decisions = []
+    token = routing_decisions.set(decisions)
+    try:
+        record_routing_decision("test", "small", "fallback")
+    finally:
+        routing_decisions.reset(token)
+    assert [(d["model"], d["reason"]) for d in decisions] == [("small", "fallback")]
+
+
+def test_routers_are_shared_per_model_list():
+    router = get_model_router("test", ["a", "b"])
+    assert get_model_router("test", ("a", "b")) is router
+    assert get_model_router("test", ["b", "a"]) is not router
+    assert get_model_router("other", ["a", "b"]) is not router
@@ -0,0 +1,135 @@
+"""
+Test the Preflight Checks
+Runs preflight_check() against a small hand-written manim index (no manim needed)
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from utils.preflight import preflight_check
+
+
+INDEX = {
+    "format": 2,
+    "manim_version": "test",
+    "symbols": {
+        "Scene": {"kind": "class", "params": [], "max_positional": 0, "var_kwargs": True,
+                  "members": ["play", "wait", "add", "camera"]},
+        "Circle": {"kind": "class", "params": ["radius", "color"], "max_positional": 1, "var_kwargs": False},
+        "Square": {"kind": "class", "params": ["side_length"], "max_positional": 1, "var_kwargs": True},
+        "Create": {"kind": "class", "params": ["mobject", "run_time"], "max_positional": 1, "var_kwargs": False},
+        "VGroup": {"kind": "class", "params": [], "max_positional": None, "var_kwargs": True},
+        "BLUE": {"kind": "constant"},
+    }
+}
+
+
+def check(code):
+    return [(d["kind"], d["name"]) for d in preflight_check(code, INDEX)]
+
+
+def test_valid_script():
+    code = (
+        "from manim import *\n"
+        "class GeneratedScene(Scene):\n"
+        "    def construct(self):\n"
+        "        circle = Circle(radius=2, color=BLUE)\n"
+        "        self.play(Create(circle))\n"
+    )
+    assert check(code) == []
+
+
+def test_star_import_resolves_index_names():
+    code = "from manim import *\nx = Circel()\ny = Circle()\n"
+    diagnostics = preflight_check(code, INDEX)
+    assert [(d["kind"], d["name"]) for d in diagnostics] == [("unknown-name", "Circel")]
+    assert "did you mean 'Circle'?" in diagnostics[0]["message"]
+
+
+def test_unknown_names_ignored_without_manim_star_import():
+    # Any other star import could define the name
+    assert check("from manim import *\nfrom numpy import *\nx = linspace(0, 1)\n") == []
+    assert check("from manim import Circle\nx = Undefined()\n") == []
+
+
+def test_explicit_import_of_missing_symbol():
+    diagnostics = preflight_check("from manim import ShowCreation\n", INDEX)
+    assert [(d["kind"], d["name"]) for d in diagnostics] == [("unknown-import", "ShowCreation")]
+    assert "renamed to Create" in diagnostics[0]["message"]
+
+
+def test_locals_and_comprehension_variables_are_bound():
+    code = (
+        "from manim import *\n"
+        "def helper(count, *rest, **options):\n"
+        "    total = count\n"
+        "    return [Circle(radius=r) for r in range(total)], rest, options\n"
+        "squares = {side: Square(side) for side in (1, 2)}\n"
+        "try:\n"
+        "    pass\n"
+        "except ValueError as error:\n"
+        "    print(error)\n"
+    )
+    assert check(code) == []
+
+
+def test_script_definitions_shadow_index_entries():
+    code = "from manim import *\ndef Circle(*args, **kwargs):\n    pass\nCircle(1, 2, 3, unknown=4)\n"
+    assert check(code) == []
+
+
+def test_unknown_keyword():
+    assert check("from manim import *\nCircle(radius=1, colour=BLUE)\n") == [("unknown-keyword", "Circle.colour")]
+
+
+def test_var_kwargs_constructor_accepts_any_keyword():
+    assert check("from manim import *\nSquare(2, fill_opacity=0.5)\nVGroup(stroke_width=2)\n") == []
+
+
+def test_too_many_positional_arguments():
+    assert check("from manim import *\nCircle(1, BLUE)\n") == [("too-many-arguments", "Circle")]
+
+
+def test_starred_positional_arguments_are_not_counted():
+    assert check("from manim import *\nargs = (1, 2)\nCircle(*args)\nCircle(1, *args)\n") == []
+    assert check("from manim import *\nitems = []\nVGroup(*items, 1, 2)\n") == []
+
+
+def test_scene_attributes():
+    code = (
+        "from manim import *\n"
+        "class GeneratedScene(Scene):\n"
+        "    speed = 2\n"
+        "    def __init__(self, **kwargs):\n"
+        "        super().__init__(**kwargs)\n"
+        "        self.shapes = []\n"
+        "    def construct(self):\n"
+        "        self.add(*self.shapes)\n"
+        "        self.wait(self.speed)\n"
+        "        self.helper()\n"
+        "        self.camera\n"
+        "        self.play_all()\n"
+        "    def helper(self):\n"
+        "        pass\n"
+    )
+    assert check(code) == [("unknown-scene-attribute", "play_all")]
+
+
+def test_scene_attributes_unchecked_for_unindexed_bases():
+    code = (
+        "from manim import *\n"
+        "class Base:\n"
+        "    pass\n"
+        "class GeneratedScene(Scene, Base):\n"
+        "    def construct(self):\n"
+        "        self.anything()\n"
+    )
+    assert check(code) == []
+
+
+def test_syntax_error():
+    diagnostics = preflight_check("from manim import *\ndef broken(:\n", INDEX)
+    assert [d["kind"] for d in diagnostics] == ["syntax"]
+    assert diagnostics[0]["line"] == 2
@@ -0,0 +1,144 @@
+"""
+Test the Adaptive Rate Limiter
+Header parsing, token bucket, AIMD concurrency and the cross-process bucket (no API calls)
+"""
+import sys
+import time
+from email.utils import formatdate
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import pytest
+
+from llm.rate_limiter import (
+    AdaptiveRateLimiter, fcntl, get_rate_limiter, is_rate_limit_error, parse_duration, retry_after_from_error
+)
+
+
+class FakeResponse:
+    def __init__(self, status_code=None, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeAPIError(Exception):
+    def __init__(self, message, status_code=None, headers=None):
+        super().__init__(message)
+        self.response = FakeResponse(status_code, headers)
+
+
+def test_parse_duration():
+    assert parse_duration("7") == 7.0
+    assert parse_duration("2m59.56s") == pytest.approx(179.56)
+    assert parse_duration("120ms") == pytest.approx(0.12)
+    assert parse_duration("1h") == 3600.0
+    assert parse_duration(None) is None
+    assert parse_duration("soon") is None
+    assert 25 <= parse_duration(formatdate(time.time() + 30, usegmt=True)) <= 30
+
+
+def test_is_rate_limit_error():
+    assert is_rate_limit_error(FakeAPIError("Too Many Requests", status_code=429))
+    # A known status wins over the message text
+    assert not is_rate_limit_error(FakeAPIError("rate computation failed", status_code=500))
+    assert is_rate_limit_error(Exception("Resource has been exhausted (check quota)"))
+    assert not is_rate_limit_error(Exception("connection reset"))
+
+
+def test_retry_after_from_error():
+    assert retry_after_from_error(FakeAPIError("429", 429, {"retry-after": "3"})) == 3.0
+    assert retry_after_from_error(FakeAPIError("429", 429, {"x-ratelimit-reset-requests": "1m"})) == 60.0
+    assert retry_after_from_error(Exception("Please try again in 7.66s.")) == pytest.approx(7.66)
+    assert retry_after_from_error(Exception("rate limited")) is None
+
+
+def test_token_bucket_limits_burst():
+    limiter = AdaptiveRateLimiter("test:bucket", requests_per_minute=60, max_concurrency=2)
+    assert limiter.capacity == 2.0
+    assert limiter._try_acquire_locked() == 0
+    limiter.release()
+    assert limiter._try_acquire_locked() == 0
+    limiter.release()
+    # Bucket is empty; one token refills per second at 60 rpm
+    assert 0.9 < limiter._try_acquire_locked() <= 1.0
+    assert limiter.stats()["requests"] == 2
+
+
+def test_acquire_waits_for_refill():
+    limiter = AdaptiveRateLimiter("test:refill", requests_per_minute=600, max_concurrency=1)
+    limiter.acquire()
+    limiter.release()
+    started = time.monotonic()
+    limiter.acquire()
+    limiter.release()
+    assert time.monotonic() - started >= 0.05
+
+
+def test_concurrency_limit():
+    limiter = AdaptiveRateLimiter("test:concurrency", requests_per_minute=6000, max_concurrency=8)
+    limiter.concurrency_limit = 1.0
+    assert limiter._try_acquire_locked() == 0
+    assert limiter._try_acquire_locked() > 0
+    limiter.release()
+    assert limiter._try_acquire_locked() == 0
+
+
+def test_aimd_concurrency():
+    limiter = AdaptiveRateLimiter("test:aimd", requests_per_minute=60, max_concurrency=8)
+    limiter.record_rate_limit()
+    assert limiter.concurrency_limit == 4.0
+    for _ in range(5):
+        limiter.record_rate_limit()
+    assert limiter.concurrency_limit == 1.0
+    limiter.record_success()
+    assert limiter.concurrency_limit == 2.0
+    limiter.record_success()
+    assert limiter.concurrency_limit == 2.5
+    for _ in range(100):
+        limiter.record_success()
+    assert limiter.concurrency_limit == 8.0
+    assert limiter.stats()["rate_limited"] == 6
+
+
+def test_retry_after_blocks_tokens():
+    limiter = AdaptiveRateLimiter("test:retry-after", requests_per_minute=600, max_concurrency=4)
+    assert limiter.record_rate_limit(FakeAPIError("429", 429, {"retry-after": "5"})) == 5.0
+    assert 4.5 < limiter._try_acquire_locked() <= 5.0
+
+
+def test_exhausted_quota_headers_block_tokens():
+    limiter = AdaptiveRateLimiter("test:headers", requests_per_minute=600, max_concurrency=4)
+    limiter.record_success({"x-ratelimit-remaining-requests": "5", "x-ratelimit-reset-requests": "9s"})
+    assert limiter._try_acquire_locked() == 0
+    limiter.release()
+    limiter.record_success({"x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "2s"})
+    assert 1.5 < limiter._try_acquire_locked() <= 2.0
+
+
+def test_backoff_delay():
+    limiter = AdaptiveRateLimiter("test:backoff", requests_per_minute=60)
+    for attempt in range(1, 10):
+        assert 0 <= limiter.backoff_delay(attempt, base=1.0) <= min(60.0, 2 ** (attempt - 1))
+    assert 3.0 <= limiter.backoff_delay(1, base=1.0, retry_after=3.0) <= 3.3
+
+
+@pytest.mark.skipif(fcntl is None, reason="cross-process buckets need fcntl")
+def test_shared_bucket_across_limiters(tmp_path):
+    # Two limiters with the same key and lock dir stand in for two processes
+    first = AdaptiveRateLimiter("test:shared", requests_per_minute=60, max_concurrency=2, lock_dir=tmp_path)
+    second = AdaptiveRateLimiter("test:shared", requests_per_minute=60, max_concurrency=2, lock_dir=tmp_path)
+    assert first._try_acquire_locked() == 0
+    assert second._try_acquire_locked() == 0
+    assert first._try_acquire_locked() > 0.9
+
+    first.record_rate_limit(FakeAPIError("429", 429, {"retry-after": "30"}))
+    assert second._try_acquire_locked() > 29
+
+
+def test_registry_shares_limiters():
+    limiter = get_rate_limiter("groq", "test-model")
+    assert get_rate_limiter("groq", "test-model") is limiter
+    assert get_rate_limiter("gemini", "test-model") is not limiter
+    assert limiter.rate == pytest.approx(30 / 60.0)
@@ -0,0 +1,131 @@
+"""
+Test the Result Cache
+Prompt normalization, near-duplicate matching, LRU eviction and invalidation on a temp directory
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import pytest
+
+from pipeline import result_cache
+from pipeline.result_cache import ResultCache, normalize_prompt
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Deterministic time.time() so LRU order does not depend on timer resolution"""
+    now = [1000.0]
+
+    def tick():
+        now[0] += 1.0
+        return now[0]
+
+    monkeypatch.setattr(result_cache.time, "time", tick)
+    return now
+
+
+def make_artifacts(tmp_path, name, code_bytes=100, video_bytes=0):
+    code = tmp_path / "out" / name / "scene.py"
+    code.parent.mkdir(parents=True)
+    code.write_bytes(b"#" * code_bytes)
+    video = None
+    if video_bytes:
+        video = code.parent / "scene.mp4"
+        video.write_bytes(b"\0" * video_bytes)
+    return str(code), str(video) if video else None
+
+
+def test_normalize_prompt_drops_phrasing_and_stems():
+    assert normalize_prompt("Explain the derivatives of x^2, please!") == ["derivativ", "x", "^", "2"]
+    assert normalize_prompt("derivative") == normalize_prompt("Derivatives")
+    assert normalize_prompt("What is a rotating square?") == normalize_prompt("visualize rotate squares")
+
+
+def test_normalize_prompt_keeps_numbers_and_symbols():
+    assert normalize_prompt("x^2") != normalize_prompt("x^3")
+    assert normalize_prompt("pi is 3.14") == ["pi", "3.14"]
+
+
+def test_exact_hit_after_normalization(tmp_path, clock):
+    cache = ResultCache(tmp_path / "cache")
+    code, _ = make_artifacts(tmp_path, "a")
+    cache.put("Explain the Pythagorean theorem", "cfg", code, narration={"script": "x"})
+
+    hit = cache.get("pythagorean theorem?", "cfg", with_video=False)
+    assert hit["match"] == "exact"
+    assert hit["narration"] == {"script": "x"}
+    assert Path(hit["code_path"]).read_bytes() == Path(code).read_bytes()
+    assert cache.get("pythagorean theorem", "other-cfg", with_video=False) is None
+    # A code-only entry cannot answer a request for a video
+    assert cache.get("pythagorean theorem", "cfg", with_video=True) is None
+
+
+def test_near_match_requires_threshold(tmp_path, clock):
+    code, _ = make_artifacts(tmp_path, "a")
+    exact_only = ResultCache(tmp_path / "exact")
+    exact_only.put("rotating square with a circle inside", "cfg", code)
+    assert exact_only.get("rotating square with a circle inside it slowly", "cfg", with_video=False) is None
+
+    near = ResultCache(tmp_path / "near", similarity_threshold=0.5)
+    near.put("rotating square with a circle inside", "cfg", code)
+    hit = near.get("rotating square with a circle inside it slowly", "cfg", with_video=False)
+    assert hit["match"] == "near"
+    assert 0.5 <= hit["similarity"] < 1.0
+    assert near.get("fourier series of a sawtooth wave", "cfg", with_video=False) is None
+
+
+def test_near_match_never_crosses_numbers_or_symbols(tmp_path, clock):
+    cache = ResultCache(tmp_path / "cache", similarity_threshold=0.1)
+    code, _ = make_artifacts(tmp_path, "a")
+    cache.put("plot the graph of the function x^2 on a grid", "cfg", code)
+
+    assert cache.get("plot the graph of the function x^3 on a grid", "cfg", with_video=False) is None
+    assert cache.get("plot graph of function x^2 on grid axes", "cfg", with_video=False)["match"] == "near"
+
+
+def test_lru_eviction_against_max_bytes(tmp_path, clock):
+    cache = ResultCache(tmp_path / "cache", max_bytes=2500)
+    for name in ("first", "second"):
+        code, video = make_artifacts(tmp_path, name, video_bytes=1000)
+        cache.put(f"{name} prompt", "cfg", code, video)
+
+    # Touch the older entry so the other one is least recently used
+    assert cache.get("first prompt", "cfg", with_video=True) is not None
+    code, video = make_artifacts(tmp_path, "third", video_bytes=1000)
+    cache.put("third prompt", "cfg", code, video)
+
+    assert cache.get("second prompt", "cfg", with_video=True) is None
+    assert cache.get("first prompt", "cfg", with_video=True) is not None
+    assert cache.get("third prompt", "cfg", with_video=True) is not None
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["entries"] == 2
+    assert stats["bytes"] <= 2500
+    assert len(list((tmp_path / "cache" / "artifacts").iterdir())) == 2
+
+
+def test_invalidate_removes_all_configurations(tmp_path, clock):
+    cache = ResultCache(tmp_path / "cache")
+    code, video = make_artifacts(tmp_path, "a", video_bytes=10)
+    cache.put("Explain the unit circle", "cfg-a", code)
+    cache.put("explain the unit circle", "cfg-b", code, video)
+    cache.put("explain sine waves", "cfg-a", code)
+
+    assert cache.invalidate("the unit circle!") == 2
+    assert cache.get("unit circle", "cfg-a", with_video=False) is None
+    assert cache.get("unit circle", "cfg-b", with_video=False) is None
+    assert cache.get("sine waves", "cfg-a", with_video=False) is not None
+    assert len(list((tmp_path / "cache" / "artifacts").iterdir())) == 1
+
+
+def test_missing_artifacts_are_a_miss(tmp_path, clock):
+    cache = ResultCache(tmp_path / "cache")
+    code, _ = make_artifacts(tmp_path, "a")
+    cache.put("unit circle", "cfg", code)
+    Path(cache.get("unit circle", "cfg", with_video=False)["code_path"]).unlink()
+
+    assert cache.get("unit circle", "cfg", with_video=False) is None
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,182 @@
+"""
+Call Budget
+Per-job cap on LLM calls and renders shared by every retrying layer, with amplification statistics
+"""
+import threading
+from contextvars import ContextVar
+from typing import Dict, Any, Optional
+
+from utils.deadline import check_cancelled
+
+
+# Layers whose first attempts are the job's logical LLM requests
+AGENT_LAYERS = ("logician", "director", "engineer", "fixer", "narrator")
+
+# Resources spent by each retrying layer (stage.<name> layers use the stage name).
+# An attempt is refused only once one of its own resources is exhausted;
+# unlisted layers are refused when any resource is.
+LAYER_RESOURCES = {
+    "logician": ("llm_call",),
+    "director": ("llm_call",),
+    "engineer": ("llm_call",),
+    "fixer": ("llm_call",),
+    "narrator": ("llm_call",),
+    "groq": ("llm_call",),
+    "gemini": ("llm_call",),
+    "retry_manager": ("render",),
+    "render": ("render",),
+    "save_code": ()
+}
+
+
+class CallBudgetExhausted(Exception):
+    """Raised when a job has used all of its LLM calls or renders"""
+    
+    def __init__(self, resource: str, layer: str, limit: int):
+        super().__init__(f"Call budget exhausted: {limit} {resource}s used (requested by {layer})")
+        self.resource = resource
+        self.layer = layer
+        self.limit = limit
+
+
+class CallBudget:
+    """
+    Counts the LLM calls and renders of one job across all layers.
+    
+    Each layer that retries (LLM clients, agents, the stage graph, the
+    RetryManager) records its attempts here, so nested retries cannot
+    multiply past the limits and the report shows which layer used them.
+    Shared by the job's worker threads, hence the lock.
+    """
+    
+    RESOURCES = ("llm_call", "render")
+    
+    def __init__(self, max_llm_calls: Optional[int] = None, max_renders: Optional[int] = None):
+        """
+        Args:
+            max_llm_calls: API requests allowed for the job (None = unlimited)
+            max_renders: Manim renders allowed for the job (None = unlimited)
+        """
+        self.limits = {"llm_call": max_llm_calls, "render": max_renders}
+        self.used = {resource: 0 for resource in self.RESOURCES}
+        self.layers: Dict[str, Dict[str, int]] = {}
+        self.exhausted_by: Optional[str] = None  # Layer whose request hit a limit first
+        self.exhausted_resources = set()
+        self._lock = threading.Lock()
+    
+    def _layer(self, layer: str) -> Dict[str, int]:
+        return self.layers.setdefault(layer, {"attempts": 0, "retries": 0, "llm_calls": 0, "renders": 0})
+    
+    def charge(self, resource: str, layer: str, count: int = 1):
+        """
+        Use `count` LLM calls or renders.
+        
+        Args:
+            resource: 'llm_call' or 'render'
+            layer: Layer making the request ('groq', 'retry_manager', ...)
+            count: Units requested at once (e.g. speculative candidates)
+        
+        Raises:
+            CallBudgetExhausted: Not enough left; nothing is charged
+        """
+        with self._lock:
+            limit = self.limits[resource]
+            if limit is not None and self.used[resource] + count > limit:
+                if self.exhausted_by is None:
+                    self.exhausted_by = layer
+                self.exhausted_resources.add(resource)
+                raise CallBudgetExhausted(resource, layer, limit)
+            self.used[resource] += count
+            self._layer(layer)[resource + "s"] += count
+    
+    def remaining(self, resource: str) -> Optional[int]:
+        """Units of a resource still available (None = unlimited)"""
+        with self._lock:
+            limit = self.limits[resource]
+            return None if limit is None else max(0, limit - self.used[resource])
+    
+    def record_attempt(self, layer: str, attempt: int):
+        """
+        Record an attempt of a retrying layer.
+        
+        Raises:
+            CallBudgetExhausted: A resource this layer spends already ran out, so retrying is pointless
+        """
+        name = layer[len("stage."):] if layer.startswith("stage.") else layer
+        resources = LAYER_RESOURCES.get(name, self.RESOURCES)
+        with self._lock:
+            for resource in resources:
+                if resource in self.exhausted_resources:
+                    raise CallBudgetExhausted(resource, layer, self.limits[resource])
+            stats = self._layer(layer)
+            stats["attempts"] += 1
+            if attempt > 1:
+                stats["retries"] += 1
+    
+    def report(self) -> Dict[str, Any]:
+        """
+        Usage and amplification statistics.
+        
+        Returns:
+            {"limits", "llm_calls", "renders", "exhausted", "exhausted_by", "exhausted_resources",
+             "amplification", "layers": {layer: {"attempts", "retries", "llm_calls",
+             "renders", "amplification"}}}
+            where amplification = attempts per first attempt (overall: LLM
+            calls per logical agent request)
+        """
+        with self._lock:
+            layers = {}
+            for layer, stats in self.layers.items():
+                first_attempts = stats["attempts"] - stats["retries"]
+                layers[layer] = dict(stats, amplification=round(stats["attempts"] / first_attempts, 2)
+                                     if first_attempts else None)
+            requests = sum(stats["attempts"] - stats["retries"]
+                           for layer, stats in self.layers.items() if layer in AGENT_LAYERS)
+            return {
+                "limits": dict(self.limits),
+                "llm_calls": self.used["llm_call"],
+                "renders": self.used["render"],
+                "exhausted": self.exhausted_by is not None,
+                "exhausted_by": self.exhausted_by,
+                "exhausted_resources": sorted(self.exhausted_resources),
+                "amplification": round(self.used["llm_call"] / requests, 2) if requests else None,
+                "layers": layers
+            }
+
+
+# Budget of the current pipeline run (set by the orchestrator)
+current_call_budget: ContextVar[Optional[CallBudget]] = ContextVar("current_call_budget", default=None)
+
+
+def charge_llm_call(layer: str):
+    """Count one API request against the current job (no-op outside a run)"""
+    budget = current_call_budget.get()
+    if budget is not None:
+        budget.charge("llm_call", layer)
+
+
+def charge_renders(layer: str, count: int = 1):
+    """Count `count` renders against the current job (no-op outside a run)"""
+    budget = current_call_budget.get()
+    if budget is not None:
+        budget.charge("render", layer, count)
+
+
+def remaining_renders() -> Optional[int]:
+    """Renders the current job may still start (None = unlimited or outside a run)"""
+    budget = current_call_budget.get()
+    return budget.remaining("render") if budget is not None else None
+
+
+def record_attempt(layer: str, attempt: int):
+    """
+    Record a retrying layer's attempt.
+    
+    Raises:
+        CallBudgetExhausted: The job's budget is gone
+        Cancelled: The stage this attempt belongs to was abandoned
+    """
+    check_cancelled(layer)
+    budget = current_call_budget.get()
+    if budget is not None:
+        budget.record_attempt(layer, attempt)
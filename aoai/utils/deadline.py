@@ -0,0 +1,173 @@
+"""
+Deadlines
+Per-job time budget shared by every layer of a pipeline run (agents, LLM clients, retries, renders)
+"""
+import re
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a job's time budget is used up"""
+    
+    def __init__(self, where: str, budget_seconds: float):
+        super().__init__(f"Deadline of {budget_seconds:g}s exceeded during {where}")
+        self.where = where
+        self.budget_seconds = budget_seconds
+
+
+class Cancelled(Exception):
+    """Raised inside work its caller has given up on (a timed-out stage attempt, an abandoned stage)"""
+    
+    def __init__(self, where: str, reason: str):
+        super().__init__(f"{where} cancelled: {reason}")
+        self.where = where
+        self.reason = reason
+
+
+class CancelToken:
+    """
+    Cancellation flag for work left running on a thread nobody waits for.
+    
+    Python threads cannot be killed, so the work stops itself at its next
+    check_deadline()/record_attempt() and skips its own side effects.
+    A token is also cancelled when its parent is.
+    """
+    
+    def __init__(self, parent: Optional["CancelToken"] = None):
+        self.parent = parent
+        self.reason: Optional[str] = None
+    
+    def cancel(self, reason: str):
+        if self.reason is None:
+            self.reason = reason
+    
+    def cancelled(self) -> Optional[str]:
+        """Why this token (or an ancestor) was cancelled; None while the work is still wanted"""
+        if self.reason is not None:
+            return self.reason
+        return self.parent.cancelled() if self.parent is not None else None
+
+
+class Deadline:
+    """Absolute expiry time of one job (perf_counter clock, like the stage graph's timings)"""
+    
+    def __init__(self, seconds: float):
+        """
+        Args:
+            seconds: Budget for the whole job
+        """
+        self.seconds = seconds
+        self.started_at = time.perf_counter()
+        self.expires_at = self.started_at + seconds
+        self.exceeded_in: Optional[str] = None  # First layer that ran out of time
+    
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.perf_counter())
+    
+    def expired(self) -> bool:
+        return time.perf_counter() >= self.expires_at
+    
+    def exceeded(self, where: str) -> DeadlineExceeded:
+        """Record where the budget ran out and return the exception to raise"""
+        if self.exceeded_in is None:
+            self.exceeded_in = where
+        return DeadlineExceeded(where, self.seconds)
+
+
+# Deadline of the current pipeline run (set by the orchestrator)
+current_deadline: ContextVar[Optional[Deadline]] = ContextVar("current_deadline", default=None)
+
+# Cancellation token of the current stage attempt (set by the stage graph)
+current_cancel_token: ContextVar[Optional[CancelToken]] = ContextVar("current_cancel_token", default=None)
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left for the current job (None = no deadline)"""
+    deadline = current_deadline.get()
+    return deadline.remaining() if deadline is not None else None
+
+
+def check_cancelled(where: str):
+    """
+    Raise if the current work has been cancelled by its caller.
+    
+    Args:
+        where: Layer about to start work or write results
+    
+    Raises:
+        Cancelled
+    """
+    token = current_cancel_token.get()
+    reason = token.cancelled() if token is not None else None
+    if reason is not None:
+        raise Cancelled(where, reason)
+
+
+def check_deadline(where: str):
+    """
+    Raise if the current job's deadline has passed or its work was cancelled.
+    
+    Args:
+        where: Layer about to start work ('groq request', 'engineer attempt', ...)
+    
+    Raises:
+        DeadlineExceeded, Cancelled
+    """
+    check_cancelled(where)
+    deadline = current_deadline.get()
+    if deadline is not None and deadline.expired():
+        raise deadline.exceeded(where)
+
+
+def can_afford(seconds: float) -> bool:
+    """Whether `seconds` of work (a backoff sleep, a re-render) still fits in the budget"""
+    remaining = remaining_time()
+    return remaining is None or remaining >= seconds
+
+
+def deadline_exceeded(where: str) -> DeadlineExceeded:
+    """Exception for a layer that gives up because its work cannot finish in time"""
+    deadline = current_deadline.get()
+    if deadline is None:
+        return DeadlineExceeded(where, 0.0)
+    return deadline.exceeded(where)
+
+
+def cap_timeout(timeout: Optional[float]) -> Optional[float]:
+    """
+    Shorten a layer's own timeout to the job's remaining budget.
+    
+    Args:
+        timeout: The layer's usual timeout in seconds (None = unlimited)
+    
+    Returns:
+        min(timeout, remaining budget); None only if both are unlimited
+    """
+    remaining = remaining_time()
+    if remaining is None:
+        return timeout
+    if timeout is None:
+        return remaining
+    return min(timeout, remaining)
+
+
+def parse_duration(text: str) -> float:
+    """
+    Parse a duration such as '120', '120s', '2m', '1m30s' or '1.5h' into seconds.
+    
+    Raises:
+        ValueError: Unrecognized format or non-positive duration
+    """
+    text = text.strip().lower()
+    if re.fullmatch(r"\d+(\.\d+)?", text):
+        seconds = float(text)
+    else:
+        parts = re.findall(r"(\d+(?:\.\d+)?)\s*(h|m|s)", text)
+        if not parts or "".join(f"{value}{unit}" for value, unit in parts) != re.sub(r"\s+", "", text):
+            raise ValueError(f"Invalid duration: '{text}' (use e.g. 120s, 2m, 1m30s)")
+        seconds = sum(float(value) * {"h": 3600, "m": 60, "s": 1}[unit] for value, unit in parts)
+    if seconds <= 0:
+        raise ValueError(f"Duration must be positive: '{text}'")
+    return seconds
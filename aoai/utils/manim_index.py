@@ -0,0 +1,206 @@
+"""
+Manim Symbol Index
+Names exported by `from manim import *` with their kinds and call signatures, built from the installed manim
+"""
+import argparse
+import ast
+import importlib.metadata
+import inspect
+import json
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+INDEX_FORMAT = 2
+
+# Names from older Manim versions that LLMs still produce -> current replacement
+RENAMED_SYMBOLS = {
+    "ShowCreation": "Create",
+    "ShowCreationThenDestruction": "ShowPassingFlash",
+    "TextMobject": "Text",
+    "TexMobject": "MathTex",
+    "TexText": "Tex",
+    "FadeInFrom": "FadeIn(mobject, shift=direction)",
+    "FadeInFromDown": "FadeIn(mobject, shift=UP)",
+    "FadeOutAndShift": "FadeOut(mobject, shift=direction)",
+}
+
+
+def _signature(obj) -> Optional[Dict[str, Any]]:
+    """Parameters of a callable: {"params", "max_positional", "var_kwargs"} (None if not inspectable)"""
+    try:
+        signature = inspect.signature(obj)
+    except (TypeError, ValueError):
+        return None
+    params, positional, var_positional, var_kwargs = [], 0, False, False
+    for param in signature.parameters.values():
+        if param.kind == param.VAR_POSITIONAL:
+            var_positional = True
+        elif param.kind == param.VAR_KEYWORD:
+            var_kwargs = True
+        else:
+            if param.kind != param.KEYWORD_ONLY:
+                positional += 1
+            if param.kind != param.POSITIONAL_ONLY:
+                params.append(param.name)
+    return {
+        "params": params,
+        "max_positional": None if var_positional else positional,
+        "var_kwargs": var_kwargs
+    }
+
+
+def _class_signature(cls) -> Optional[Dict[str, Any]]:
+    """
+    Keywords a class constructor accepts.
+    
+    Manim constructors mostly forward **kwargs up the MRO until one (usually
+    Mobject.__init__ or Animation.__init__) takes no **kwargs, so the
+    accepted keywords are the union along that chain.
+    """
+    params: List[str] = []
+    max_positional = None
+    first = True
+    for klass in cls.__mro__:
+        if "__init__" not in vars(klass) or klass is object:
+            continue
+        signature = _signature(vars(klass)["__init__"])
+        if signature is None:
+            return None
+        if first:
+            # Positional arguments bind to the most derived __init__ (minus self)
+            max_positional = signature["max_positional"]
+            if max_positional is not None:
+                max_positional -= 1
+            first = False
+        params.extend(name for name in signature["params"] if name != "self" and name not in params)
+        if not signature["var_kwargs"]:
+            return {"params": params, "max_positional": max_positional, "var_kwargs": False}
+    return {"params": params, "max_positional": max_positional, "var_kwargs": True}
+
+
+def _instance_attributes(cls) -> List[str]:
+    """
+    Attributes assigned to `self` in the __init__ methods along a class's MRO.
+    
+    dir() only sees class attributes, so instance state such as
+    Scene.mobjects or Scene.renderer is recovered from the source.
+    """
+    names = set()
+    for klass in cls.__mro__:
+        if "__init__" not in vars(klass) or klass is object:
+            continue
+        try:
+            tree = ast.parse(textwrap.dedent(inspect.getsource(vars(klass)["__init__"])))
+        except (OSError, TypeError, SyntaxError):
+            continue  # Built-in or source not available
+        for node in ast.walk(tree):
+            if (isinstance(node, ast.Attribute) and isinstance(node.ctx, ast.Store)
+                    and isinstance(node.value, ast.Name) and node.value.id == "self"):
+                names.add(node.attr)
+    return sorted(names)
+
+
+def build_index() -> Dict[str, Any]:
+    """
+    Build the symbol index by importing the installed manim.
+    
+    Returns:
+        {"format", "manim_version", "python", "symbols": {name: {"kind", "params",
+         "max_positional", "var_kwargs", "members"?}}}
+        where members (attributes and methods, inherited ones and instance
+        attributes set in __init__ included) are listed for Scene classes only
+    """
+    import manim
+    
+    names = getattr(manim, "__all__", None) or [name for name in dir(manim) if not name.startswith("_")]
+    symbols = {}
+    for name in names:
+        obj = getattr(manim, name, None)
+        if inspect.isclass(obj):
+            entry = {"kind": "class"}
+            entry.update(_class_signature(obj) or {"params": [], "max_positional": None, "var_kwargs": True})
+            if issubclass(obj, manim.Scene):
+                members = set(dir(obj)) | set(_instance_attributes(obj))
+                entry["members"] = sorted(member for member in members if not member.startswith("__"))
+        elif inspect.isfunction(obj) or inspect.isbuiltin(obj) or inspect.ismethod(obj):
+            entry = {"kind": "function"}
+            entry.update(_signature(obj) or {"params": [], "max_positional": None, "var_kwargs": True})
+        elif inspect.ismodule(obj):
+            entry = {"kind": "module"}
+        else:
+            entry = {"kind": "constant"}
+        symbols[name] = entry
+    
+    return {
+        "format": INDEX_FORMAT,
+        "manim_version": getattr(manim, "__version__", None),
+        "python": f"{sys.version_info.major}.{sys.version_info.minor}",
+        "symbols": symbols
+    }
+
+
+def installed_manim_version() -> Optional[str]:
+    """Version of the installed manim distribution (None if not installed); does not import it"""
+    try:
+        return importlib.metadata.version("manim")
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def load_manim_index(cache_dir: Path) -> Optional[Dict[str, Any]]:
+    """
+    Load the index for the installed manim, building it on first use.
+    
+    The index is built in a separate interpreter (importing manim takes
+    seconds and is not needed in the pipeline process) and cached per manim
+    and Python version, so later loads are a JSON read.
+    
+    Args:
+        cache_dir: Directory holding manim_index_<version>.json
+    
+    Returns:
+        Index dict, or None when manim is not installed or the build failed
+    """
+    version = installed_manim_version()
+    if version is None:
+        return None
+    
+    cache_path = Path(cache_dir) / f"manim_index_{version}_py{sys.version_info.major}{sys.version_info.minor}.json"
+    if cache_path.exists():
+        try:
+            index = json.loads(cache_path.read_text(encoding='utf-8'))
+            if index.get("format") == INDEX_FORMAT:
+                return index
+        except ValueError:
+            pass
+    
+    print(f"🗂️  Building manim {version} symbol index...")
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        subprocess.run([sys.executable, str(Path(__file__).resolve()), "--build", str(cache_path)],
+                       check=True, capture_output=True, text=True, timeout=300)
+        index = json.loads(cache_path.read_text(encoding='utf-8'))
+    except (subprocess.SubprocessError, OSError, ValueError) as e:
+        print(f"⚠️  Could not build the manim symbol index: {str(e)[:200]}")
+        return None
+    print(f"   {len(index['symbols'])} symbols indexed")
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the manim symbol index")
+    parser.add_argument("--build", metavar="PATH", required=True, help="Write the index JSON here")
+    args = parser.parse_args()
+    index = build_index()
+    Path(args.build).write_text(json.dumps(index), encoding='utf-8')
+
+
+if __name__ == "__main__":
+    main()
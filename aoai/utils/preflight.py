@@ -0,0 +1,178 @@
+"""
+Preflight Checks
+Static AST checks of generated Manim code against the manim symbol index, run before any render
+"""
+import ast
+import builtins
+import difflib
+import sys
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Set
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.manim_index import RENAMED_SYMBOLS
+
+
+BUILTIN_NAMES = set(dir(builtins)) | {"__name__", "__file__", "__doc__"}
+
+MAX_DIAGNOSTICS = 20
+
+
+def _bound_names(tree: ast.AST) -> Set[str]:
+    """Every name the script binds anywhere (scope-insensitive, so it never flags a local)"""
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((alias.asname or alias.name).split(".")[0] for alias in node.names if alias.name != "*")
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            names.update(node.names)
+        elif type(node).__name__ in ("MatchAs", "MatchStar") and getattr(node, "name", None):
+            names.add(node.name)
+        elif type(node).__name__ == "MatchMapping" and getattr(node, "rest", None):
+            names.add(node.rest)
+    return names
+
+
+def _suggest(name: str, candidates) -> str:
+    if name in RENAMED_SYMBOLS:
+        return f" (renamed to {RENAMED_SYMBOLS[name]})"
+    matches = difflib.get_close_matches(name, list(candidates), n=1, cutoff=0.8)
+    return f" (did you mean '{matches[0]}'?)" if matches else ""
+
+
+class _Checker(ast.NodeVisitor):
+    """Collects diagnostics for one parsed script"""
+    
+    def __init__(self, symbols: Dict[str, Dict[str, Any]], bound: Set[str], star_imported: bool):
+        self.symbols = symbols
+        self.bound = bound
+        self.star_imported = star_imported  # Unknown names can only be judged under `from manim import *`
+        self.diagnostics: List[Dict[str, Any]] = []
+        self._seen = set()
+        self._scene_attributes: List[Optional[Set[str]]] = []  # Allowed self.<attr> per enclosing class
+    
+    def report(self, node: ast.AST, kind: str, name: str, message: str):
+        if (kind, name) in self._seen:
+            return
+        self._seen.add((kind, name))
+        self.diagnostics.append({"line": getattr(node, "lineno", None), "col": getattr(node, "col_offset", None),
+                                 "kind": kind, "name": name, "message": message})
+    
+    def _manim_symbol(self, name: str) -> Optional[Dict[str, Any]]:
+        """Index entry a global name resolves to (None if the script binds it itself)"""
+        if name in self.bound:
+            return None
+        return self.symbols.get(name)
+    
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        if node.module == "manim":
+            for alias in node.names:
+                if alias.name != "*" and alias.name not in self.symbols:
+                    self.report(node, "unknown-import", alias.name,
+                                f"ImportError: cannot import name '{alias.name}' from 'manim'"
+                                f"{_suggest(alias.name, self.symbols)}")
+        self.generic_visit(node)
+    
+    def visit_Name(self, node: ast.Name):
+        if (self.star_imported and isinstance(node.ctx, ast.Load) and node.id not in self.bound
+                and node.id not in BUILTIN_NAMES and node.id not in self.symbols):
+            self.report(node, "unknown-name", node.id,
+                        f"NameError: name '{node.id}' is not defined{_suggest(node.id, self.symbols)}")
+    
+    def visit_Call(self, node: ast.Call):
+        entry = self._manim_symbol(node.func.id) if isinstance(node.func, ast.Name) else None
+        if entry is not None and entry["kind"] in ("class", "function"):
+            name = node.func.id
+            if not entry["var_kwargs"]:
+                for keyword in node.keywords:
+                    if keyword.arg is not None and keyword.arg not in entry["params"]:
+                        self.report(keyword, "unknown-keyword", f"{name}.{keyword.arg}",
+                                    f"TypeError: {name}() got an unexpected keyword argument "
+                                    f"'{keyword.arg}'{_suggest(keyword.arg, entry['params'])}")
+            positional = entry["max_positional"]
+            if (positional is not None and len(node.args) > positional
+                    and not any(isinstance(arg, ast.Starred) for arg in node.args)):
+                self.report(node, "too-many-arguments", name,
+                            f"TypeError: {name}() takes at most {positional} positional arguments "
+                            f"but {len(node.args)} were given")
+        self.generic_visit(node)
+    
+    def visit_ClassDef(self, node: ast.ClassDef):
+        # self.<attr> can only be checked when every base is an indexed Scene class
+        bases = [self._manim_symbol(base.id) if isinstance(base, ast.Name) else None for base in node.bases]
+        allowed = None
+        if bases and all(base is not None and "members" in base for base in bases):
+            allowed = set()
+            for base in bases:
+                allowed.update(base["members"])
+            for child in ast.walk(node):
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    allowed.add(child.name)
+                elif (isinstance(child, ast.Attribute) and isinstance(child.ctx, ast.Store)
+                      and isinstance(child.value, ast.Name) and child.value.id == "self"):
+                    allowed.add(child.attr)
+                elif isinstance(child, ast.Name) and isinstance(child.ctx, ast.Store):
+                    allowed.add(child.id)  # Class-level attributes
+        self._scene_attributes.append(allowed)
+        self.generic_visit(node)
+        self._scene_attributes.pop()
+    
+    def visit_Attribute(self, node: ast.Attribute):
+        allowed = self._scene_attributes[-1] if self._scene_attributes else None
+        if (allowed is not None and isinstance(node.ctx, ast.Load) and isinstance(node.value, ast.Name)
+                and node.value.id == "self" and node.attr not in allowed):
+            self.report(node, "unknown-scene-attribute", node.attr,
+                        f"AttributeError: Scene has no attribute '{node.attr}'{_suggest(node.attr, allowed)}")
+        self.generic_visit(node)
+
+
+def preflight_check(code: str, index: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Check a Manim script without running it.
+    
+    Names used under `from manim import *` are resolved against the index;
+    calls of manim classes/functions are checked for unknown keywords and
+    extra positional arguments; self.<attr> inside Scene subclasses must be
+    a Scene member or defined by the script.
+    
+    Args:
+        code: Manim script
+        index: Output of load_manim_index()
+    
+    Returns:
+        Diagnostics [{"line", "col", "kind", "name", "message"}] (empty = no problems found)
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return [{"line": e.lineno, "col": e.offset, "kind": "syntax", "name": None,
+                 "message": f"SyntaxError: {e.msg}"}]
+    
+    star_imports = [node.module for node in ast.walk(tree)
+                    if isinstance(node, ast.ImportFrom) and any(alias.name == "*" for alias in node.names)]
+    # Another star import could define any name
+    star_imported = "manim" in star_imports and all(module == "manim" for module in star_imports)
+    
+    checker = _Checker(index["symbols"], _bound_names(tree), star_imported)
+    checker.visit(tree)
+    diagnostics = sorted(checker.diagnostics, key=lambda d: (d["line"] or 0, d["col"] or 0))
+    return diagnostics[:MAX_DIAGNOSTICS]
+
+
+def format_diagnostics(diagnostics: List[Dict[str, Any]], manim_version: Optional[str] = None) -> str:
+    """Error log for the Fixer, one line per diagnostic"""
+    version = f" (manim {manim_version})" if manim_version else ""
+    lines = [f"Preflight check found {len(diagnostics)} problem(s) before rendering{version}:"]
+    for diagnostic in diagnostics:
+        lines.append(f"  line {diagnostic['line']}: {diagnostic['message']}")
+    return "\n".join(lines)
@@ -0,0 +1,244 @@
+"""
+Prompt Budgeting
+Token counting, compact serialization and per-agent input budgets for agent prompts
+"""
+import json
+import math
+import re
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional, Tuple
+
+from utils.prompts import get_prompt
+from utils.tracing import get_current_span
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken missing or encoding not downloadable offline
+    _ENCODING = None
+
+
+CHARS_PER_TOKEN = 4  # heuristic when tiktoken is unavailable
+
+# Max prompt tokens per agent call (template + embedded inputs).
+# Only agents with an input that can be shortened get one: the Director and
+# Engineer have none, since their only inputs (the reasoning steps and the
+# scene manifest) cannot be cut without dropping content from the video.
+AGENT_BUDGETS = {
+    'logician': 1024,
+    'fixer': 6144,
+    'narrator': 2048
+}
+
+# Token usage of every LLM call in the current pipeline run (set by the orchestrator)
+token_usage: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("token_usage", default=None)
+
+ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;]*[A-Za-z]')
+PROGRESS_LINE = re.compile(r'\d+%\|')  # tqdm progress bars in Manim output
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens in text.
+    
+    Uses tiktoken's cl100k_base when installed (close to Llama-3 counts),
+    otherwise ~4 characters per token.
+    
+    Args:
+        text: Text to measure
+    
+    Returns:
+        Token count
+    """
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def compact_json(data: Any) -> str:
+    """Serialize JSON without indentation or padding whitespace"""
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def truncate_middle(text: str, max_tokens: int, head_ratio: float = 0.3) -> str:
+    """
+    Shrink text to a token budget by cutting out its middle.
+    
+    Keeps the start and (mostly) the end, where tracebacks put the actual
+    error, snapping cuts to line boundaries.
+    
+    Args:
+        text: Text to shrink
+        max_tokens: Token budget
+        head_ratio: Share of the kept text taken from the start
+    
+    Returns:
+        Text within the budget (unchanged if it already fits)
+    """
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    
+    chars_per_token = len(text) / tokens
+    keep = max(0, int((max_tokens - 16) * chars_per_token))  # leave room for the marker
+    head = text[:int(keep * head_ratio)]
+    tail = text[len(text) - (keep - len(head)):] if keep > len(head) else ""
+    
+    if "\n" in head:
+        head = head[:head.rfind("\n") + 1]
+    if "\n" in tail:
+        tail = tail[tail.find("\n") + 1:]
+    
+    omitted = text[len(head):len(text) - len(tail)]
+    marker = f"\n... [{omitted.count(chr(10)) + 1} lines / {len(omitted)} chars truncated] ...\n"
+    return head + marker + tail
+
+
+def condense_error_log(stderr: str, max_tokens: int) -> str:
+    """
+    Reduce Manim stderr to what the Fixer needs.
+    
+    Strips ANSI colors and progress bars, collapses repeated lines, then
+    middle-truncates to the budget.
+    
+    Args:
+        stderr: Raw stderr from the sandbox
+        max_tokens: Token budget for the error log
+    
+    Returns:
+        Condensed error log
+    """
+    lines = []
+    for line in ANSI_ESCAPE.sub("", stderr).splitlines():
+        if PROGRESS_LINE.search(line):
+            continue
+        if lines and line.strip() and line == lines[-1]:
+            continue
+        lines.append(line.rstrip())
+    
+    return truncate_middle("\n".join(lines).strip(), max_tokens, head_ratio=0.2)
+
+
+def _render(value: Any, compact: bool) -> str:
+    if isinstance(value, (dict, list)):
+        return compact_json(value) if compact else json.dumps(value, indent=2)
+    return str(value)
+
+
+def assemble_prompt(agent_name: str, truncatable: Tuple[str, ...] = (),
+                    budget: Optional[int] = None, **fields) -> Tuple[str, Dict[str, Any]]:
+    """
+    Build an agent prompt within its token budget.
+    
+    Dicts and lists are embedded as compact JSON. If the prompt is over budget,
+    the fields named in `truncatable` are shrunk (largest first); error logs are
+    condensed, other text is middle-truncated.
+    
+    Args:
+        agent_name: Template name in utils.prompts
+        truncatable: Fields that may be shortened to fit the budget
+        budget: Token budget (defaults to AGENT_BUDGETS[agent_name])
+        **fields: Template variables
+    
+    Returns:
+        (prompt, report) where report is
+        {"agent", "prompt_tokens", "baseline_tokens", "budget", "truncated"}.
+        baseline_tokens is the size with indented JSON and no truncation.
+    """
+    budget = budget or AGENT_BUDGETS.get(agent_name)
+    baseline = get_prompt(agent_name, **{name: _render(value, compact=False) for name, value in fields.items()})
+    rendered = {name: _render(value, compact=True) for name, value in fields.items()}
+    prompt = get_prompt(agent_name, **rendered)
+    
+    truncated = []
+    tokens = count_tokens(prompt)
+    if budget and tokens > budget:
+        for name in sorted(truncatable, key=lambda n: count_tokens(rendered[n]), reverse=True):
+            overflow = tokens - budget
+            field_tokens = count_tokens(rendered[name])
+            target = max(64, field_tokens - overflow)
+            if target >= field_tokens:
+                continue
+            
+            if name == "error":
+                rendered[name] = condense_error_log(rendered[name], target)
+            else:
+                rendered[name] = truncate_middle(rendered[name], target)
+            truncated.append(name)
+            
+            prompt = get_prompt(agent_name, **rendered)
+            tokens = count_tokens(prompt)
+            if tokens <= budget:
+                break
+        
+        if tokens > budget:
+            print(f"   ⚠️  {agent_name} prompt is {tokens} tokens (budget {budget}) after truncation")
+    
+    return prompt, {
+        "agent": agent_name,
+        "prompt_tokens": tokens,
+        "baseline_tokens": count_tokens(baseline),
+        "budget": budget,
+        "truncated": truncated
+    }
+
+
+def record_token_usage(report: Dict[str, Any], prompt: str, response: str):
+    """
+    Log one LLM call's prompt/completion tokens to the current run.
+    
+    Args:
+        report: Report from assemble_prompt() for the base prompt
+        prompt: Prompt actually sent (may carry retry instructions)
+        response: Model response
+    """
+    prompt_tokens = count_tokens(prompt)
+    entry = {
+        "agent": report["agent"],
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": count_tokens(response),
+        # Retry instructions are appended to both, so carry the difference over
+        "baseline_prompt_tokens": report["baseline_tokens"] + prompt_tokens - report["prompt_tokens"],
+        "truncated": report["truncated"]
+    }
+    
+    usage = token_usage.get()
+    if usage is not None:
+        usage.append(entry)
+    get_current_span().add_event("llm.tokens", aoai__agent=entry["agent"],
+                                 gen_ai__usage__input_tokens=entry["prompt_tokens"],
+                                 gen_ai__usage__output_tokens=entry["completion_tokens"])
+    
+    saved = entry["baseline_prompt_tokens"] - prompt_tokens
+    print(f"   🧮 Tokens: {prompt_tokens} prompt"
+          f"{f' ({saved} saved)' if saved > 0 else ''}, {entry['completion_tokens']} completion")
+
+
+def summarize_token_usage(usage: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Totals for a run's token log.
+    
+    Returns:
+        {"calls", "prompt_tokens", "completion_tokens", "baseline_prompt_tokens",
+         "prompt_tokens_saved", "savings_rate", "by_agent": {agent: {...}}}
+    """
+    by_agent = {}
+    for entry in usage:
+        agent = by_agent.setdefault(entry["agent"], {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+        agent["calls"] += 1
+        agent["prompt_tokens"] += entry["prompt_tokens"]
+        agent["completion_tokens"] += entry["completion_tokens"]
+    
+    prompt_tokens = sum(entry["prompt_tokens"] for entry in usage)
+    baseline = sum(entry["baseline_prompt_tokens"] for entry in usage)
+    return {
+        "calls": len(usage),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": sum(entry["completion_tokens"] for entry in usage),
+        "baseline_prompt_tokens": baseline,
+        "prompt_tokens_saved": baseline - prompt_tokens,
+        "savings_rate": (baseline - prompt_tokens) / baseline if baseline else 0.0,
+        "by_agent": by_agent
+    }
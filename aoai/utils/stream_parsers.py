@@ -0,0 +1,158 @@
+"""
+Incremental Stream Parsers
+Inspect streamed LLM output chunk-by-chunk and abort early on detectable failures
+"""
+import re
+from typing import Optional
+
+
+class StreamAborted(Exception):
+    """Raised when an incremental parser rejects a response mid-stream"""
+    
+    def __init__(self, reason: str, partial: str = ""):
+        super().__init__(reason)
+        self.reason = reason
+        self.partial = partial
+
+
+class IncrementalJSONParser:
+    """
+    Tracks a streamed JSON object without fully parsing it.
+    
+    Rejects responses that start with prose or a markdown fence instead of '{',
+    and responses that keep going after the top-level object has closed.
+    """
+    
+    def __init__(self):
+        self.text = ""
+        self.started = False
+        self.closed = False
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+    
+    def feed(self, chunk: str) -> Optional[str]:
+        """
+        Consume a chunk.
+        
+        Args:
+            chunk: Next piece of streamed text
+        
+        Returns:
+            Failure reason, or None while the stream still looks valid
+        """
+        self.text += chunk
+        
+        for char in chunk:
+            if self.closed:
+                if not char.isspace():
+                    return "Trailing text after JSON object"
+                continue
+            
+            if not self.started:
+                if char.isspace():
+                    continue
+                if char != "{":
+                    return f"Response does not start with JSON (got {char!r})"
+                self.started = True
+                self.depth = 1
+                continue
+            
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                continue
+            
+            if char == '"':
+                self.in_string = True
+            elif char in "{[":
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    self.closed = True
+        
+        return None
+
+
+class CodeFenceParser:
+    """
+    Tracks streamed Manim code (optionally wrapped in a markdown fence).
+    
+    Rejects responses that close their code fence without a GeneratedScene
+    class, or run too long without importing manim. Other Scene subclasses
+    may come first (helper scenes are valid), so the scene class is only
+    judged once the fence closes.
+    """
+    
+    IMPORT_WINDOW = 800  # chars allowed before 'from manim import' must appear
+    SCENE_CLASS_PATTERN = re.compile(r'^\s*class\s+(\w+)\s*\(\s*(\w*Scene)\s*\)', re.MULTILINE)
+    
+    def __init__(self):
+        self.text = ""
+    
+    def feed(self, chunk: str) -> Optional[str]:
+        """
+        Consume a chunk.
+        
+        Args:
+            chunk: Next piece of streamed text
+        
+        Returns:
+            Failure reason, or None while the stream still looks valid
+        """
+        self.text += chunk
+        
+        if "from manim import" not in self.text and len(self.text) > self.IMPORT_WINDOW:
+            return "Missing Manim import statement"
+        
+        if "class GeneratedScene" not in self.text:
+            fence_start = self.text.find("```")
+            if fence_start != -1 and self.text.find("```", fence_start + 3) != -1:
+                match = self.SCENE_CLASS_PATTERN.search(self.text)
+                if match:
+                    return f"Scene class named '{match.group(1)}' instead of 'GeneratedScene'"
+                return "Code block closed without GeneratedScene class definition"
+        
+        return None
+
+
+def generate_with_early_abort(llm, prompt: str, max_tokens: int, temperature: float, parser) -> str:
+    """
+    Generate a response, streaming through an incremental parser when possible.
+    
+    Clients without generate_stream() fall back to a regular generate() call.
+    
+    Args:
+        llm: LLM client
+        prompt: Input text
+        max_tokens: Max response length
+        temperature: Sampling temperature
+        parser: IncrementalJSONParser or CodeFenceParser instance
+    
+    Returns:
+        Full response text
+    
+    Raises:
+        StreamAborted: The parser rejected the response before it finished
+    """
+    if not hasattr(llm, "generate_stream"):
+        return llm.generate(prompt=prompt, max_tokens=max_tokens, temperature=temperature)
+    
+    stream = llm.generate_stream(prompt=prompt, max_tokens=max_tokens, temperature=temperature)
+    parts = []
+    try:
+        for chunk in stream:
+            parts.append(chunk)
+            reason = parser.feed(chunk)
+            if reason:
+                raise StreamAborted(reason, "".join(parts))
+    finally:
+        # Closing the generator cancels the remaining generation on abort
+        stream.close()
+    
+    return "".join(parts)
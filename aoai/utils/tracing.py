@@ -0,0 +1,294 @@
+"""
+Tracing
+Span instrumentation with an OpenTelemetry-style data model, exported to a local JSONL file
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterator
+
+
+SERVICE_NAME = "aoai"
+
+# Innermost open span of the current thread/task (propagated with contextvars.copy_context)
+current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+_exporter: Optional["JsonlSpanExporter"] = None
+
+
+class JsonlSpanExporter:
+    """Appends finished spans to a JSONL file, one OTLP-style JSON object per line"""
+    
+    def __init__(self, path: Path):
+        """
+        Args:
+            path: JSONL file (storage/traces/spans.jsonl)
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+    
+    def export(self, span: "Span"):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+
+
+class Span:
+    """
+    One timed operation.
+    
+    Fields follow the OTLP span model (hex trace/span ids, unix-nano
+    timestamps, attributes, events, status) so the file can be converted
+    for any OpenTelemetry backend.
+    """
+    
+    def __init__(self, name: str, kind: str = "INTERNAL", parent: Optional["Span"] = None,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent.span_id if parent else None
+        self.start_time_unix_nano = time.time_ns()
+        self.end_time_unix_nano: Optional[int] = None
+        self.attributes: Dict[str, Any] = {}
+        self.events: List[Dict[str, Any]] = []
+        self.status = {"code": "UNSET", "message": ""}
+        self._token = None
+        self.set_attributes(**(attributes or {}))
+    
+    def set_attribute(self, key: str, value: Any):
+        if value is not None:
+            self.attributes[key] = value
+    
+    def set_attributes(self, **attributes):
+        """Set several attributes (keyword names use '__' for '.')"""
+        for key, value in attributes.items():
+            self.set_attribute(key.replace("__", "."), value)
+    
+    def add_event(self, name: str, **attributes):
+        self.events.append({
+            "name": name,
+            "time_unix_nano": time.time_ns(),
+            "attributes": {key.replace("__", "."): value for key, value in attributes.items() if value is not None}
+        })
+    
+    def set_status(self, code: str, message: str = ""):
+        """code: 'OK' or 'ERROR'"""
+        self.status = {"code": code, "message": message}
+    
+    def record_exception(self, error: BaseException):
+        self.add_event("exception", exception__type=type(error).__name__, exception__message=str(error)[:500])
+        self.set_status("ERROR", str(error)[:200])
+    
+    def end(self):
+        """Finish the span, restore its parent as current and export it"""
+        if self.end_time_unix_nano is not None:
+            return
+        self.end_time_unix_nano = time.time_ns()
+        if self._token is not None:
+            try:
+                current_span.reset(self._token)
+            except ValueError:
+                # Ended from another context (e.g. a worker thread); nothing to restore
+                pass
+            self._token = None
+        if _exporter is not None:
+            _exporter.export(self)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time_unix_nano": self.start_time_unix_nano,
+            "end_time_unix_nano": self.end_time_unix_nano,
+            "attributes": self.attributes,
+            "events": self.events,
+            "status": self.status,
+            "resource": {"service.name": SERVICE_NAME}
+        }
+
+
+class _NoopSpan:
+    """Stand-in returned while tracing is disabled"""
+    
+    trace_id = None
+    span_id = None
+    
+    def set_attribute(self, key, value):
+        pass
+    
+    def set_attributes(self, **attributes):
+        pass
+    
+    def add_event(self, name, **attributes):
+        pass
+    
+    def set_status(self, code, message=""):
+        pass
+    
+    def record_exception(self, error):
+        pass
+    
+    def end(self):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def configure_tracing(path: Optional[Path]):
+    """
+    Enable tracing to a JSONL file (None disables it).
+    
+    Args:
+        path: File finished spans are appended to
+    """
+    global _exporter
+    _exporter = JsonlSpanExporter(path) if path is not None else None
+
+
+def tracing_enabled() -> bool:
+    return _exporter is not None
+
+
+def get_current_span():
+    """Innermost open span (a no-op span when there is none)"""
+    return current_span.get() or NOOP_SPAN
+
+
+def open_span(name: str, kind: str = "INTERNAL", **attributes):
+    """
+    Start a span as a child of the current one and make it current.
+    
+    The caller must call end() in the same context. Use start_span() where
+    a with-block fits.
+    
+    Args:
+        name: Operation name ('pipeline.run', 'groq.attempt', ...)
+        kind: 'INTERNAL' or 'CLIENT' (outgoing API call / subprocess)
+        **attributes: Initial attributes ('__' in a name becomes '.')
+    
+    Returns:
+        Span (or a no-op span when tracing is disabled)
+    """
+    if _exporter is None:
+        return NOOP_SPAN
+    span = Span(name, kind, current_span.get(), attributes)
+    span._token = current_span.set(span)
+    return span
+
+
+@contextmanager
+def start_span(name: str, kind: str = "INTERNAL", **attributes) -> Iterator[Any]:
+    """Context manager around open_span(); exceptions are recorded on the span"""
+    span = open_span(name, kind, **attributes)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_exception(e)
+        raise
+    finally:
+        span.end()
+
+
+# ========================================
+# Reading traces back
+# ========================================
+
+def load_spans(path: Path, trace_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Load the spans of one trace.
+    
+    Args:
+        path: JSONL file written by the exporter
+        trace_id: Trace id or unique prefix (None = most recently finished trace)
+    
+    Returns:
+        Spans of the trace, ordered by start time
+    """
+    spans = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    spans.append(json.loads(line))
+                except ValueError:
+                    continue
+    
+    if trace_id is None:
+        roots = [span for span in spans if not span.get("parent_span_id")]
+        if not roots:
+            return []
+        trace_id = roots[-1]["trace_id"]
+    
+    matches = {span["trace_id"] for span in spans if span["trace_id"].startswith(trace_id)}
+    if len(matches) > 1:
+        raise ValueError(f"Trace id prefix '{trace_id}' is ambiguous ({len(matches)} traces)")
+    return sorted((span for span in spans if span["trace_id"] in matches),
+                  key=lambda span: span["start_time_unix_nano"])
+
+
+# Attributes worth showing next to a bar
+WATERFALL_ATTRIBUTES = (
+    "gen_ai.request.model", "gen_ai.usage.input_tokens", "gen_ai.usage.output_tokens",
+    "aoai.prompt_chars", "aoai.attempt", "aoai.cache_hit", "process.exit_code", "aoai.job_id"
+)
+
+
+def render_waterfall(spans: List[Dict[str, Any]], width: int = 40) -> List[str]:
+    """
+    Text waterfall of a trace: one line per span, indented by depth, with a
+    bar placed on the trace's timeline.
+    
+    Args:
+        spans: Output of load_spans()
+        width: Bar area width in characters
+    
+    Returns:
+        Lines to print
+    """
+    if not spans:
+        return []
+    
+    ids = {span["span_id"] for span in spans}
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    for span in spans:
+        parent = span.get("parent_span_id") if span.get("parent_span_id") in ids else None
+        children.setdefault(parent, []).append(span)
+    
+    start = min(span["start_time_unix_nano"] for span in spans)
+    end = max(span["end_time_unix_nano"] or span["start_time_unix_nano"] for span in spans)
+    total = max(end - start, 1)
+    
+    lines = [f"Trace {spans[0]['trace_id']}  ({total / 1e9:.2f}s, {len(spans)} spans)"]
+    
+    def walk(span: Dict[str, Any], depth: int):
+        span_start = span["start_time_unix_nano"] - start
+        span_end = (span["end_time_unix_nano"] or end) - start
+        offset = int(span_start / total * width)
+        length = max(1, int(round((span_end - span_start) / total * width)))
+        bar = (" " * offset + "█" * length)[:width].ljust(width)
+        
+        marker = "✗" if span["status"]["code"] == "ERROR" else " "
+        label = ("  " * depth + span["name"])[:38]
+        details = ", ".join(f"{key.split('.')[-1]}={span['attributes'][key]}"
+                            for key in WATERFALL_ATTRIBUTES if key in span["attributes"])
+        lines.append(f"{marker} {label:<38} |{bar}| {(span_end - span_start) / 1e6:>9.1f}ms  {details}")
+        
+        for child in children.get(span["span_id"], []):
+            walk(child, depth + 1)
+    
+    for root in children.get(None, []):
+        walk(root, 0)
+    return lines